@@ -4,4 +4,4 @@ from flask import Blueprint
 cari_bp = Blueprint('cari', __name__, template_folder='templates')
 
 # Rotaları içe aktar (Dairesel importu önlemek için en sonda)
-from . import routes
\ No newline at end of file
+from . import routes, komutlar
\ No newline at end of file
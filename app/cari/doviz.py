@@ -0,0 +1,256 @@
+"""
+TCMB döviz kuru servisi.
+
+Sayfa render'ları kuru artık TCMB'den değil, işlem içi önbellekten okur.
+Önbellek 'doviz_kuru' tablosundan beslenir; tablo ise günde bir kez
+(TCMB bülteni yayınlandıktan sonra) arka planda veya
+'flask cari kur-guncelle' komutuyla yenilenir. Geçmiş tarihli sorgular
+tamamen veritabanından (çevrimdışı) cevaplanır.
+"""
+import os
+import time
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from zoneinfo import ZoneInfo
+
+import requests
+import urllib3
+from flask import current_app
+from sqlalchemy import func
+
+from app.extensions import db
+from app.cari.models import DovizKuru
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger(__name__)
+
+PARA_BIRIMLERI = ('USD', 'EUR')
+
+# TCMB bülteni hafta içi 15:30 civarında (İstanbul saatiyle) yayınlanır;
+# sunucunun saat dilimi ne olursa olsun kesim saati İstanbul'a göre hesaplanır
+BULTEN_SAATI = (15, 30)
+TCMB_SAAT_DILIMI = ZoneInfo('Europe/Istanbul')
+
+# --- İŞLEM İÇİ ÖNBELLEK ---
+# None anahtarı güncel kuru, date anahtarları geçmiş günleri tutar.
+# Güncel kayıt: (gecerlilik_sonu_monotonic, kurlar), geçmiş kayıt: kurlar.
+# Geçmiş gün yalnızca kendi bülteniyle cevaplandıysa saklanır; daha eski
+# bir bültenle cevaplanan gün, bülteni sonradan yazılabileceği için saklanmaz.
+_onbellek = {}
+_kilit = threading.Lock()
+_yenileme_suruyor = False
+_son_tcmb_denemesi = None
+
+
+def _bos_kurlar():
+    return {pb: Decimal('0.00') for pb in PARA_BIRIMLERI}
+
+
+def son_is_gunu(gun):
+    """Hafta sonuna denk gelen günü bir önceki Cuma'ya çeker."""
+    while gun.weekday() >= 5:
+        gun -= timedelta(days=1)
+    return gun
+
+
+def beklenen_bulten_tarihi(simdi=None):
+    """
+    Şu an itibarıyla yayınlanmış olması gereken en son TCMB bülteninin tarihi.
+    'simdi' saat dilimli ise İstanbul saatine çevrilir, saat dilimsiz ise
+    İstanbul saati kabul edilir.
+    """
+    simdi = simdi or datetime.now(TCMB_SAAT_DILIMI)
+    if simdi.tzinfo is not None:
+        simdi = simdi.astimezone(TCMB_SAAT_DILIMI)
+    gun = simdi.date()
+    if (simdi.hour, simdi.minute) < BULTEN_SAATI:
+        gun -= timedelta(days=1)
+    return son_is_gunu(gun)
+
+
+# -------------------------------------------------------------------------
+# TCMB KAYNAĞI
+# -------------------------------------------------------------------------
+def _kaynak_adresi(tarih=None):
+    """
+    Güncel ya da arşiv XML adresini döndürür.
+    Yapılandırmada yerel bir dosya yolu varsa (test fixture) aynen kullanılır.
+    """
+    url = current_app.config.get('TCMB_KUR_URL') or 'https://www.tcmb.gov.tr/kurlar/today.xml'
+    if tarih and url.startswith('http') and url.endswith('today.xml'):
+        return url.replace('today.xml', f"{tarih:%Y%m}/{tarih:%d%m%Y}.xml")
+    return url
+
+
+def _xml_oku(url):
+    if url.startswith('http'):
+        response = requests.get(url, verify=False, timeout=5)
+        response.raise_for_status()
+        return response.content
+    yol = url[len('file://'):] if url.startswith('file://') else url
+    with open(os.path.abspath(yol), 'rb') as f:
+        return f.read()
+
+
+def _decimal(eleman):
+    if eleman is None or not (eleman.text or '').strip():
+        return None
+    try:
+        return Decimal(eleman.text.strip())
+    except InvalidOperation:
+        return None
+
+
+def tcmb_xml_coz(icerik):
+    """
+    TCMB XML içeriğini (bulten_tarihi, {'USD': (alis, satis), ...}) olarak çözer.
+    """
+    root = ET.fromstring(icerik)
+
+    bulten_tarihi = None
+    tarih_attr = root.get('Date')  # Örn: 10/17/2026
+    if tarih_attr:
+        try:
+            bulten_tarihi = datetime.strptime(tarih_attr, '%m/%d/%Y').date()
+        except ValueError:
+            pass
+
+    kurlar = {}
+    for pb in PARA_BIRIMLERI:
+        node = root.find(f"./Currency[@CurrencyCode='{pb}']")
+        if node is None:
+            continue
+        kurlar[pb] = (_decimal(node.find('ForexBuying')), _decimal(node.find('ForexSelling')))
+    return bulten_tarihi, kurlar
+
+
+# -------------------------------------------------------------------------
+# VERİTABANI
+# -------------------------------------------------------------------------
+def _db_kurlar(gun):
+    """
+    'gun' tarihinde geçerli olan (o gün ya da öncesindeki en son) bülteni okur.
+    (tarih, para_birimi) benzersiz indeksi üzerinden iki küçük sorgudur.
+    """
+    bulten = db.session.query(func.max(DovizKuru.tarih)).filter(DovizKuru.tarih <= gun).scalar()
+    kurlar = _bos_kurlar()
+    if bulten is None:
+        return kurlar, None
+
+    for kayit in DovizKuru.query.filter(DovizKuru.tarih == bulten).all():
+        if kayit.para_birimi in kurlar and kayit.satis is not None:
+            kurlar[kayit.para_birimi] = Decimal(kayit.satis)
+    return kurlar, bulten
+
+
+def kurlari_yenile(tarih=None):
+    """
+    TCMB'den (veya yapılandırılan fixture'dan) bülteni çekip 'doviz_kuru'
+    tablosuna yazar ve önbelleği tazeler. Yazılan satır sayısını döndürür.
+    """
+    icerik = _xml_oku(_kaynak_adresi(tarih))
+    bulten_tarihi, kurlar = tcmb_xml_coz(icerik)
+    bulten_tarihi = bulten_tarihi or tarih or date.today()
+
+    yazilan = 0
+    for pb, (alis, satis) in kurlar.items():
+        kayit = DovizKuru.query.filter_by(tarih=bulten_tarihi, para_birimi=pb).first()
+        if not kayit:
+            kayit = DovizKuru(tarih=bulten_tarihi, para_birimi=pb)
+            db.session.add(kayit)
+        kayit.alis, kayit.satis = alis, satis
+        yazilan += 1
+    db.session.commit()
+
+    with _kilit:
+        # Bültenle cevaplanan günler (bülten günü ve ardından gelen hafta sonu)
+        for gun in [g for g in _onbellek if g is not None and son_is_gunu(g) == bulten_tarihi]:
+            del _onbellek[gun]
+        if bulten_tarihi >= beklenen_bulten_tarihi():
+            guncel = _bos_kurlar()
+            guncel.update({pb: satis for pb, (alis, satis) in kurlar.items() if satis is not None})
+            _onbellek[None] = (time.monotonic() + _ttl(), guncel)
+
+    logger.info(f"TCMB kurları güncellendi: {bulten_tarihi} ({yazilan} kur)")
+    return yazilan
+
+
+# -------------------------------------------------------------------------
+# ARKA PLAN YENİLEME (stale-while-revalidate)
+# -------------------------------------------------------------------------
+def _ttl():
+    return current_app.config.get('DOVIZ_KURU_TTL', 3600)
+
+
+def _tazele(app):
+    global _yenileme_suruyor, _son_tcmb_denemesi
+    try:
+        with app.app_context():
+            kurlar, bulten = _db_kurlar(date.today())
+            if bulten is None or bulten < beklenen_bulten_tarihi():
+                # Tatil günlerinde TCMB yeni bülten yayınlamaz; denemeleri TTL ile seyreltiyoruz
+                if _son_tcmb_denemesi is None or time.monotonic() - _son_tcmb_denemesi >= _ttl():
+                    _son_tcmb_denemesi = time.monotonic()
+                    try:
+                        kurlari_yenile()
+                        kurlar, bulten = _db_kurlar(date.today())
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.warning(f"TCMB kur yenileme hatası: {e}")
+            with _kilit:
+                _onbellek[None] = (time.monotonic() + _ttl(), kurlar)
+    except Exception as e:
+        logger.error(f"Kur önbelleği tazelenemedi: {e}")
+    finally:
+        with _kilit:
+            _yenileme_suruyor = False
+
+
+def _arka_planda_tazele():
+    global _yenileme_suruyor
+    with _kilit:
+        if _yenileme_suruyor:
+            return
+        _yenileme_suruyor = True
+    app = current_app._get_current_object()
+    threading.Thread(target=_tazele, args=(app,), daemon=True, name='doviz-kuru-yenile').start()
+
+
+# -------------------------------------------------------------------------
+# OKUMA API'Sİ
+# -------------------------------------------------------------------------
+def kurlari_getir(tarih=None):
+    """
+    {'USD': Decimal, 'EUR': Decimal} (TCMB döviz satış) döndürür.
+
+    Güncel kur önbellekten okunur; süresi dolmuşsa eski değer hemen döner ve
+    yenileme arka planda yapılır. Sayfa isteği hiçbir durumda TCMB'yi beklemez.
+    Geçmiş tarihler yalnızca veritabanından cevaplanır.
+    """
+    if tarih and tarih < date.today():
+        kayit = _onbellek.get(tarih)
+        if kayit is None:
+            kayit, bulten = _db_kurlar(tarih)
+            if bulten is not None and bulten == son_is_gunu(tarih):
+                with _kilit:
+                    _onbellek[tarih] = kayit
+        return dict(kayit)
+
+    kayit = _onbellek.get(None)
+    if kayit is not None:
+        gecerlilik_sonu, kurlar = kayit
+        if gecerlilik_sonu <= time.monotonic():
+            _arka_planda_tazele()
+        return dict(kurlar)
+
+    # Soğuk başlangıç: TCMB'ye gitmeden veritabanındaki son bülteni kullan
+    kurlar, bulten = _db_kurlar(date.today())
+    with _kilit:
+        _onbellek[None] = (time.monotonic() + _ttl(), kurlar)
+    if bulten is None or bulten < beklenen_bulten_tarihi():
+        _arka_planda_tazele()
+    return dict(kurlar)
@@ -4,7 +4,7 @@ from wtforms import (
     FormField, FieldList, HiddenField, IntegerField, BooleanField, TextAreaField
 )
 from wtforms.validators import DataRequired, InputRequired, NumberRange, Optional, Length
-from app.utils import secim_hata_mesaji
+from app.utils import secim_hata_mesaji, KumeSelectField
 
 # --- ÖZEL ALAN: VİRGÜLÜ NOKTAYA ÇEVİREN DECIMAL FIELD ---
 class TRDecimalField(DecimalField):
@@ -38,8 +38,8 @@ class TRDecimalField(DecimalField):
 # 5. OdemeForm (Tahsilat / Ödeme)
 # -------------------------------------------------------------------------
 class OdemeForm(FlaskForm):
-    firma_musteri_id = SelectField('Firma/Müşteri', coerce=int, choices=[], validators=[DataRequired()])
-    kasa_id = SelectField('Kasa/Banka', coerce=int, choices=[], validators=[DataRequired()])
+    firma_musteri_id = KumeSelectField('Firma/Müşteri', coerce=int, choices=[], validators=[DataRequired()])
+    kasa_id = KumeSelectField('Kasa/Banka', coerce=int, choices=[], validators=[DataRequired()])
     
     tarih = DateField('Tarih', format='%Y-%m-%d', validators=[DataRequired()])
     
@@ -66,7 +66,7 @@ class OdemeForm(FlaskForm):
 # 6. HizmetKaydiForm (Gelir / Gider Faturası)
 # -------------------------------------------------------------------------
 class HizmetKaydiForm(FlaskForm):
-    firma_id = SelectField('İlgili Firma', coerce=int, default=0, validators=[NumberRange(min=1, message=secim_hata_mesaji)])
+    firma_id = KumeSelectField('İlgili Firma', coerce=int, default=0, validators=[NumberRange(min=1, message=secim_hata_mesaji)])
     tarih = DateField('İşlem Tarihi', format='%Y-%m-%d', validators=[InputRequired()])
     
     tutar = TRDecimalField('Tutar (KDV Dahil)', places=2, validators=[
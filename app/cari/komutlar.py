@@ -0,0 +1,40 @@
+import click
+from datetime import datetime
+
+from app.cari import cari_bp
+from app.cari.doviz import kurlari_yenile
+from app.cari.risk import firma_risklerini_yeniden_olustur, gunluk_riskleri_yenile
+
+
+# -------------------------------------------------------------------------
+# flask cari kur-guncelle [--tarih YYYY-MM-DD]
+# Zamanlama: deploy/crontab (her iş günü 15:45, bülten yayınlandıktan sonra).
+# -------------------------------------------------------------------------
+@cari_bp.cli.command('kur-guncelle')
+@click.option('--tarih', default=None, help='Arşivden çekilecek bülten tarihi (YYYY-AA-GG).')
+def kur_guncelle(tarih):
+    """TCMB kurlarını çekip doviz_kuru tablosuna yazar."""
+    gun = datetime.strptime(tarih, '%Y-%m-%d').date() if tarih else None
+    adet = kurlari_yenile(gun)
+    click.echo(f"{adet} kur kaydedildi.")
+
+
+# -------------------------------------------------------------------------
+# flask cari risk-yeniden-olustur
+# -------------------------------------------------------------------------
+@cari_bp.cli.command('risk-yeniden-olustur')
+def risk_yeniden_olustur():
+    """firma_risk tablosunu tüm firmalar için yeniden hesaplar."""
+    adet = firma_risklerini_yeniden_olustur()
+    click.echo(f"{adet} firmanın riski hesaplandı.")
+
+
+# -------------------------------------------------------------------------
+# flask cari risk-yenile
+# Zamanlama: deploy/crontab (her gece 00:05; faturasız kira güne bağlıdır).
+# -------------------------------------------------------------------------
+@cari_bp.cli.command('risk-yenile')
+def risk_yenile():
+    """Bitişi geçmiş açık kalemi olan firmaların günlük riskini tazeler."""
+    adet = gunluk_riskleri_yenile()
+    click.echo(f"{adet} firmanın riski güncellendi.")
@@ -46,6 +46,10 @@ class Odeme(db.Model):
     # İlişkiler
     firma_musteri = db.relationship('Firma', back_populates='odemeler', foreign_keys=[firma_musteri_id])
     kasa = db.relationship('Kasa', back_populates='odemeler')
+
+    __table_args__ = (
+        db.Index('ix_odeme_firma', 'firma_musteri_id'),
+    )
     
     def __repr__(self):
         return f'<Odeme {self.tutar} ({self.yon})>'
@@ -57,12 +61,33 @@ class HizmetKaydi(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     firma_id = db.Column(db.Integer, db.ForeignKey('firma.id'), nullable=False)
 
+    # --- KAYNAK (Kaydı oluşturan belge) ---
+    # 'kiralama' -> kiralama_id dolu, 'nakliye' -> nakliye_id dolu, 'fatura' -> elle girilen fatura
+    # 'donem' -> açık kalemin aylık dönem faturası (kiralama_id + kalem_id + donem dolu)
+    kaynak_tipi = db.Column(db.String(20), nullable=False, default='fatura', server_default='fatura')
+    kiralama_id = db.Column(
+        db.Integer,
+        db.ForeignKey('kiralama.id', ondelete='CASCADE'),
+        nullable=True
+    )
     nakliye_id = db.Column(
         db.Integer, 
         db.ForeignKey('nakliye.id', ondelete='CASCADE'), 
         nullable=True
     )
+    # Eski kiralama referansı (yalnızca okunur; yeni kayıtlar kiralama_id kullanır)
     ozel_id = db.Column(db.Integer, nullable=True)
+
+    # --- DÖNEM FATURASI (kaynak_tipi='donem', bkz. app.kiralama.donem) ---
+    # donem: faturalanan ayın ilk günü; donem_baslangic/donem_bitis: o ayın faturalanan günleri
+    kalem_id = db.Column(
+        db.Integer,
+        db.ForeignKey('kiralama_kalemi.id', ondelete='CASCADE'),
+        nullable=True
+    )
+    donem = db.Column(db.Date, nullable=True)
+    donem_baslangic = db.Column(db.Date, nullable=True)
+    donem_bitis = db.Column(db.Date, nullable=True)
     # Tarih ve Tutar Numeric/Date (Doğru)
     tarih = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     tutar = db.Column(db.Numeric(15, 2), nullable=False, default=0)
@@ -77,6 +102,59 @@ class HizmetKaydi(db.Model):
 
     # İlişkiler
     firma = db.relationship('Firma', back_populates='hizmet_kayitlari', foreign_keys=[firma_id])
+    # Kiralama silinirken cari satırları tek DELETE ile (kiralama_id indeksinden) silinir;
+    # ORM'in satırları yükleyip tek tek NULL'lamaması için passive_deletes.
+    kiralama = db.relationship('Kiralama', backref=db.backref('cari_kayitlari', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (
+        db.Index('ix_hizmet_kaydi_kiralama_yon', 'kiralama_id', 'yon'),
+        db.Index('ix_hizmet_kaydi_nakliye_id', 'nakliye_id'),
+        db.Index('ix_hizmet_kaydi_firma_tarih', 'firma_id', 'tarih'),
+        # Dönem faturası kalem ve ay başına bir kez kesilir (toplu iş tekrar çalıştırılabilir)
+        db.Index('uq_hizmet_kaydi_kalem_donem', 'kalem_id', 'donem', 'yon', unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<Hizmet {self.tutar}>'
+
+# 7b. FIRMA RISK (Kredi limiti kontrolü için önceden hesaplanmış risk)
+class FirmaRisk(db.Model):
+    """
+    Firma başına tek satır: açık cari bakiye ve faturalanmamış kira bedeli.
+    app.cari.risk tarafından değişen firmalar için yeniden yazılır; kiralama
+    kaydındaki kredi limiti kontrolü cari hareketleri taramadan buradan okur.
+    """
+    __tablename__ = 'firma_risk'
+
+    firma_id = db.Column(db.Integer, db.ForeignKey('firma.id', ondelete='CASCADE'), primary_key=True)
+
+    # Borç - alacak (HizmetKaydi giden + Odeme odeme - HizmetKaydi gelen - Odeme tahsilat)
+    acik_alacak = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    # Açık kalemlerin bitişten sonraki, henüz dönem faturası kesilmemiş günleri (hesap_tarihi dahil)
+    faturasiz_kira = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    hesap_tarihi = db.Column(db.Date, nullable=False)
+
+    @property
+    def risk(self):
+        return (self.acik_alacak or 0) + (self.faturasiz_kira or 0)
+
+    def __repr__(self):
+        return f'<FirmaRisk {self.firma_id} {self.acik_alacak}+{self.faturasiz_kira}>'
+
+# 8. DOVIZ KURU (TCMB Günlük Kurları)
+class DovizKuru(db.Model):
+    __tablename__ = 'doviz_kuru'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # TCMB bülten tarihi (hafta sonu/tatil günlerinde kayıt oluşmaz)
+    tarih = db.Column(db.Date, nullable=False)
+    para_birimi = db.Column(db.String(3), nullable=False)
+    
+    # ForexBuying / ForexSelling (Kiralama.doviz_kuru_* ile aynı hassasiyet)
+    alis = db.Column(db.Numeric(10, 4), nullable=True)
+    satis = db.Column(db.Numeric(10, 4), nullable=True)
+    
+    __table_args__ = (db.UniqueConstraint('tarih', 'para_birimi', name='_doviz_kuru_tarih_para_birimi_uc'),)
     
     def __repr__(self):
-        return f'<Hizmet {self.tutar}>'
\ No newline at end of file
+        return f'<DovizKuru {self.tarih} {self.para_birimi} {self.satis}>'
@@ -0,0 +1,266 @@
+"""
+Firma riski ve kredi limiti kontrolü ('firma_risk').
+
+Yeni kiralama, büyük borcu olan müşteriler için de sorgusuz kabul ediliyordu;
+riski görmenin tek yolu firmalar.bilgi sayfasındaki tüm HizmetKaydi ve Odeme
+kayıtlarını yürüten cari dökümdü. Burada firma başına tek satır tutulur:
+
+    acik_alacak     borç - alacak (cari_durum_raporu ile aynı formül)
+    faturasiz_kira  açık kalemlerin bitişten sonraki, henüz dönem faturası
+                    kesilmemiş günlerinin bedeli (hesap_tarihi dahil)
+    risk            acik_alacak + faturasiz_kira
+
+Sözleşme aralığının bedeli kiralama açılırken cari kayda yazıldığından açık
+alacağın içindedir; aktif kiralamaların ek değeri yalnızca bitişi geçmiş
+günlerdir. Satırlar kiralama özeti gibi yalnızca değişen firmalar için
+yeniden yazılır: ORM flush'ında otomatik, toplu (Core) yazımlardan sonra
+firma_risklerini_guncelle() ile. faturasiz_kira güne bağlıdır; gün içinde
+ilk kontrol eskimiş satırı o firma için tazeler, 'flask cari risk-yenile'
+gece tüm açık riskleri günceller.
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import case, delete, event, func, select, union
+
+from app.extensions import db
+from app.cari.models import FirmaRisk, HizmetKaydi, Odeme
+from app.firmalar.models import Firma
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.kiralama.fiyatlama import KURUS, kira_bedeli
+from app.kiralama.ozet import PARCA_BOYUTU
+from app.olaylar import degisti, eski_degerler
+
+SIFIR = Decimal('0.00')
+LIMIT_DAVRANISLARI = ('uyar', 'engelle')
+
+# Riski etkileyen alanlar ('kiralama': koleksiyondan çıkarılan, flush'ta silinecek kalem)
+_KAYIT_ALANLARI = ('firma_id', 'tutar', 'yon')
+_ODEME_ALANLARI = ('firma_musteri_id', 'tutar', 'yon')
+_KALEM_ALANLARI = ('kiralama', 'kiralama_id', 'kiralama_baslangici', 'kiralama_bitis',
+                   'kiralama_brm_fiyat', 'sonlandirildi')
+
+
+class KrediDurumu(namedtuple('KrediDurumu', 'limit risk yeni_risk')):
+    """Kredi limiti kontrolü: limit, mevcut risk ve yeni kiralama sonrası risk (Decimal)."""
+    __slots__ = ()
+
+    @property
+    def asim(self):
+        return self.yeni_risk > self.limit
+
+
+def _tutar(deger):
+    return Decimal(str(deger or 0)).quantize(KURUS)
+
+
+def _acik_alacaklar(conn, firma_idler):
+    """{firma_id: borç - alacak} — ix_hizmet_kaydi_firma_tarih ve ix_odeme_firma indekslerinden."""
+    bakiyeler = {}
+    for firma_id, tutar in conn.execute(
+        select(HizmetKaydi.firma_id,
+               func.sum(case((HizmetKaydi.yon == 'giden', HizmetKaydi.tutar), else_=-HizmetKaydi.tutar)))
+        .where(HizmetKaydi.firma_id.in_(firma_idler))
+        .group_by(HizmetKaydi.firma_id)
+    ):
+        bakiyeler[firma_id] = bakiyeler.get(firma_id, SIFIR) + _tutar(tutar)
+    for firma_id, tutar in conn.execute(
+        select(Odeme.firma_musteri_id,
+               func.sum(case((Odeme.yon == 'odeme', Odeme.tutar), else_=-Odeme.tutar)))
+        .where(Odeme.firma_musteri_id.in_(firma_idler))
+        .group_by(Odeme.firma_musteri_id)
+    ):
+        bakiyeler[firma_id] = bakiyeler.get(firma_id, SIFIR) + _tutar(tutar)
+    return bakiyeler
+
+
+def _faturasiz_kiralar(conn, firma_idler, bugun):
+    """{firma_id: bitişi geçmiş açık kalemlerin henüz faturalanmamış kira bedeli}."""
+    kalemler = conn.execute(
+        select(KiralamaKalemi.id, Kiralama.firma_musteri_id, KiralamaKalemi.kiralama_baslangici,
+               KiralamaKalemi.kiralama_bitis, KiralamaKalemi.kiralama_brm_fiyat)
+        .join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id)
+        .where(Kiralama.firma_musteri_id.in_(firma_idler),
+               KiralamaKalemi.sonlandirildi == False,  # kısmi indeks koşulu, bkz. app.kiralama.vade
+               KiralamaKalemi.kiralama_bitis < bugun)
+    ).all()
+    if not kalemler:
+        return {}
+
+    # Dönem faturalarının kapsadığı son gün (kalem başına)
+    son_donem = dict(conn.execute(
+        select(HizmetKaydi.kalem_id, func.max(HizmetKaydi.donem_bitis))
+        .where(HizmetKaydi.kalem_id.in_([k.id for k in kalemler]), HizmetKaydi.yon == 'giden',
+               HizmetKaydi.kaynak_tipi == 'donem')
+        .group_by(HizmetKaydi.kalem_id)
+    ).all())
+
+    tutarlar = {}
+    for k in kalemler:
+        bas = k.kiralama_bitis + timedelta(days=1)
+        if son_donem.get(k.id):
+            bas = max(bas, son_donem[k.id] + timedelta(days=1))
+        bas = max(bas, k.kiralama_baslangici)
+        gun = (bugun - bas).days + 1
+        if gun > 0:
+            tutarlar[k.firma_musteri_id] = tutarlar.get(k.firma_musteri_id, SIFIR) + kira_bedeli(gun, k.kiralama_brm_fiyat)
+    return tutarlar
+
+
+def kiralamalarin_firmalari(conn, kiralama_idler):
+    """Kiralamaların müşterileri ve cari kaydı olan tedarikçileri (tek sorgu)."""
+    idler = [int(i) for i in kiralama_idler if i is not None]
+    if not idler:
+        return set()
+    return set(conn.execute(union(
+        select(Kiralama.firma_musteri_id).where(Kiralama.id.in_(idler)),
+        select(HizmetKaydi.firma_id).where(HizmetKaydi.kiralama_id.in_(idler)),
+    )).scalars())
+
+
+def firma_risklerini_guncelle(conn, firma_idler, bugun=None):
+    """Verilen firmaların risk satırlarını silip yeniden yazar (silinmiş firmalar düşer)."""
+    bugun = bugun or date.today()
+    idler = sorted({int(i) for i in firma_idler if i is not None})
+    tablo = FirmaRisk.__table__
+    for i in range(0, len(idler), PARCA_BOYUTU):
+        parca = idler[i:i + PARCA_BOYUTU]
+        conn.execute(delete(tablo).where(tablo.c.firma_id.in_(parca)))
+        mevcut = conn.execute(select(Firma.id).where(Firma.id.in_(parca))).scalars().all()
+        if not mevcut:
+            continue
+        acik = _acik_alacaklar(conn, mevcut)
+        faturasiz = _faturasiz_kiralar(conn, mevcut, bugun)
+        conn.execute(tablo.insert(), [{
+            'firma_id': firma_id, 'acik_alacak': acik.get(firma_id, SIFIR),
+            'faturasiz_kira': faturasiz.get(firma_id, SIFIR), 'hesap_tarihi': bugun,
+        } for firma_id in mevcut])
+
+
+def firma_risklerini_yeniden_olustur():
+    """Tüm risk tablosunu sıfırdan kurar ve işlenen firma sayısını döndürür."""
+    with db.engine.begin() as conn:
+        conn.execute(delete(FirmaRisk.__table__))
+        idler = conn.execute(select(Firma.id)).scalars().all()
+        firma_risklerini_guncelle(conn, idler)
+        return len(idler)
+
+
+def gunluk_riskleri_yenile(bugun=None):
+    """
+    Güne bağlı faturasız kira bedelini tazeler: bugün hesaplanmamış satırlardan
+    bitişi geçmiş açık kalemi olan ya da faturasız bedeli kalmış firmalar.
+    Yenilenen firma sayısını döndürür.
+    """
+    bugun = bugun or date.today()
+    with db.engine.begin() as conn:
+        idler = set(conn.execute(
+            select(Kiralama.firma_musteri_id)
+            .join(KiralamaKalemi, KiralamaKalemi.kiralama_id == Kiralama.id)
+            .where(KiralamaKalemi.sonlandirildi == False, KiralamaKalemi.kiralama_bitis < bugun)
+            .distinct()
+        ).scalars())
+        idler.update(conn.execute(
+            select(FirmaRisk.firma_id).where(FirmaRisk.faturasiz_kira != 0)
+        ).scalars())
+        guncel = set(conn.execute(
+            select(FirmaRisk.firma_id).where(FirmaRisk.hesap_tarihi >= bugun)
+        ).scalars())
+        idler -= guncel
+        firma_risklerini_guncelle(conn, idler, bugun)
+        return len(idler)
+
+
+# -------------------------------------------------------------------------
+# KREDİ LİMİTİ KONTROLÜ
+# -------------------------------------------------------------------------
+def _risk_satiri(firma_id):
+    return db.session.execute(
+        select(Firma.kredi_limiti, FirmaRisk.acik_alacak, FirmaRisk.faturasiz_kira, FirmaRisk.hesap_tarihi)
+        .outerjoin(FirmaRisk, FirmaRisk.firma_id == Firma.id)
+        .where(Firma.id == firma_id)
+    ).first()
+
+
+def kredi_durumu(firma_id, ek_tutar=SIFIR, bugun=None):
+    """
+    Firmanın kredi limiti durumu (tek satır okuma). Limiti tanımlı değilse None.
+    Satır yoksa ya da bugün hesaplanmamışsa yalnızca bu firma için tazelenir.
+    """
+    bugun = bugun or date.today()
+    satir = _risk_satiri(firma_id)
+    if satir is None or satir.kredi_limiti is None:
+        return None
+    if satir.hesap_tarihi is None or satir.hesap_tarihi < bugun:
+        firma_risklerini_guncelle(db.session.connection(), [firma_id], bugun)
+        satir = _risk_satiri(firma_id)
+    risk = _tutar(satir.acik_alacak) + _tutar(satir.faturasiz_kira)
+    return KrediDurumu(_tutar(satir.kredi_limiti), risk, risk + _tutar(ek_tutar))
+
+
+def limit_davranisi():
+    """Limit aşımında 'uyar' (kayıt yapılır, uyarı gösterilir) ya da 'engelle'."""
+    davranis = current_app.config.get('KREDI_LIMITI_ASIMI', 'engelle')
+    return davranis if davranis in LIMIT_DAVRANISLARI else 'engelle'
+
+
+def _tl(deger):
+    return "{:,.2f}".format(deger).replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def kredi_limiti_mesaji(durum):
+    return (f"Müşteri kredi limiti aşılıyor: risk {_tl(durum.risk)} TL, bu kiralama ile "
+            f"{_tl(durum.yeni_risk)} TL (limit {_tl(durum.limit)} TL).")
+
+
+# -------------------------------------------------------------------------
+# ORM SENKRONİZASYONU (bkz. app.olaylar)
+# -------------------------------------------------------------------------
+
+@event.listens_for(db.session, 'after_flush')
+def _firma_risklerini_senkronize_et(session, flush_context):
+    firma_idler, kiralama_idler = set(), set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, HizmetKaydi):
+            firma_idler.add(obj.firma_id)
+        elif isinstance(obj, Odeme):
+            firma_idler.add(obj.firma_musteri_id)
+        elif isinstance(obj, Kiralama):
+            firma_idler.add(obj.firma_musteri_id)
+        elif isinstance(obj, KiralamaKalemi):
+            # Dış tedarik kaleminin alış kaydı (ve dönem faturası) tedarikçinin carisindedir
+            kiralama_idler.add(obj.kiralama_id)
+            firma_idler.add(obj.harici_ekipman_tedarikci_id)
+        elif isinstance(obj, Firma):
+            firma_idler.add(obj.id)
+
+    for obj in session.dirty:
+        if isinstance(obj, HizmetKaydi) and degisti(obj, *_KAYIT_ALANLARI):
+            firma_idler.add(obj.firma_id)
+            firma_idler.update(eski_degerler(obj, 'firma_id'))
+        elif isinstance(obj, Odeme) and degisti(obj, *_ODEME_ALANLARI):
+            firma_idler.add(obj.firma_musteri_id)
+            firma_idler.update(eski_degerler(obj, 'firma_musteri_id'))
+        elif isinstance(obj, KiralamaKalemi) and degisti(obj, *_KALEM_ALANLARI):
+            kiralama_idler.add(obj.kiralama_id)
+            kiralama_idler.update(eski_degerler(obj, 'kiralama_id'))
+            firma_idler.add(obj.harici_ekipman_tedarikci_id)
+        elif isinstance(obj, Kiralama) and degisti(obj, 'firma_musteri_id'):
+            firma_idler.add(obj.firma_musteri_id)
+            firma_idler.update(eski_degerler(obj, 'firma_musteri_id'))
+
+    kiralama_idler.discard(None)
+    firma_idler.discard(None)
+    if not (kiralama_idler or firma_idler):
+        return
+
+    conn = session.connection()
+    if kiralama_idler:
+        firma_idler.update(conn.execute(
+            select(Kiralama.firma_musteri_id).where(Kiralama.id.in_(kiralama_idler))
+        ).scalars())
+        firma_idler.discard(None)
+    if firma_idler:
+        firma_risklerini_guncelle(conn, firma_idler)
@@ -4,6 +4,7 @@ from app.cari import cari_bp
 from app.cari.forms import OdemeForm, HizmetKaydiForm, KasaForm
 from app.cari.models import Kasa, Odeme, HizmetKaydi
 from app.firmalar.models import Firma
+from app import referans
 from sqlalchemy import func, case
 
 
@@ -57,8 +58,8 @@ def odeme_ekle():
     yon_param = request.args.get('yon', 'tahsilat')
     form = OdemeForm()
     
-    form.firma_musteri_id.choices = [(f.id, f.firma_adi) for f in Firma.query.filter_by(is_active=True).all()]
-    form.kasa_id.choices = [(k.id, f"{k.kasa_adi} ({k.bakiye} TL)") for k in Kasa.query.all()]
+    form.firma_musteri_id.choices = list(referans.firmalar())
+    form.kasa_id.choices = [(k_id, f"{adi} ({bakiye} TL)") for k_id, adi, bakiye, _ in referans.kasalar()]
     
     if request.method == 'GET':
         if firma_id: form.firma_musteri_id.data = firma_id
@@ -120,7 +121,7 @@ def odeme_sil(id):
 def hizmet_ekle():
     firma_id = request.args.get('firma_id', type=int)
     form = HizmetKaydiForm()
-    form.firma_id.choices = [(f.id, f.firma_adi) for f in Firma.query.filter_by(is_active=True).all()]
+    form.firma_id.choices = list(referans.firmalar())
     if request.method == 'GET':
         if firma_id: form.firma_id.data = firma_id
         form.tarih.data = date.today()
@@ -151,7 +152,7 @@ def hizmet_sil(id):
     f_id = hizmet.firma_id
     
     # Nakliye modülü ile bağlantısı varsa silinmesini engelliyoruz (Senin yapındaki koruma)
-    if hasattr(hizmet, 'nakliye_id') and hizmet.nakliye_id:
+    if hizmet.kaynak_tipi == 'nakliye' and hizmet.nakliye_id:
         flash('Nakliye bağlantılı kayıtlar buradan silinemez!', 'warning')
         return redirect(url_for('firmalar.bilgi', id=f_id))
         
@@ -173,7 +174,7 @@ def hizmet_duzelt(id):
     form = HizmetKaydiForm(obj=hizmet)
     
     # 3. Firma listesini dropdown için tekrar yükle
-    form.firma_id.choices = [(f.id, f.firma_adi) for f in Firma.query.filter_by(is_active=True).all()]
+    form.firma_id.choices = list(referans.firmalar())
 
     if form.validate_on_submit():
         try:
@@ -4,6 +4,7 @@ import platform
 import logging
 import re
 from datetime import date
+from decimal import Decimal
 from flask import send_file, flash, redirect, url_for, current_app
 from docxtpl import DocxTemplate
 
@@ -11,6 +12,8 @@ from docxtpl import DocxTemplate
 try:
     from app.kiralama.models import Kiralama, KiralamaKalemi
     from app.firmalar.models import Firma
+    from app.kiralama.fiyatlama import kalem_bedeli
+    from app.filo.harici import makine_adi
 except ImportError as e:
     logging.error(f"Modeller içe aktarılamadı: {e}")
 
@@ -97,19 +100,19 @@ def kiralama_formu_yazdir(rental_id):
 
         # 2. Kalemler Listesini Hazırla
         kalemler_listesi = []
-        genel_toplam = 0
+        genel_toplam = Decimal('0.00')
         
         for kalem in kiralama.kalemler:
-            # Süre ve tutar hesaplama
-            gun = (kalem.kiralama_bitis - kalem.kiralama_baslangici).days + 1
-            birim_fiyat = float(kalem.kiralama_brm_fiyat or 0)
-            nakliye = float(kalem.nakliye_satis_fiyat or 0)
-            satir_toplam = (gun * birim_fiyat) + nakliye
+            # Süre ve tutar hesaplama (app.kiralama.fiyatlama, Decimal)
+            birim_fiyat = kalem.kiralama_brm_fiyat or Decimal('0.00')
+            gun, _, nakliye, satir_toplam = kalem_bedeli(
+                kalem.kiralama_baslangici, kalem.kiralama_bitis, birim_fiyat, kalem.nakliye_satis_fiyat)
             genel_toplam += satir_toplam
             
             if kalem.is_dis_tedarik_ekipman:
-                ekipman_adi = f"{kalem.harici_ekipman_marka} {kalem.harici_ekipman_model}"
-                seri_no = kalem.harici_ekipman_seri_no or "-"
+                harici = kalem.harici_ekipman
+                ekipman_adi = makine_adi(harici.marka, harici.model, "Dış Tedarik") if harici else "Dış Tedarik"
+                seri_no = (harici.gorunen_seri_no if harici else "") or "-"
             else:
                 ekipman_adi = f"{kalem.ekipman.kod} ({kalem.ekipman.tipi})" if kalem.ekipman else "Tanımsız"
                 seri_no = kalem.ekipman.seri_no if kalem.ekipman else "-"
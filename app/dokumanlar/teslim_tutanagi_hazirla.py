@@ -2,6 +2,7 @@ import logging
 from flask import send_file, flash, redirect, url_for, current_app
 from . import dokumanlar_bp
 from .engine_teslim_tutanagi import teslim_tutanagi_uret
+from app.filo.harici import makine_adi
 
 # Modelleri projenizdeki yapıya göre en güvenli şekilde çekiyoruz
 try:
@@ -33,8 +34,9 @@ def teslim_tutanagi_hazirla(rental_id):
         for kalem in kiralama.kalemler:
             # Ekipman ve Seri No Belirleme
             if kalem.is_dis_tedarik_ekipman:
-                ekipman_adi = f"{kalem.harici_ekipman_marka} {kalem.harici_ekipman_model}"
-                seri_no = kalem.harici_ekipman_seri_no or "-"
+                harici = kalem.harici_ekipman
+                ekipman_adi = makine_adi(harici.marka, harici.model, "Dış Tedarik") if harici else "Dış Tedarik"
+                seri_no = (harici.gorunen_seri_no if harici else "") or "-"
             else:
                 ekipman_adi = f"{kalem.ekipman.kod} ({kalem.ekipman.tipi})" if kalem.ekipman else "Bilinmiyor"
                 seri_no = kalem.ekipman.seri_no if kalem.ekipman else "-"
@@ -0,0 +1,105 @@
+"""
+Makine çalışma durumu geçişleri (bosta / kirada / serviste).
+
+Durum önce okunup sonra yazıldığında iki kullanıcı aynı boştaki makineyi
+aynı anda kiralayabiliyordu. Buradaki her geçiş tek bir koşullu UPDATE'tir
+(karşılaştır-ve-değiştir):
+
+    UPDATE ekipman SET calisma_durumu = 'kirada'
+    WHERE id = :id AND calisma_durumu = 'bosta'
+
+Etkilenen satır sayısı talebin başarılı olup olmadığını söyler. Tablo kilidi
+gerekmez: satır kilidi (PostgreSQL) ya da yazma kilidi (SQLite) commit'e kadar
+tutulur, eşzamanlı ikinci talep sıraya girer ve 0 satır etkiler.
+
+Güncelleme oturumdaki Ekipman nesnelerine de yansıtılır (synchronize_session);
+referans ve takvim önbellekleri do_orm_execute olayıyla geçersiz kılınır.
+"""
+from sqlalchemy import update
+
+from app.extensions import db
+from app.filo.models import Ekipman
+
+BOSTA, KIRADA, SERVISTE = 'bosta', 'kirada', 'serviste'
+
+
+class DurumCakismasi(Exception):
+    """Makine beklenen durumda değil; talep başka bir işlem tarafından önce yapılmış."""
+
+    def __init__(self, ekipmanlar, yeni_durum):
+        self.ekipmanlar = list(ekipmanlar)   # [kod ya da id]
+        self.yeni_durum = yeni_durum
+        super().__init__(
+            f"{', '.join(str(e) for e in self.ekipmanlar)} makinesi artık müsait değil "
+            f"(başka bir işlemde kullanıldı ya da serviste). Lütfen listeyi yenileyip tekrar deneyin."
+        )
+
+
+def durum_degistir(ekipman_idleri, yeni, beklenen):
+    """
+    calisma_durumu 'beklenen' durumlardan birinde olan makineleri 'yeni' duruma
+    geçirir. Tek id ya da id listesi alır; etkilenen satır sayısını döndürür.
+    """
+    if isinstance(ekipman_idleri, int):
+        ekipman_idleri = [ekipman_idleri]
+    ekipman_idleri = list(ekipman_idleri)
+    if not ekipman_idleri:
+        return 0
+    if isinstance(beklenen, str):
+        beklenen = (beklenen,)
+    sonuc = db.session.execute(
+        update(Ekipman)
+        .where(Ekipman.id.in_(ekipman_idleri), Ekipman.calisma_durumu.in_(beklenen))
+        .values(calisma_durumu=yeni)
+    )
+    return sonuc.rowcount
+
+
+def rezerve_et(ekipman_id):
+    """Boştaki makineyi kiraya ayırır. Makine boşta değilse False."""
+    return durum_degistir(ekipman_id, KIRADA, BOSTA) == 1
+
+
+def rezerve_et_hepsi(ekipman_idleri):
+    """
+    Makineleri tek tek ayırır; biri bile ayrılamazsa DurumCakismasi yükseltir
+    (çağıran taraf rollback yapar, böylece ayrılanlar da geri alınır).
+    """
+    alinamayan = [e_id for e_id in dict.fromkeys(ekipman_idleri) if not rezerve_et(e_id)]
+    if alinamayan:
+        kodlar = dict(db.session.query(Ekipman.id, Ekipman.kod).filter(Ekipman.id.in_(alinamayan)).all())
+        raise DurumCakismasi([kodlar.get(e_id, e_id) for e_id in alinamayan], KIRADA)
+
+
+def rezerve_edilenler(ekipman_idleri):
+    """
+    Toplu ayırma: boştaki makineleri tek UPDATE ile kiraya alır ve ayrılabilen
+    id'lerin kümesini döndürür (RETURNING). Veritabanı UPDATE ... RETURNING
+    desteklemiyorsa makineler tek tek ayrılır.
+    """
+    ekipman_idleri = list(dict.fromkeys(ekipman_idleri))
+    if not ekipman_idleri:
+        return set()
+    if not db.session.get_bind().dialect.update_returning:
+        return {e_id for e_id in ekipman_idleri if rezerve_et(e_id)}
+    return set(db.session.execute(
+        update(Ekipman)
+        .where(Ekipman.id.in_(ekipman_idleri), Ekipman.calisma_durumu == BOSTA)
+        .values(calisma_durumu=KIRADA)
+        .returning(Ekipman.id)
+    ).scalars())
+
+
+def serbest_birak(ekipman_idleri):
+    """Kiradaki makineleri boşa alır. Servisteki ya da zaten boştaki makinelere dokunmaz."""
+    return durum_degistir(ekipman_idleri, BOSTA, KIRADA)
+
+
+def servise_al(ekipman_id):
+    """Boştaki makineyi servise alır. Makine boşta değilse False."""
+    return durum_degistir(ekipman_id, SERVISTE, BOSTA) == 1
+
+
+def servisten_cikar(ekipman_id):
+    """Servisteki makineyi boşa alır. Makine serviste değilse False."""
+    return durum_degistir(ekipman_id, BOSTA, SERVISTE) == 1
@@ -0,0 +1,274 @@
+"""
+Dış tedarik (harici) makine kataloğu.
+
+Dış tedarik kalemleri makine bilgilerini (tip, marka, model, seri no,
+yükseklik, kapasite, üretim yılı) eskiden her satırda ayrı ayrı taşıyordu;
+aynı tedarikçinin aynı makinesi her kiralamada yeniden yazılıyor, arama da
+kalem tablosunu tarıyordu. Tedarikçiye ait makineler zaten 'ekipman'
+tablosunda firma_tedarikci_id ile tutuluyor (filo.harici); katalog bu
+satırlardır ve kalem yalnızca harici_ekipman_id ile onu gösterir.
+
+Tekilleştirme anahtarı (firma_tedarikci_id, seri_no) — mevcut
+_tedarikci_seri_no_uc kısıtı. Seri no boşluk/büyük harf farkı gözetilmeden
+normalize edilir. Seri numarası bilinmeyen makinede seri_no, makine
+bilgilerinin özetinden türetilen 'SN-YOK-...' değeridir; aynı bilgilerle
+gelen serisiz makine de aynı satıra düşer. Bulunamayan makineler tek toplu
+INSERT ile eklenir (eşzamanlı eklemede kısıt çakışması sessizce geçilir).
+Seri no'lu makinede formda düzeltilen bilgiler (tip, marka, model, ...)
+katalog satırına yazılır (katalog_duzeltmeleri); serisiz makinede bilgiler
+anahtarın parçası olduğundan farklı bilgi ayrı satıra düşer.
+
+Typeahead (katalog_ara) kalem tablosuna inmez, yalnızca indeksleri okur:
+seri no / kod öneki ix_ekipman_seri_no / ix_ekipman_kod aralıklarından,
+marka / model öneki kısmi ix_ekipman_harici_katalog indeksinden (yalnızca
+tedarikçi makineleri; tedarikçi seçiliyse onun aralığı).
+"""
+import hashlib
+
+from sqlalchemy import and_, func, insert, or_, select
+
+from app.extensions import db
+from app.filo.models import Ekipman, SERISIZ_SERI_ONEKI
+from app.firmalar.models import Firma
+
+BILINMEYEN_MARKA = 'Bilinmiyor'
+ONERI_LIMITI = 15
+PARCA_BOYUTU = 500
+KOD_UZUNLUGU = 100  # Ekipman.kod
+
+# Makine bilgisi sözlüğünün alanları (Ekipman sütun adlarıyla)
+BILGI_ALANLARI = ('tipi', 'marka', 'model', 'seri_no', 'calisma_yuksekligi',
+                  'kaldirma_kapasitesi', 'uretim_tarihi')
+# _makine_alanlari'nın boş girişte ürettiği değerler
+BOS_DEGERLER = {'tipi': '', 'marka': BILINMEYEN_MARKA, 'model': '', 'calisma_yuksekligi': 0,
+                'kaldirma_kapasitesi': 0, 'uretim_tarihi': ''}
+
+
+def _metin(deger):
+    """Baştaki/sondaki ve tekrarlanan boşlukları atar; None -> ''."""
+    return ' '.join(str(deger).split()) if deger is not None else ''
+
+
+def _sayi(deger):
+    try:
+        return int(deger) if deger not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def seri_no_normalize(seri_no):
+    return _metin(seri_no).upper()
+
+
+def _makine_alanlari(bilgi):
+    """Bilgi sözlüğünün katalogda saklanacak normalize hali (seri no hariç)."""
+    return {
+        'tipi': _metin(bilgi.get('tipi')),
+        'marka': _metin(bilgi.get('marka')) or BILINMEYEN_MARKA,
+        'model': _metin(bilgi.get('model')),
+        'calisma_yuksekligi': _sayi(bilgi.get('calisma_yuksekligi')) or 0,
+        'kaldirma_kapasitesi': _sayi(bilgi.get('kaldirma_kapasitesi')) or 0,
+        'uretim_tarihi': _metin(bilgi.get('uretim_tarihi')),
+    }
+
+
+def katalog_seri_no(bilgi):
+    """Makinenin katalogdaki seri no'su: normalize edilmiş seri no ya da makine bilgilerinin özeti."""
+    seri_no = seri_no_normalize(bilgi.get('seri_no'))
+    if seri_no:
+        return seri_no
+    imza = '|'.join(str(deger).lower() for deger in _makine_alanlari(bilgi).values())
+    return SERISIZ_SERI_ONEKI + hashlib.sha1(imza.encode('utf-8')).hexdigest()[:10].upper()
+
+
+def katalog_anahtari(tedarikci_id, bilgi):
+    return int(tedarikci_id), katalog_seri_no(bilgi)
+
+
+def _katalog_satiri(tedarikci_id, seri_no, bilgi):
+    """Yeni katalog makinesinin 'ekipman' satırı. Kod tedarikçi + seri no'dan türetilir (bkz. _kodlari_ayir)."""
+    return {
+        'kod': f"H{tedarikci_id}-{seri_no}"[:KOD_UZUNLUGU],
+        'yakit': '',
+        'seri_no': seri_no,
+        'firma_tedarikci_id': tedarikci_id,
+        'is_active': True,
+        **_makine_alanlari(bilgi),
+    }
+
+
+def makine_bilgisi(ekipman):
+    """Katalog makinesinin bilgi sözlüğü (form / öneri); türetilmiş değerler boş döner."""
+    return {
+        'tipi': ekipman.tipi or '',
+        'marka': '' if ekipman.marka == BILINMEYEN_MARKA else ekipman.marka,
+        'model': ekipman.model or '',
+        'seri_no': ekipman.gorunen_seri_no,
+        'calisma_yuksekligi': ekipman.calisma_yuksekligi or None,
+        'kaldirma_kapasitesi': ekipman.kaldirma_kapasitesi or None,
+        'uretim_tarihi': ekipman.uretim_tarihi or '',
+    }
+
+
+def makine_adi(marka, model, varsayilan=''):
+    """Harici makinenin kısa adı: 'Marka Model'."""
+    marka = '' if marka == BILINMEYEN_MARKA else (marka or '')
+    return f"{marka} {model or ''}".strip() or varsayilan
+
+
+def _mevcut_idler(conn, anahtarlar):
+    """{(tedarikci_id, seri_no): ekipman_id} — (tedarikci, seri_no) kısıt indeksinden."""
+    bulunan = {}
+    for tedarikci_id in {t for t, _ in anahtarlar}:
+        seri_nolar = sorted({s for t, s in anahtarlar if t == tedarikci_id})
+        for i in range(0, len(seri_nolar), PARCA_BOYUTU):
+            for ekipman_id, seri_no in conn.execute(
+                select(Ekipman.id, Ekipman.seri_no)
+                .where(Ekipman.firma_tedarikci_id == tedarikci_id,
+                       Ekipman.seri_no.in_(seri_nolar[i:i + PARCA_BOYUTU]))
+            ).all():
+                bulunan[(tedarikci_id, seri_no)] = ekipman_id
+    return bulunan
+
+
+def _kodlari_ayir(conn, satirlar):
+    """
+    Yeni satırların kodlarını tablo genelinde tekil yapar: kod başka bir
+    makinede (ya da 100 karaktere kırpılınca aynı kalan başka bir seri no'da)
+    kullanılıyorsa migration'daki gibi '-N' eki alır.
+    """
+    kodlar = sorted({r['kod'] for r in satirlar})
+    dolu = set()
+    for i in range(0, len(kodlar), PARCA_BOYUTU):
+        dolu.update(conn.execute(select(Ekipman.kod).where(Ekipman.kod.in_(kodlar[i:i + PARCA_BOYUTU]))).scalars())
+
+    ayrilan = set()
+    for r in satirlar:
+        taban = r['kod']
+        if taban not in dolu and taban not in ayrilan:
+            ayrilan.add(taban)
+            continue
+        kok = taban[:KOD_UZUNLUGU - 4]
+        dolu.update(conn.execute(select(Ekipman.kod).where(_onek(Ekipman.kod, kok + '-'))).scalars())
+        sira = 2
+        while f"{kok}-{sira}" in dolu or f"{kok}-{sira}" in ayrilan:
+            sira += 1
+        r['kod'] = f"{kok}-{sira}"
+        ayrilan.add(r['kod'])
+
+
+def _ekle(conn, satirlar):
+    """Eksik katalog satırlarını tek INSERT ile yazar; aynı anda eklenmiş olanlar atlanır."""
+    tablo = Ekipman.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        conn.execute(dialect_insert(tablo).on_conflict_do_nothing(
+            index_elements=['firma_tedarikci_id', 'seri_no']), satirlar)
+    else:
+        conn.execute(insert(tablo), satirlar)
+
+
+def katalog_idleri(conn, talepler):
+    """
+    Dış tedarik makinelerini katalogda bulur, olmayanları ekler.
+
+    conn: Connection ya da Session (çağıranın transaction'ı).
+    talepler: [(tedarikci_id, bilgi)] — bilgi BILGI_ALANLARI anahtarlı sözlük.
+    {katalog_anahtari: ekipman_id} döner. Mevcut makinenin bilgileri burada
+    değiştirilmez; formdan gelen düzeltmeler için katalog_duzeltmeleri.
+    """
+    bilgiler = {}
+    for tedarikci_id, bilgi in talepler:
+        if tedarikci_id:
+            bilgiler.setdefault(katalog_anahtari(tedarikci_id, bilgi), bilgi)
+    if not bilgiler:
+        return {}
+
+    idler = _mevcut_idler(conn, bilgiler)
+    eksik = [_katalog_satiri(t, s, b) for (t, s), b in bilgiler.items() if (t, s) not in idler]
+    if eksik:
+        _kodlari_ayir(conn, eksik)
+        _ekle(conn, eksik)
+        idler.update(_mevcut_idler(conn, {(r['firma_tedarikci_id'], r['seri_no']) for r in eksik}))
+    return idler
+
+
+def katalog_id(conn, tedarikci_id, bilgi):
+    """Tek makine için katalog_idleri; tedarikçi yoksa None."""
+    if not tedarikci_id:
+        return None
+    return katalog_idleri(conn, [(tedarikci_id, bilgi)]).get(katalog_anahtari(tedarikci_id, bilgi))
+
+
+def katalog_duzeltmeleri(conn, talepler, idler):
+    """
+    Seri no'lu katalog makinelerinde talepteki bilgilerin katalogdan farklı
+    olan alanları: {ekipman_id: {alan: yeni değer}}. Boş bırakılan alan
+    katalogdaki değeri korur. idler katalog_idleri'nin sonucudur.
+    """
+    istenen = {}
+    for tedarikci_id, bilgi in talepler:
+        if not tedarikci_id:
+            continue
+        anahtar = katalog_anahtari(tedarikci_id, bilgi)
+        if anahtar[1].startswith(SERISIZ_SERI_ONEKI) or anahtar not in idler:
+            continue
+        istenen.setdefault(idler[anahtar], {
+            alan: deger for alan, deger in _makine_alanlari(bilgi).items() if deger != BOS_DEGERLER[alan]})
+    if not any(istenen.values()):
+        return {}
+
+    alanlar = list(BOS_DEGERLER)
+    duzeltmeler = {}
+    for satir in conn.execute(
+        select(Ekipman.id, *[getattr(Ekipman, a) for a in alanlar]).where(Ekipman.id.in_(list(istenen)))
+    ).all():
+        mevcut = dict(zip(alanlar, satir[1:]))
+        fark = {a: d for a, d in istenen[satir.id].items() if mevcut[a] != d}
+        if fark:
+            duzeltmeler[satir.id] = fark
+    return duzeltmeler
+
+
+def katalog_duzeltmelerini_uygula(duzeltmeler):
+    """Düzeltmeleri ORM üzerinden yazar (özet ve arama dinleyicileri makine değişikliğini görür)."""
+    if not duzeltmeler:
+        return
+    for ekipman in Ekipman.query.filter(Ekipman.id.in_(list(duzeltmeler))).all():
+        for alan, deger in duzeltmeler[ekipman.id].items():
+            setattr(ekipman, alan, deger)
+
+
+# -------------------------------------------------------------------------
+# TYPEAHEAD
+# -------------------------------------------------------------------------
+def _onek(sutun, deger):
+    """'sutun LIKE deger%' yerine indeksle çalışan aralık koşulu."""
+    return and_(sutun >= deger, sutun < deger + '\U0010ffff')
+
+
+def katalog_ara(q, tedarikci_id=None, limit=ONERI_LIMITI):
+    """
+    Katalog önerileri: seri no / kod / marka / model öneki (marka ve model
+    büyük-küçük harf duyarsız). [dict] döner.
+    """
+    q = _metin(q)
+    if not q:
+        return []
+    kucuk = q.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    kosullar = [_onek(Ekipman.seri_no, q.upper()), _onek(Ekipman.kod, q), _onek(Ekipman.kod, q.upper()),
+                func.lower(Ekipman.marka).like(kucuk, escape='\\'),
+                func.lower(Ekipman.model).like(kucuk, escape='\\')]
+
+    sorgu = select(Ekipman, Firma.firma_adi) \
+        .join(Firma, Firma.id == Ekipman.firma_tedarikci_id) \
+        .where(Ekipman.firma_tedarikci_id.isnot(None), Ekipman.is_active.is_(True), or_(*kosullar))
+    if tedarikci_id:
+        sorgu = sorgu.where(Ekipman.firma_tedarikci_id == tedarikci_id)
+    satirlar = db.session.execute(sorgu.order_by(Ekipman.marka, Ekipman.model, Ekipman.id).limit(limit)).all()
+    return [dict(makine_bilgisi(e), id=e.id, kod=e.kod, tedarikci_id=e.firma_tedarikci_id, tedarikci=firma_adi)
+            for e, firma_adi in satirlar]
@@ -1,5 +1,8 @@
 from app.extensions import db
 
+# Seri numarası bilinmeyen harici katalog makinelerinin türetilmiş seri no öneki (bkz. app.filo.harici)
+SERISIZ_SERI_ONEKI = 'SN-YOK-'
+
 # 3. EKIPMAN (Filo)
 class Ekipman(db.Model):
     __tablename__ = 'ekipman'
@@ -32,12 +35,25 @@ class Ekipman(db.Model):
     
     bakim_kayitlari = db.relationship('BakimKaydi', back_populates='ekipman', cascade="all, delete-orphan")
 
-    __table_args__ = (db.UniqueConstraint('firma_tedarikci_id', 'seri_no', name='_tedarikci_seri_no_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('firma_tedarikci_id', 'seri_no', name='_tedarikci_seri_no_uc'),
+        # Harici makine kataloğu typeahead'i (app.filo.harici): yalnızca tedarikçi makineleri
+        db.Index('ix_ekipman_harici_katalog', 'firma_tedarikci_id', 'marka', 'model', 'seri_no',
+                 sqlite_where=db.text('firma_tedarikci_id IS NOT NULL'),
+                 postgresql_where=db.text('firma_tedarikci_id IS NOT NULL')),
+    )
 
     # Bu ekipmanın 'sahadan çekildiği' (eski makine olduğu) durumlar
     swap_cikis_kayitlari = db.relationship('MakineDegisim', foreign_keys='MakineDegisim.eski_ekipman_id', backref='eski_ekipman', lazy='dynamic')
     swap_giris_kayitlari = db.relationship('MakineDegisim', foreign_keys='MakineDegisim.yeni_ekipman_id', backref='yeni_ekipman', lazy='dynamic')
 
+    @property
+    def gorunen_seri_no(self):
+        """Belgelerde gösterilecek seri no (türetilmiş katalog seri no'su gösterilmez)."""
+        if not self.seri_no or self.seri_no.startswith(SERISIZ_SERI_ONEKI):
+            return ''
+        return self.seri_no
+
     def __repr__(self): 
         return f'<Ekipman {self.kod}>'
 
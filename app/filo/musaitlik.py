@@ -0,0 +1,146 @@
+"""
+Makine müsaitliği: "A ile B tarihleri arasında hangi makineler boş?"
+
+calisma_durumu ('bosta'/'kirada') yalnızca bugünü anlatır; ileri tarihli
+kiralamaları ve tarih çakışmalarını bilmez. Burada doluluk doğrudan
+KiralamaKalemi aralıklarından hesaplanır. Sorgular
+ix_kiralama_kalemi_musaitlik (ekipman_id, baslangic, bitis, sonlandirildi)
+indeksi üzerinden makine başına tek arama yapar.
+
+Doluluk kuralı:
+  * Sonlandırılmış kalem, makineyi yalnızca [başlangıç, bitiş] arasında tutar.
+  * Sonlandırılmamış kalem bitiş tarihi geçmiş olsa bile makine teslim
+    alınana kadar dolu sayılır (fiili bitiş = max(bitiş, bugün)).
+"""
+from datetime import date
+
+from sqlalchemy import and_, exists, func, or_
+
+from app.extensions import db
+from app.filo.models import Ekipman
+from app.kiralama.models import Kiralama, KiralamaKalemi
+
+
+def dolu_kalem_kosulu(baslangic, bitis, bugun):
+    """[baslangic, bitis] penceresiyle kesişen kalemler için koşul."""
+    bitis_kosulu = KiralamaKalemi.kiralama_bitis >= baslangic
+    if baslangic <= bugun:
+        # Teslim alınmamış (sonlandırılmamış) kalemin fiili bitişi bugüne uzar
+        bitis_kosulu = or_(bitis_kosulu, KiralamaKalemi.sonlandirildi.is_(False))
+    return and_(KiralamaKalemi.kiralama_baslangici <= bitis, bitis_kosulu)
+
+
+def musait_ekipmanlar_sorgusu(baslangic, bitis, tipi=None, min_yukseklik=None, min_kapasite=None, bugun=None):
+    """Pencerede boş olan kendi filo makinelerimiz (aktif, harici değil)."""
+    bugun = bugun or date.today()
+    dolu = exists().where(
+        KiralamaKalemi.ekipman_id == Ekipman.id,
+        dolu_kalem_kosulu(baslangic, bitis, bugun),
+    )
+    sorgu = Ekipman.query.filter(
+        Ekipman.is_active.is_(True),
+        Ekipman.firma_tedarikci_id.is_(None),
+        ~dolu,
+    )
+    if baslangic <= bugun:
+        # Serviste olan makine bugünü kapsayan pencerede verilemez
+        sorgu = sorgu.filter(Ekipman.calisma_durumu != 'serviste')
+    if tipi:
+        sorgu = sorgu.filter(func.lower(Ekipman.tipi) == tipi.strip().lower())
+    if min_yukseklik:
+        sorgu = sorgu.filter(Ekipman.calisma_yuksekligi >= min_yukseklik)
+    if min_kapasite:
+        sorgu = sorgu.filter(Ekipman.kaldirma_kapasitesi >= min_kapasite)
+    return sorgu.order_by(Ekipman.kod)
+
+
+# musait_ekipmanlar() satırlarında dönen alanlar. Tüm filo listelenebildiği için
+# ORM nesnesi yerine yalnızca bu sütunlar okunur (nesne kurma maliyeti sorgunun ~5 katı).
+MUSAITLIK_ALANLARI = (
+    Ekipman.id, Ekipman.kod, Ekipman.tipi, Ekipman.marka, Ekipman.model,
+    Ekipman.calisma_yuksekligi, Ekipman.kaldirma_kapasitesi, Ekipman.calisma_durumu,
+)
+
+
+def musait_ekipmanlar(baslangic, bitis, **filtreler):
+    """Pencerede boş makineler; MUSAITLIK_ALANLARI sütunlarından oluşan satırlar."""
+    if bitis < baslangic:
+        raise ValueError("Bitiş tarihi başlangıçtan önce olamaz.")
+    return musait_ekipmanlar_sorgusu(baslangic, bitis, **filtreler).with_entities(*MUSAITLIK_ALANLARI).all()
+
+
+def _kesisir(a_bas, a_bit, b_bas, b_bit):
+    return a_bas <= b_bit and b_bas <= a_bit
+
+
+def cakismalari_bul(talepler, haric_kalem_idler=(), bugun=None):
+    """
+    Kaydedilmek üzere olan makine atamalarının çakışmalarını bulur.
+
+    talepler: [(ekipman_id, baslangic, bitis)] — harici/makinesiz kalemler verilmez.
+    haric_kalem_idler: düzenlenen ya da silinecek kalemler (eski halleri sayılmaz).
+
+    Hem veritabanındaki diğer kalemlerle hem de taleplerin kendi aralarındaki
+    çakışmalar döner: [{'ekipman_id', 'kod', 'baslangic', 'bitis', 'kiralama_form_no'}]
+    Veritabanı tarafı tek sorgudur.
+    """
+    talepler = [(eid, bas, bit) for eid, bas, bit in talepler if eid and bas and bit]
+    if not talepler:
+        return []
+    bugun = bugun or date.today()
+
+    en_erken = min(bas for _, bas, _ in talepler)
+    en_gec = max(bit for _, _, bit in talepler)
+    sorgu = db.session.query(
+        KiralamaKalemi.id, KiralamaKalemi.ekipman_id, KiralamaKalemi.kiralama_baslangici,
+        KiralamaKalemi.kiralama_bitis, KiralamaKalemi.sonlandirildi,
+        Kiralama.kiralama_form_no, Ekipman.kod,
+    ).join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id) \
+     .join(Ekipman, Ekipman.id == KiralamaKalemi.ekipman_id) \
+     .filter(
+        KiralamaKalemi.ekipman_id.in_({eid for eid, _, _ in talepler}),
+        dolu_kalem_kosulu(en_erken, en_gec, bugun),
+    )
+    haric = [i for i in haric_kalem_idler if i]
+    if haric:
+        sorgu = sorgu.filter(KiralamaKalemi.id.notin_(haric))
+
+    mevcut = {}
+    for satir in sorgu:
+        fiili_bitis = satir.kiralama_bitis if satir.sonlandirildi else max(satir.kiralama_bitis, bugun)
+        mevcut.setdefault(satir.ekipman_id, []).append((satir.kiralama_baslangici, fiili_bitis, satir))
+
+    cakismalar = []
+    for i, (eid, bas, bit) in enumerate(talepler):
+        for m_bas, m_bit, satir in mevcut.get(eid, ()):
+            if _kesisir(bas, bit, m_bas, m_bit):
+                cakismalar.append({
+                    'ekipman_id': eid, 'kod': satir.kod,
+                    'baslangic': satir.kiralama_baslangici, 'bitis': satir.kiralama_bitis,
+                    'kiralama_form_no': satir.kiralama_form_no,
+                })
+        for eid2, bas2, bit2 in talepler[i + 1:]:
+            if eid2 == eid and _kesisir(bas, bit, bas2, bit2):
+                cakismalar.append({
+                    'ekipman_id': eid, 'kod': None,
+                    'baslangic': bas2, 'bitis': bit2, 'kiralama_form_no': None,
+                })
+
+    # Form içi çakışmalarda makine kodu ayrıca okunur
+    eksik = {c['ekipman_id'] for c in cakismalar if c['kod'] is None}
+    if eksik:
+        kodlar = dict(db.session.query(Ekipman.id, Ekipman.kod).filter(Ekipman.id.in_(eksik)))
+        for c in cakismalar:
+            if c['kod'] is None:
+                c['kod'] = kodlar.get(c['ekipman_id'])
+    return cakismalar
+
+
+def cakisma_mesaji(cakismalar):
+    """Çakışma listesini kullanıcıya gösterilecek tek satırlık mesaja çevirir."""
+    parcalar = []
+    for c in cakismalar:
+        aralik = f"{c['baslangic'].strftime('%d.%m.%Y')} - {c['bitis'].strftime('%d.%m.%Y')}"
+        yer = f"{c['kiralama_form_no']} formunda" if c['kiralama_form_no'] else "bu formda"
+        parcalar.append(f"{c['kod']} ({yer} {aralik})")
+    return "Makine bu tarihlerde dolu: " + "; ".join(parcalar)
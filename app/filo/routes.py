@@ -24,6 +24,13 @@ from app.cari.models import Kasa, Odeme, HizmetKaydi
 
 
 from app.filo.forms import EkipmanForm 
+from app.filo.musaitlik import musait_ekipmanlar
+from app.filo.takvim import doluluk_takvimi, VARSAYILAN_GUN
+from app.filo.durum import serbest_birak, servise_al, servisten_cikar, durum_degistir
+from app.filo.harici import katalog_ara
+from app.sayfalama import keyset_sayfala
+import time
+from datetime import date
 import locale
 
 # Türkçe yerel ayarlarını dene
@@ -49,7 +56,7 @@ def clean_currency_input(value_str):
 @filo_bp.route('/index')
 def index():
     try:
-        page = request.args.get('page', 1, type=int)
+        imlec = request.args.get('imlec', type=str)
         q = request.args.get('q', '', type=str)
         
         # SADECE AKTİF VE BİZİM OLANLAR
@@ -74,8 +81,10 @@ def index():
                 )
             )
         
-        pagination = base_query.order_by(Ekipman.kod).paginate(
-            page=page, per_page=25, error_out=False
+        # Keyset sayfalama: (kod, id) sırasıyla son görülen makineden devam
+        pagination = keyset_sayfala(
+            base_query, [Ekipman.kod, Ekipman.id], imlec=imlec, per_page=25,
+            sayim_anahtari=('filo.index', q)
         )
         ekipmanlar = pagination.items
         
@@ -231,8 +240,8 @@ def duzelt(id):
             maliyet_raw = form.giris_maliyeti.data
             ekipman.giris_maliyeti = clean_currency_input(maliyet_raw)
             
-            if ekipman.calisma_durumu != 'kirada':
-                ekipman.calisma_durumu = 'bosta'
+            # Kirada olmayan makine düzenlemeden sonra boşa alınır (kiradakine dokunulmaz)
+            durum_degistir(ekipman.id, 'bosta', beklenen=('serviste',))
             
             db.session.commit()
             flash('Güncellendi!', 'success')
@@ -292,13 +301,13 @@ def sonlandir():
                     return redirect(url_for('filo.index'))
                 
                 aktif_kalem.kiralama_bitis = bitis_tarihi_str
-                ekipman.calisma_durumu = 'bosta'
                 aktif_kalem.sonlandirildi = True 
+                serbest_birak(ekipman.id)
                 
                 db.session.commit()
                 flash(f"Sonlandırıldı.", 'success')
             else:
-                ekipman.calisma_durumu = 'bosta'
+                serbest_birak(ekipman.id)
                 db.session.commit()
                 flash(f"Kalem bulunamadı, boşa alındı.", 'warning')
         else:
@@ -313,14 +322,19 @@ def sonlandir():
 
 @filo_bp.route('/harici')
 def harici():
+    q = request.args.get('q', '', type=str).strip()
     try:
         # Haricilerde de aktif olanları göster
-        ekipmanlar = Ekipman.query.filter(
+        sorgu = Ekipman.query.filter(
             and_(
                 Ekipman.firma_tedarikci_id.isnot(None),
                 Ekipman.is_active == True
             )
-        ).options(
+        )
+        if q:
+            # Katalog araması: kod / seri no / marka / model öneki (indeks aralıkları)
+            sorgu = sorgu.filter(Ekipman.id.in_([e['id'] for e in katalog_ara(q, limit=500)]))
+        ekipmanlar = sorgu.options(
             joinedload(Ekipman.firma_tedarikci) 
         ).order_by(Ekipman.kod).all()
         
@@ -328,7 +342,19 @@ def harici():
         flash(f"Hata: {str(e)}", "danger")
         ekipmanlar = []
 
-    return render_template('filo/harici.html', ekipmanlar=ekipmanlar)
+    return render_template('filo/harici.html', ekipmanlar=ekipmanlar, q=q)
+
+
+@filo_bp.route('/harici/ara', methods=['GET'])
+def harici_ara():
+    """
+    Dış tedarik makine kataloğu typeahead'i (JSON): /filo/harici/ara?q=..&tedarikci_id=..
+    Kiralama formunda seçilen öneri kalemin makine alanlarını doldurur.
+    """
+    q = request.args.get('q', '', type=str)
+    if len(q.strip()) < 2:
+        return jsonify({'oneriler': []})
+    return jsonify({'oneriler': katalog_ara(q, request.args.get('tedarikci_id', type=int))})
 
 
 # -------------------------------------------------------------------------
@@ -423,9 +449,8 @@ def bakima_al():
 
         ekipman = Ekipman.query.get_or_404(ekipman_id)
         
-        if ekipman.calisma_durumu == 'bosta':
-            # 1. Durumu 'serviste' yap
-            ekipman.calisma_durumu = 'serviste'
+        # 1. Durumu 'serviste' yap (yalnızca hâlâ boştaysa; koşullu UPDATE)
+        if servise_al(ekipman.id):
             
             # 2. Bakım Kaydı Oluştur
             yeni_bakim = BakimKaydi(
@@ -453,8 +478,7 @@ def bakim_bitir(id):
     ekipman = Ekipman.query.get_or_404(id)
     
     try:
-        if ekipman.calisma_durumu == 'serviste':
-            ekipman.calisma_durumu = 'bosta'
+        if servisten_cikar(ekipman.id):
             db.session.commit()
             flash(f"'{ekipman.kod}' bakımdan çıktı ve 'Boşta' durumuna alındı.", "success")
         else:
@@ -465,4 +489,69 @@ def bakim_bitir(id):
         flash(f"Hata oluştu: {str(e)}", "danger")
         
     # İşlemden sonra bakım listesine geri dön
-    return redirect(url_for('filo.bakimda'))
\ No newline at end of file
+    return redirect(url_for('filo.bakimda'))
+
+
+# -------------------------------------------------------------------------
+# 13. Müsaitlik Sorgusu (JSON): /filo/musait?baslangic=..&bitis=..&tipi=..
+# -------------------------------------------------------------------------
+@filo_bp.route('/musait', methods=['GET'])
+def musait():
+    """Verilen tarih aralığında boş olan makineler (tipi / yükseklik / kapasite filtreli)."""
+    try:
+        baslangic = date.fromisoformat(request.args.get('baslangic', ''))
+        bitis = date.fromisoformat(request.args.get('bitis') or request.args['baslangic'])
+    except (KeyError, ValueError):
+        return jsonify({'hata': "baslangic ve bitis YYYY-AA-GG biçiminde verilmelidir."}), 400
+
+    basla = time.perf_counter()
+    try:
+        ekipmanlar = musait_ekipmanlar(
+            baslangic, bitis,
+            tipi=request.args.get('tipi', '').strip() or None,
+            min_yukseklik=request.args.get('min_yukseklik', type=int),
+            min_kapasite=request.args.get('min_kapasite', type=int),
+        )
+    except ValueError as e:
+        return jsonify({'hata': str(e)}), 400
+
+    return jsonify({
+        'baslangic': baslangic.isoformat(),
+        'bitis': bitis.isoformat(),
+        'adet': len(ekipmanlar),
+        'sure_ms': round((time.perf_counter() - basla) * 1000, 2),
+        'ekipmanlar': [e._asdict() for e in ekipmanlar],
+    })
+
+
+# -------------------------------------------------------------------------
+# 14. Doluluk Takvimi (makine x gün): sayfa + JSON
+# -------------------------------------------------------------------------
+def _takvim_parametreleri():
+    baslangic = request.args.get('baslangic', '').strip()
+    baslangic = date.fromisoformat(baslangic) if baslangic else date.today()
+    gun = request.args.get('gun', VARSAYILAN_GUN, type=int)
+    return baslangic, gun, request.args.get('tipi', '').strip() or None
+
+
+@filo_bp.route('/takvim', methods=['GET'])
+def takvim():
+    try:
+        baslangic, gun, tipi = _takvim_parametreleri()
+        doluluk = doluluk_takvimi(baslangic, gun)
+    except ValueError as e:
+        flash(f"Takvim Hatası: {e}", "danger")
+        return redirect(url_for('filo.takvim'))
+    tipler = sorted({e['tipi'] for e in doluluk.ekipmanlar if e['tipi']})
+    return render_template('filo/takvim.html', takvim=doluluk, satirlar=doluluk.satirlar(tipi),
+                           tipler=tipler, tipi=tipi, today=date.today())
+
+
+@filo_bp.route('/takvim/veri', methods=['GET'])
+def takvim_veri():
+    try:
+        baslangic, gun, tipi = _takvim_parametreleri()
+        doluluk = doluluk_takvimi(baslangic, gun)
+    except ValueError as e:
+        return jsonify({'hata': str(e)}), 400
+    return jsonify(doluluk.sozluk(tipi))
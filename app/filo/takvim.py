@@ -0,0 +1,227 @@
+"""
+Filo doluluk takvimi (makine x gün).
+
+Her makinenin penceredeki doluluğu tek bir Python int bit maskesiyle tutulur
+(bit i = pencerenin i. günü dolu). Pencereyle kesişen tüm kalemler tek
+sorguda okunur ve her kalem maskeye tek OR işlemiyle işlenir; makine başına
+kalem dolaşılmaz. Günlük filo doluluğu maskelerdeki dolu aralıklardan fark
+dizisiyle hesaplanır.
+
+Takvim (pencere, bugün) anahtarıyla FILO_TAKVIM_TTL süresince önbellekte
+tutulur; kalem veya makine değiştiren her commit önbelleği temizler.
+Core ile toplu yazan kodlar (ör. toplu aktarım) takvim_onbellegini_temizle()
+çağırmalıdır.
+"""
+import time
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from app.extensions import db
+from app.filo.models import Ekipman
+from app.firmalar.models import Firma
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.filo.musaitlik import dolu_kalem_kosulu
+
+VARSAYILAN_GUN = 90
+EN_FAZLA_GUN = 366
+
+_takvim_onbellegi = {}
+
+
+def _araliklar(maske):
+    """Bit maskesindeki ardışık dolu gün aralıklarını (ilk, son) olarak üretir."""
+    konum = 0
+    while maske:
+        bos = (maske & -maske).bit_length() - 1
+        maske >>= bos
+        konum += bos
+        dolu = (~maske & (maske + 1)).bit_length() - 1
+        yield konum, konum + dolu - 1
+        maske >>= dolu
+        konum += dolu
+
+
+class DolulukTakvimi:
+    """Bir tarih penceresi için filonun doluluk matrisi."""
+
+    def __init__(self, baslangic, gun):
+        self.baslangic = baslangic
+        self.gun = gun
+        self.ekipmanlar = []      # [{'id', 'kod', 'tipi', ..., 'maske', 'kiralamalar'}]
+        self.gunluk_dolu = [0] * gun
+
+    @property
+    def bitis(self):
+        return self.baslangic + timedelta(days=self.gun - 1)
+
+    @property
+    def gunler(self):
+        return [self.baslangic + timedelta(days=i) for i in range(self.gun)]
+
+    def satirlar(self, tipi=None):
+        """Şablon/JSON için makine satırları; tipi verilirse yalnızca o tip."""
+        if not tipi:
+            return self.ekipmanlar
+        tipi = tipi.strip().lower()
+        return [e for e in self.ekipmanlar if (e['tipi'] or '').lower() == tipi]
+
+    def bloklar(self, ekipman):
+        """
+        Makine satırını ardışık bloklara böler: [(gun_sayisi, dolu, form_nolari)].
+        Şablonda her blok tek hücre (colspan) olarak çizilir.
+        """
+        bloklar, konum = [], 0
+        for ilk, son in _araliklar(ekipman['maske']):
+            if ilk > konum:
+                bloklar.append((ilk - konum, False, []))
+            formlar = [k['form_no'] for k in ekipman['kiralamalar'] if k['ilk'] <= son and k['son'] >= ilk]
+            bloklar.append((son - ilk + 1, True, formlar))
+            konum = son + 1
+        if konum < self.gun:
+            bloklar.append((self.gun - konum, False, []))
+        return bloklar
+
+    def sozluk(self, tipi=None):
+        """JSON çıktısı. 'doluluk' her gün için '1'/'0' olan bir metindir."""
+        return {
+            'baslangic': self.baslangic.isoformat(),
+            'bitis': self.bitis.isoformat(),
+            'gun': self.gun,
+            'gunluk_dolu': self.gunluk_dolu,
+            'ekipmanlar': [{
+                'id': e['id'], 'kod': e['kod'], 'tipi': e['tipi'],
+                'calisma_yuksekligi': e['calisma_yuksekligi'],
+                'kaldirma_kapasitesi': e['kaldirma_kapasitesi'],
+                'calisma_durumu': e['calisma_durumu'],
+                'dolu_gun': e['dolu_gun'],
+                'doluluk': format(e['maske'], f'0{self.gun}b')[::-1] if self.gun else '',
+                'kiralamalar': e['kiralamalar'],
+            } for e in self.satirlar(tipi)],
+        }
+
+
+def _takvim_olustur(baslangic, gun, bugun):
+    takvim = DolulukTakvimi(baslangic, gun)
+    bitis = takvim.bitis
+
+    ekipmanlar = db.session.query(
+        Ekipman.id, Ekipman.kod, Ekipman.tipi, Ekipman.calisma_yuksekligi,
+        Ekipman.kaldirma_kapasitesi, Ekipman.calisma_durumu,
+    ).filter(
+        Ekipman.is_active.is_(True), Ekipman.firma_tedarikci_id.is_(None)
+    ).order_by(Ekipman.kod).all()
+    satirlar = {e.id: dict(e._asdict(), maske=0, dolu_gun=0, kiralamalar=[]) for e in ekipmanlar}
+
+    kalemler = db.session.query(
+        KiralamaKalemi.ekipman_id, KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis,
+        KiralamaKalemi.sonlandirildi, KiralamaKalemi.kiralama_id, Kiralama.kiralama_form_no,
+        Firma.firma_adi,
+    ).join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id) \
+     .outerjoin(Firma, Firma.id == Kiralama.firma_musteri_id) \
+     .filter(KiralamaKalemi.ekipman_id.isnot(None), dolu_kalem_kosulu(baslangic, bitis, bugun))
+
+    for k in kalemler:
+        satir = satirlar.get(k.ekipman_id)
+        if satir is None:  # arşivlenmiş makine
+            continue
+        fiili_bitis = k.kiralama_bitis if k.sonlandirildi else max(k.kiralama_bitis, bugun)
+        ilk = max((k.kiralama_baslangici - baslangic).days, 0)
+        son = min((fiili_bitis - baslangic).days, gun - 1)
+        if ilk > son:
+            continue
+        satir['maske'] |= ((1 << (son - ilk + 1)) - 1) << ilk
+        satir['kiralamalar'].append({
+            'kiralama_id': k.kiralama_id, 'form_no': k.kiralama_form_no, 'musteri': k.firma_adi,
+            'ilk': ilk, 'son': son, 'sonlandirildi': bool(k.sonlandirildi),
+        })
+
+    fark = [0] * (gun + 1)
+    for satir in satirlar.values():
+        for ilk, son in _araliklar(satir['maske']):
+            fark[ilk] += 1
+            fark[son + 1] -= 1
+            satir['dolu_gun'] += son - ilk + 1
+    dolu = 0
+    for i in range(gun):
+        dolu += fark[i]
+        takvim.gunluk_dolu[i] = dolu
+
+    takvim.ekipmanlar = list(satirlar.values())
+    return takvim
+
+
+def doluluk_takvimi(baslangic=None, gun=VARSAYILAN_GUN, bugun=None):
+    """Pencerenin doluluk takvimi (önbellekten ya da yeni hesaplanmış)."""
+    bugun = bugun or date.today()
+    baslangic = baslangic or bugun
+    if not 1 <= gun <= EN_FAZLA_GUN:
+        raise ValueError(f"Gün sayısı 1 ile {EN_FAZLA_GUN} arasında olmalıdır.")
+
+    anahtar = (baslangic, gun, bugun)
+    simdi = time.monotonic()
+    kayit = _takvim_onbellegi.get(anahtar)
+    if kayit is not None and kayit[0] > simdi:
+        return kayit[1]
+
+    takvim = _takvim_olustur(baslangic, gun, bugun)
+    ttl = current_app.config.get('FILO_TAKVIM_TTL', 300)
+    _takvim_onbellegi[anahtar] = (simdi + ttl, takvim)
+    return takvim
+
+
+def takvim_onbellegini_temizle():
+    _takvim_onbellegi.clear()
+
+
+# -------------------------------------------------------------------------
+# ÖNBELLEK GEÇERSİZLEME
+# -------------------------------------------------------------------------
+_EKIPMAN_ALANLARI = ('kod', 'tipi', 'calisma_yuksekligi', 'kaldirma_kapasitesi',
+                     'calisma_durumu', 'is_active', 'firma_tedarikci_id')
+_KIRALAMA_ALANLARI = ('kiralama_form_no', 'firma_musteri_id')
+
+
+def _takvimi_etkiler(obj, yeni_veya_silindi):
+    if isinstance(obj, KiralamaKalemi):
+        return True
+    if isinstance(obj, Ekipman):
+        alanlar = _EKIPMAN_ALANLARI
+    elif isinstance(obj, Kiralama):
+        alanlar = _KIRALAMA_ALANLARI
+    else:
+        return False
+    if yeni_veya_silindi:
+        return True
+    durum = inspect(obj)
+    return any(durum.attrs[a].history.has_changes() for a in alanlar)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _takvim_degisikligini_isaretle(session, flush_context):
+    if session.info.get('filo_takvimi_degisti'):
+        return
+    if any(_takvimi_etkiler(o, True) for o in session.new) \
+            or any(_takvimi_etkiler(o, True) for o in session.deleted) \
+            or any(_takvimi_etkiler(o, False) for o in session.dirty):
+        session.info['filo_takvimi_degisti'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _toplu_guncellemeyi_isaretle(orm_execute_state):
+    # ORM UPDATE/DELETE ifadeleri (ör. app.filo.durum) nesneleri dirty yapmaz
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if any(m.class_ in (Ekipman, Kiralama, KiralamaKalemi) for m in orm_execute_state.all_mappers):
+            orm_execute_state.session.info['filo_takvimi_degisti'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _takvim_onbellegini_gecersiz_kil(session):
+    if session.info.pop('filo_takvimi_degisti', False):
+        takvim_onbellegini_temizle()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _takvim_isaretini_kaldir(session, previous_transaction):
+    session.info.pop('filo_takvimi_degisti', None)
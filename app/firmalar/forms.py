@@ -1,9 +1,10 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SubmitField, BooleanField, IntegerField, DateField
-from wtforms.validators import DataRequired, Length, InputRequired,Optional
+from wtforms.validators import DataRequired, Length, InputRequired,Optional, NumberRange
 from datetime import date
 # İsteğiniz üzerine utils kütüphanesi korundu
 from app.utils import validate_currency, secim_hata_mesaji
+from app.cari.forms import TRDecimalField
 # Modelin yeni adresi:
 from app.firmalar.models import Firma
 
@@ -51,6 +52,12 @@ class FirmaForm(FlaskForm):
     sozlesme_tarihi = DateField('Sözleşme İmza Tarihi', default=date.today, validators=[Optional()])
     
 
+    # --- KREDİ LİMİTİ ---
+    # Boş bırakılırsa limitsiz; yeni kiralamada risk (açık bakiye + faturasız kira) bu tutarla karşılaştırılır.
+    kredi_limiti = TRDecimalField('Kredi Limiti (TL)', places=2, validators=[
+        Optional(), NumberRange(min=0, message="Kredi limiti negatif olamaz.")
+    ])
+
     # Rol Seçimleri
     is_musteri = BooleanField('Bu bir Müşteri mi?', default=True)
     is_tedarikci = BooleanField('Bu bir Tedarikçi mi?', default=False)
@@ -27,6 +27,9 @@ class Firma(db.Model):
     # KRİTİK GÜNCELLEME: Float -> Numeric(15, 2)
     bakiye = db.Column(db.Numeric(15, 2), default=0, nullable=False)
 
+    # Kredi limiti (boş = limitsiz). Risk app.cari.risk ile firma_risk tablosunda tutulur.
+    kredi_limiti = db.Column(db.Numeric(15, 2), nullable=True)
+
     # --- YENİ: SÖZLEŞME VE BULUT YÖNETİM ALANLARI ---
     # Sözleşme Takibi
     sozlesme_no = db.Column(db.String(50), unique=False, nullable=True) # Örn: PS-2026-001
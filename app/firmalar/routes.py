@@ -10,12 +10,14 @@ from app.firmalar import firmalar_bp
 from app.firmalar.models import Firma
 from app.kiralama.models import Kiralama, KiralamaKalemi
 from app.filo.models import Ekipman
-from app.cari.models import Kasa, Odeme, HizmetKaydi
+from app.cari.models import Kasa, Odeme, HizmetKaydi, FirmaRisk
 from app.firmalar.forms import FirmaForm
 from sqlalchemy.orm import joinedload, subqueryload
 
 # YARDIMCI FONKSİYONLAR
 from app.utils import klasor_adi_temizle
+from app.sayfalama import keyset_sayfala
+from app.main.sayac import belge_no_al
 
 # -------------------------------------------------------------------------
 # 1. Firma Listeleme (Görünürlük Sorunu Giderildi)
@@ -24,7 +26,7 @@ from app.utils import klasor_adi_temizle
 @firmalar_bp.route('/index')
 def index():
     try:
-        page = request.args.get('page', 1, type=int)
+        imlec = request.args.get('imlec', type=str)
         q = request.args.get('q', '', type=str)
         
         # Filtre: is_active alanı True olanlar VEYA NULL (boş) kalanlar görünür
@@ -49,7 +51,11 @@ def index():
             )
 
         # Sayfa başına 50 kayıt göstererek listeyi daha kapsayıcı hale getirdik
-        pagination = base_query.order_by(Firma.id.desc()).paginate(page=page, per_page=50, error_out=False)
+        # Keyset sayfalama (id DESC): derin sayfalarda OFFSET/COUNT maliyeti yok
+        pagination = keyset_sayfala(
+            base_query, [Firma.id], imlec=imlec, per_page=50, azalan=True,
+            sayim_anahtari=('firmalar.index', q)
+        )
         firmalar = pagination.items
         
         # Debug: Konsola listelenen miktar bilgisini basar
@@ -87,6 +93,7 @@ def ekle():
                 vergi_no=form.vergi_no.data,
                 is_musteri=form.is_musteri.data,
                 is_tedarikci=form.is_tedarikci.data,
+                kredi_limiti=form.kredi_limiti.data,
                 sozlesme_no=None, # Başlangıçta numara atanmaz
                 sozlesme_rev_no=0,
                 is_active=True,
@@ -111,19 +118,8 @@ def sozlesme_hazirla(id):
         flash(f"'{firma.firma_adi}' için zaten bir sözleşme ({firma.sozlesme_no}) mevcut.", "info")
         return redirect(url_for('firmalar.index'))
     try:
-        # PS Numarası Hesaplama (Yıl Bazlı)
-        current_year = date.today().year
-        last_firma = Firma.query.filter(Firma.sozlesme_no.like(f"PS-{current_year}-%"))\
-                                .order_by(Firma.sozlesme_no.desc()).first()
-        
-        next_nr = 1
-        if last_firma and last_firma.sozlesme_no:
-            try:
-                # Son numarayı alıp 1 artırıyoruz
-                next_nr = int(last_firma.sozlesme_no.split('-')[-1]) + 1
-            except: pass
-        
-        next_ps_no = f"PS-{current_year}-{next_nr:03d}"
+        # PS Numarası (Yıl Bazlı, atomik sayaçtan)
+        next_ps_no = belge_no_al('PS')
 
         # Klasör İsimlendirme (FirmaAdı_VergiNo)
         ikinci_parametre = firma.vergi_no if firma.vergi_no else str(firma.id)
@@ -189,9 +185,11 @@ def bilgi(id):
         # 1. Hizmet ve Fatura Kayıtlarını İşle (Borç/Alacak Ayrımı)
         for h in firma.hizmet_kayitlari:
             tutar = h.tutar or Decimal('0')
-            if hasattr(h, 'kiralama_id') and h.kiralama_id:
+            if h.kaynak_tipi == 'kiralama' and h.kiralama_id:
                 tur_adi, tur_tipi, ozel_id = 'Kiralama', 'kiralama', h.kiralama_id
-            elif hasattr(h, 'nakliye_id') and h.nakliye_id:
+            elif h.kaynak_tipi == 'donem' and h.kiralama_id:
+                tur_adi, tur_tipi, ozel_id = 'Kiralama (Dönem)', 'kiralama', h.kiralama_id
+            elif h.kaynak_tipi == 'nakliye' and h.nakliye_id:
                 tur_adi, tur_tipi, ozel_id = 'Nakliye', 'nakliye', h.nakliye_id
             else:
                 tur_tipi, ozel_id = 'fatura', h.id
@@ -254,7 +252,8 @@ def bilgi(id):
                                toplam_alacak=toplam_alacak,
                                bakiye=abs(yuruyen_bakiye), 
                                durum_metni=durum_metni, 
-                               durum_rengi=durum_rengi)
+                               durum_rengi=durum_rengi,
+                               risk=db.session.get(FirmaRisk, id))
     except Exception as e:
         traceback.print_exc()
         flash(f"Cari bilgiler yüklenirken hata oluştu: {str(e)}", "danger")
@@ -6,4 +6,4 @@ kiralama_bp = Blueprint('kiralama', __name__, template_folder='templates')
 # Alttaki satırlar, rotaların uygulamaya dahil edilmesini sağlar.
 
 
-from . import routes
+from . import routes, komutlar
@@ -0,0 +1,407 @@
+"""
+Toplu kiralama aktarımı (JSON / CSV).
+
+Eski tablolardaki kiralama geçmişini tek tek ekle formuyla girmek yerine:
+  1. Tüm satırlar önce doğrulanır; firma ve ekipmanlar tek IN sorgusuyla çözülür.
+  2. Geçerli kiralamalar PARCA_BOYUTU'luk parçalar halinde Kiralama,
+     KiralamaKalemi ve HizmetKaydi tablolarına toplu INSERT ile yazılır.
+  3. Aktif kalemlerin makineleri tek bir UPDATE ile 'kirada' yapılır.
+Harici makineler tedarikçi makine kataloğunda (app.filo.harici) parça başına
+tek toplu bul/ekle ile çözülür; kalem yalnızca katalog id'sini taşır.
+Hatalı satırlar raporlanır, geri kalan satırların aktarımı durmaz.
+
+Her satır bir kalemdir; aynı 'form_no'ya sahip satırlar tek kiralamada toplanır.
+Alanlar:
+  form_no*, musteri* (firma adı) veya musteri_id*, baslangic*, bitis*, brm_fiyat*,
+  ekipman_kod (Pimaks filosu) veya harici_tedarikci (firma adı) + harici_tipi,
+  harici_marka, harici_model, harici_seri_no, alis_fiyat,
+  nakliye_satis, nakliye_alis, nakliye_tedarikci (firma adı),
+  kdv_orani, doviz_kuru_usd, doviz_kuru_eur, sonlandirildi (0/1)
+"""
+import csv
+import io
+import re
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert, select
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.firmalar.models import Firma
+from app.filo.models import Ekipman
+from app.filo.harici import katalog_anahtari, katalog_idleri
+from app.cari.models import HizmetKaydi
+from app.kiralama.arama import arama_indeksini_guncelle
+from app.kiralama.ozet import kiralama_ozetlerini_guncelle
+from app.kiralama.tahakkuk import gelir_tahakkuklarini_guncelle
+from app.cari.risk import firma_risklerini_guncelle, kiralamalarin_firmalari
+from app.main.sayac import sayac_en_az
+from app.filo.takvim import takvim_onbellegini_temizle
+from app.referans import referans_onbellegini_temizle
+from app.filo.durum import durum_degistir
+from app.kiralama.fiyatlama import kalem_bedeli
+
+# Tek transaction'da yazılan kiralama sayısı
+PARCA_BOYUTU = 500
+
+# IN listesi başına en fazla değer (SQLite bağlama parametresi sınırının altında)
+IN_PARCA_BOYUTU = 900
+
+_TARIH_BICIMLERI = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y')
+_PF_DESENI = re.compile(r'^PF-(\d{4})/(\d+)$')
+
+
+class SatirHatasi(ValueError):
+    pass
+
+
+# -------------------------------------------------------------------------
+# OKUMA
+# -------------------------------------------------------------------------
+def satirlari_oku(icerik, dosya_adi=''):
+    """
+    JSON (liste ya da {'satirlar': [...]}) veya CSV (başlık satırlı; ; , ya da
+    sekme ayraçlı) içeriği sözlük listesine çevirir.
+    """
+    if isinstance(icerik, bytes):
+        icerik = icerik.decode('utf-8-sig')
+    metin = icerik.lstrip()
+
+    if dosya_adi.lower().endswith('.json') or metin.startswith(('[', '{')):
+        veri = json.loads(metin)
+        if isinstance(veri, dict):
+            veri = veri.get('satirlar', [])
+        if not isinstance(veri, list):
+            raise ValueError("JSON içeriği satır listesi olmalıdır.")
+        return veri
+
+    ilk_satir = metin.split('\n', 1)[0]
+    try:
+        ayrac = csv.Sniffer().sniff(ilk_satir, delimiters=';,\t').delimiter
+    except csv.Error:
+        ayrac = ';'
+    return list(csv.DictReader(io.StringIO(metin), delimiter=ayrac))
+
+
+# -------------------------------------------------------------------------
+# ALAN ÇÖZÜMLEME
+# -------------------------------------------------------------------------
+def _metin(satir, alan):
+    deger = satir.get(alan)
+    return str(deger).strip() if deger not in (None, '') else ''
+
+
+def _tarih(satir, alan):
+    deger = _metin(satir, alan)
+    if not deger:
+        raise SatirHatasi(f"'{alan}' zorunludur.")
+    for bicim in _TARIH_BICIMLERI:
+        try:
+            return datetime.strptime(deger[:10], bicim).date()
+        except ValueError:
+            continue
+    raise SatirHatasi(f"'{alan}' geçersiz tarih: {deger}")
+
+
+def _sayi(satir, alan, zorunlu=False):
+    deger = _metin(satir, alan)
+    if not deger:
+        if zorunlu:
+            raise SatirHatasi(f"'{alan}' zorunludur.")
+        return Decimal('0')
+    # 1.500,00 -> 1500.00
+    if ',' in deger:
+        deger = deger.replace('.', '').replace(',', '.')
+    try:
+        sayi = Decimal(deger)
+    except InvalidOperation:
+        raise SatirHatasi(f"'{alan}' geçersiz sayı: {satir.get(alan)}")
+    if sayi < 0:
+        raise SatirHatasi(f"'{alan}' negatif olamaz.")
+    return sayi
+
+
+def _evet(satir, alan):
+    return _metin(satir, alan).lower() in ('1', 'true', 'evet', 'e', 'x')
+
+
+def _in_sorgusu(sorgu_kur, degerler):
+    """Büyük değer kümelerini IN_PARCA_BOYUTU'luk parçalarla sorgulayıp satırları birleştirir."""
+    degerler = list(degerler)
+    sonuc = []
+    for i in range(0, len(degerler), IN_PARCA_BOYUTU):
+        sonuc.extend(db.session.execute(sorgu_kur(degerler[i:i + IN_PARCA_BOYUTU])).all())
+    return sonuc
+
+
+# -------------------------------------------------------------------------
+# DOĞRULAMA
+# -------------------------------------------------------------------------
+def _satiri_coz(ham):
+    """Ham satırı tiplenmiş alanlara çevirir; referanslar (isim/kod) henüz çözülmez."""
+    satir = {
+        'form_no': _metin(ham, 'form_no'),
+        'musteri': _metin(ham, 'musteri'),
+        'musteri_id': _metin(ham, 'musteri_id'),
+        'ekipman_kod': _metin(ham, 'ekipman_kod'),
+        'harici_tedarikci': _metin(ham, 'harici_tedarikci'),
+        'nakliye_tedarikci': _metin(ham, 'nakliye_tedarikci'),
+        'baslangic': _tarih(ham, 'baslangic'),
+        'bitis': _tarih(ham, 'bitis'),
+        'brm_fiyat': _sayi(ham, 'brm_fiyat', zorunlu=True),
+        'alis_fiyat': _sayi(ham, 'alis_fiyat'),
+        'nakliye_satis': _sayi(ham, 'nakliye_satis'),
+        'nakliye_alis': _sayi(ham, 'nakliye_alis'),
+        'doviz_kuru_usd': _sayi(ham, 'doviz_kuru_usd'),
+        'doviz_kuru_eur': _sayi(ham, 'doviz_kuru_eur'),
+        'sonlandirildi': _evet(ham, 'sonlandirildi'),
+    }
+    for alan in ('harici_tipi', 'harici_marka', 'harici_model', 'harici_seri_no'):
+        satir[alan] = _metin(ham, alan) or None
+
+    kdv = _metin(ham, 'kdv_orani')
+    if kdv and not kdv.isdigit():
+        raise SatirHatasi(f"'kdv_orani' geçersiz: {kdv}")
+    satir['kdv_orani'] = int(kdv) if kdv else 20
+
+    if not satir['form_no']:
+        raise SatirHatasi("'form_no' zorunludur.")
+    if not (satir['musteri'] or satir['musteri_id']):
+        raise SatirHatasi("'musteri' veya 'musteri_id' zorunludur.")
+    if satir['musteri_id'] and not satir['musteri_id'].isdigit():
+        raise SatirHatasi(f"'musteri_id' geçersiz: {satir['musteri_id']}")
+    if satir['bitis'] < satir['baslangic']:
+        raise SatirHatasi("Bitiş tarihi başlangıç tarihinden önce olamaz.")
+    if bool(satir['ekipman_kod']) == bool(satir['harici_tedarikci']):
+        raise SatirHatasi("'ekipman_kod' veya 'harici_tedarikci' alanlarından yalnızca biri dolu olmalıdır.")
+    return satir
+
+
+def _dogrula(ham_satirlar, hatalar):
+    """
+    Satırları çözer, referansları toplu sorgularla bağlar ve form no'ya göre
+    gruplanmış geçerli kiralamaları döndürür: {form_no: [satir, ...]}
+    """
+    satirlar = {}
+    for no, ham in enumerate(ham_satirlar, start=1):
+        try:
+            if not isinstance(ham, dict):
+                raise SatirHatasi("Satır bir nesne/sözlük olmalıdır.")
+            satirlar[no] = _satiri_coz(ham)
+        except SatirHatasi as e:
+            hatalar[no] = str(e)
+
+    # --- Referansları tek seferde çöz (tablo başına bir IN sorgusu) ---
+    firma_adlari = set()
+    for s in satirlar.values():
+        firma_adlari.update(a for a in (s['musteri'], s['harici_tedarikci'], s['nakliye_tedarikci']) if a)
+    musteri_idler = {int(s['musteri_id']) for s in satirlar.values() if s['musteri_id']}
+    ekipman_kodlari = {s['ekipman_kod'] for s in satirlar.values() if s['ekipman_kod']}
+    form_nolar = {s['form_no'] for s in satirlar.values()}
+
+    firma_adi_id = {r.firma_adi: r.id for r in _in_sorgusu(
+        lambda p: select(Firma.firma_adi, Firma.id).where(Firma.firma_adi.in_(p)), firma_adlari)}
+    gecerli_musteri_idler = {r.id for r in _in_sorgusu(
+        lambda p: select(Firma.id).where(Firma.id.in_(p)), musteri_idler)}
+    ekipman_kod_id = {r.kod: r.id for r in _in_sorgusu(
+        lambda p: select(Ekipman.kod, Ekipman.id).where(
+            Ekipman.kod.in_(p), Ekipman.firma_tedarikci_id.is_(None)), ekipman_kodlari)}
+    mevcut_formlar = {r.kiralama_form_no for r in _in_sorgusu(
+        lambda p: select(Kiralama.kiralama_form_no).where(Kiralama.kiralama_form_no.in_(p)), form_nolar)}
+
+    gruplar = {}
+    for no, s in satirlar.items():
+        try:
+            if s['form_no'] in mevcut_formlar:
+                raise SatirHatasi(f"'{s['form_no']}' form numarası zaten kayıtlı.")
+            if s['musteri_id']:
+                s['firma_musteri_id'] = int(s['musteri_id'])
+                if s['firma_musteri_id'] not in gecerli_musteri_idler:
+                    raise SatirHatasi(f"Müşteri bulunamadı (id={s['musteri_id']}).")
+            else:
+                s['firma_musteri_id'] = firma_adi_id.get(s['musteri'])
+                if s['firma_musteri_id'] is None:
+                    raise SatirHatasi(f"Müşteri bulunamadı: {s['musteri']}")
+            if s['ekipman_kod']:
+                s['ekipman_id'] = ekipman_kod_id.get(s['ekipman_kod'])
+                if s['ekipman_id'] is None:
+                    raise SatirHatasi(f"Makine bulunamadı: {s['ekipman_kod']}")
+            else:
+                s['harici_tedarikci_id'] = firma_adi_id.get(s['harici_tedarikci'])
+                if s['harici_tedarikci_id'] is None:
+                    raise SatirHatasi(f"Tedarikçi bulunamadı: {s['harici_tedarikci']}")
+            s['nakliye_tedarikci_id'] = None
+            if s['nakliye_tedarikci']:
+                s['nakliye_tedarikci_id'] = firma_adi_id.get(s['nakliye_tedarikci'])
+                if s['nakliye_tedarikci_id'] is None:
+                    raise SatirHatasi(f"Nakliye tedarikçisi bulunamadı: {s['nakliye_tedarikci']}")
+        except SatirHatasi as e:
+            hatalar[no] = str(e)
+            continue
+        gruplar.setdefault(s['form_no'], []).append((no, s))
+
+    # Bir formun tek satırı bile hatalıysa kiralama yarım aktarılmaz
+    hatali_formlar = {satirlar[no]['form_no'] for no in hatalar if no in satirlar}
+    for form_no, grup in list(gruplar.items()):
+        if form_no not in hatali_formlar and len({s['firma_musteri_id'] for _, s in grup}) > 1:
+            for no, _ in grup:
+                hatalar[no] = f"'{form_no}' formunun satırlarında farklı müşteriler var."
+            hatali_formlar.add(form_no)
+        if form_no in hatali_formlar:
+            for no, _ in grup:
+                hatalar.setdefault(no, f"'{form_no}' formunun başka bir satırı hatalı; form aktarılmadı.")
+            del gruplar[form_no]
+    return gruplar
+
+
+# -------------------------------------------------------------------------
+# YAZMA
+# -------------------------------------------------------------------------
+def _harici_bilgisi(s):
+    return {'tipi': s['harici_tipi'], 'marka': s['harici_marka'],
+            'model': s['harici_model'], 'seri_no': s['harici_seri_no']}
+
+
+def _parcayi_yaz(parca):
+    """Bir parça kiralamayı (form_no, [(no, satir)]) toplu INSERT'lerle yazar; aktif makine id'lerini döndürür."""
+    kiralama_idler = db.session.execute(
+        insert(Kiralama).returning(Kiralama.id, sort_by_parameter_order=True),
+        [{
+            'kiralama_form_no': form_no,
+            'firma_musteri_id': grup[0][1]['firma_musteri_id'],
+            'kdv_orani': grup[0][1]['kdv_orani'],
+            'doviz_kuru_usd': grup[0][1]['doviz_kuru_usd'],
+            'doviz_kuru_eur': grup[0][1]['doviz_kuru_eur'],
+        } for form_no, grup in parca]
+    ).scalars().all()
+
+    katalog = katalog_idleri(db.session, [
+        (s['harici_tedarikci_id'], _harici_bilgisi(s)) for _, grup in parca for _, s in grup if not s['ekipman_kod']
+    ])
+
+    kalemler, hizmetler, kiradaki_makineler = [], [], set()
+    for kiralama_id, (form_no, grup) in zip(kiralama_idler, parca):
+        toplam_gelir = Decimal('0.00')
+        for _, s in grup:
+            harici = not s['ekipman_kod']
+            kalemler.append({
+                'kiralama_id': kiralama_id,
+                'ekipman_id': None if harici else s['ekipman_id'],
+                'is_dis_tedarik_ekipman': harici,
+                'harici_ekipman_tedarikci_id': s['harici_tedarikci_id'] if harici else None,
+                'harici_ekipman_id': katalog.get(katalog_anahtari(s['harici_tedarikci_id'], _harici_bilgisi(s)))
+                                     if harici else None,
+                'kiralama_baslangici': s['baslangic'],
+                'kiralama_bitis': s['bitis'],
+                'kiralama_brm_fiyat': s['brm_fiyat'],
+                'kiralama_alis_fiyat': s['alis_fiyat'],
+                'is_harici_nakliye': s['nakliye_tedarikci_id'] is not None,
+                'is_oz_mal_nakliye': s['nakliye_tedarikci_id'] is None,
+                'nakliye_satis_fiyat': s['nakliye_satis'],
+                'nakliye_alis_fiyat': s['nakliye_alis'],
+                'nakliye_tedarikci_id': s['nakliye_tedarikci_id'],
+                'sonlandirildi': s['sonlandirildi'],
+            })
+            toplam_gelir += kalem_bedeli(s['baslangic'], s['bitis'], s['brm_fiyat'], s['nakliye_satis']).toplam
+
+            if harici and s['alis_fiyat'] > 0:
+                hizmetler.append({
+                    'firma_id': s['harici_tedarikci_id'], 'tarih': s['baslangic'],
+                    'tutar': kalem_bedeli(s['baslangic'], s['bitis'], s['alis_fiyat']).kira, 'yon': 'gelen', 'fatura_no': form_no,
+                    'kaynak_tipi': 'kiralama', 'kiralama_id': kiralama_id,
+                    'aciklama': f"Dış Kiralama: {s['harici_marka'] or ''}",
+                })
+            if not harici and not s['sonlandirildi']:
+                kiradaki_makineler.add(s['ekipman_id'])
+
+        if toplam_gelir > 0:
+            # Cari kayıt tarihi: aktarılan geçmiş kiralamanın ilk başlangıç tarihi
+            hizmetler.append({
+                'firma_id': grup[0][1]['firma_musteri_id'],
+                'tarih': min(s['baslangic'] for _, s in grup),
+                'tutar': toplam_gelir, 'yon': 'giden', 'fatura_no': form_no,
+                'kaynak_tipi': 'kiralama', 'kiralama_id': kiralama_id,
+                'aciklama': f"Kiralama Bedeli - {form_no}",
+            })
+
+    db.session.execute(insert(KiralamaKalemi), kalemler)
+    if hizmetler:
+        db.session.execute(insert(HizmetKaydi), hizmetler)
+
+    # Toplu INSERT'ler flush dinleyicilerini tetiklemez; özet, tahakkuk, firma riski ve arama indeksini elle tazele
+    conn = db.session.connection()
+    kiralama_ozetlerini_guncelle(conn, kiralama_idler)
+    gelir_tahakkuklarini_guncelle(conn, kiralama_idler)
+    firma_risklerini_guncelle(conn, kiralamalarin_firmalari(conn, kiralama_idler))
+    arama_indeksini_guncelle(conn, kiralama_idler)
+
+    # Aktarılan PF numaraları sayacın ilerisindeyse sayaç ileri alınır
+    en_buyuk_pf = {}
+    for form_no, _ in parca:
+        eslesme = _PF_DESENI.match(form_no)
+        if eslesme:
+            yil, no = int(eslesme.group(1)), int(eslesme.group(2))
+            en_buyuk_pf[yil] = max(en_buyuk_pf.get(yil, 0), no)
+    for yil, no in en_buyuk_pf.items():
+        sayac_en_az('PF', yil, no)
+
+    return len(kalemler), kiradaki_makineler
+
+
+def kiralamalari_ice_aktar(ham_satirlar, parca_boyutu=PARCA_BOYUTU, kuru_calistir=False):
+    """
+    Satırları doğrulayıp aktarır ve bir rapor sözlüğü döndürür:
+    toplam_satir, aktarilan_kiralama, aktarilan_kalem, hatali_satir,
+    hatalar ([{'satir': n, 'hata': '...'}], satır no 1'den başlar), sure_sn, satir_per_sn.
+    kuru_calistir=True ise yalnızca doğrulama yapılır, veritabanına yazılmaz.
+    """
+    baslangic = time.perf_counter()
+    hatalar = {}
+    gruplar = _dogrula(ham_satirlar, hatalar)
+    db.session.rollback()  # doğrulama sorgularının açtığı okuma transaction'ını kapat
+
+    aktarilan_kiralama = aktarilan_kalem = 0
+    kiradaki_makineler = set()
+    if not kuru_calistir:
+        form_listesi = list(gruplar.items())
+        for i in range(0, len(form_listesi), parca_boyutu):
+            parca = form_listesi[i:i + parca_boyutu]
+            try:
+                kalem_sayisi, makineler = _parcayi_yaz(parca)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for _, grup in parca:
+                    for no, _ in grup:
+                        hatalar[no] = f"Veritabanı hatası: {e}"
+                continue
+            aktarilan_kiralama += len(parca)
+            aktarilan_kalem += kalem_sayisi
+            kiradaki_makineler |= makineler
+
+        if kiradaki_makineler:
+            # Tüm aktif makineler için tek koşullu UPDATE (yalnızca boştakiler; servistekilere dokunulmaz)
+            durum_degistir(kiradaki_makineler, 'kirada', beklenen='bosta')
+            db.session.commit()
+        if aktarilan_kalem:
+            # Core INSERT/UPDATE'ler oturum olaylarını tetiklemez
+            takvim_onbellegini_temizle()
+            referans_onbellegini_temizle('ekipman')
+    else:
+        aktarilan_kiralama = len(gruplar)
+        aktarilan_kalem = sum(len(g) for g in gruplar.values())
+
+    sure = time.perf_counter() - baslangic
+    return {
+        'kuru_calistir': kuru_calistir,
+        'toplam_satir': len(ham_satirlar),
+        'aktarilan_kiralama': aktarilan_kiralama,
+        'aktarilan_kalem': aktarilan_kalem,
+        'hatali_satir': len(hatalar),
+        'hatalar': [{'satir': no, 'hata': hata} for no, hata in sorted(hatalar.items())],
+        'sure_sn': round(sure, 3),
+        'satir_per_sn': round(len(ham_satirlar) / sure, 1) if sure > 0 else None,
+    }
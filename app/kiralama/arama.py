@@ -0,0 +1,124 @@
+"""
+Kiralama listesi için SQLite FTS5 arama indeksi.
+
+'kiralama_arama' sanal tablosu her kiralama için tek satır tutar
+(rowid = kiralama.id): form no, müşteri adı, makine kod/seri no ve
+harici ekipman bilgileri (tedarikçi makine kataloğundan, bkz.
+app.filo.harici). Trigram tokenizer kullanıldığı için eski ilike('%q%')
+aramasıyla aynı 'içerir' davranışı korunur, fakat sorgu birleştirilmiş
+tabloların tamamını taramak yerine indeksten cevaplanır.
+
+İndeks flush sırasında güncellenir (app.olaylar); toplu Core yazımlarından
+sonra arama_indeksini_guncelle() çağrılmalı. Tutarsızlık şüphesinde 'flask kiralama arama-yeniden-olustur' çalıştırılır.
+"""
+from sqlalchemy import event, text, column
+
+from app.extensions import db
+from app.olaylar import kiralama_degisiklikleri, makine_kiralamalari
+
+ARAMA_TABLOSU = 'kiralama_arama'
+
+# Trigram tokenizer 3 karakterden kısa ifadeleri indeksleyemez
+MIN_ARAMA_UZUNLUGU = 3
+
+_INDEKS_SQL = f"""
+INSERT INTO {ARAMA_TABLOSU} (rowid, metin)
+SELECT k.id,
+       coalesce(k.kiralama_form_no, '') || ' | ' || coalesce(f.firma_adi, '') || ' | ' ||
+       coalesce(group_concat(
+           coalesce(e.kod, '') || ' ' || coalesce(e.seri_no, '') || ' ' ||
+           coalesce(he.tipi, '') || ' ' || coalesce(he.marka, '') || ' ' ||
+           coalesce(he.model, '') || ' ' || coalesce(he.seri_no, ''),
+       ' | '), '')
+FROM kiralama k
+LEFT JOIN firma f ON f.id = k.firma_musteri_id
+LEFT JOIN kiralama_kalemi kk ON kk.kiralama_id = k.id
+LEFT JOIN ekipman e ON e.id = kk.ekipman_id
+LEFT JOIN ekipman he ON he.id = kk.harici_ekipman_id
+WHERE {{kosul}}
+GROUP BY k.id
+"""
+
+_aktif_mi = {}
+
+
+def arama_indeksi_aktif(conn=None):
+    """Veritabanı SQLite ise ve sanal tablo (migration) mevcutsa True döner."""
+    anahtar = str(db.engine.url)
+    if anahtar not in _aktif_mi:
+        if db.engine.dialect.name != 'sqlite':
+            _aktif_mi[anahtar] = False
+        else:
+            sorgu = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :ad")
+            if conn is None:
+                with db.engine.connect() as c:
+                    _aktif_mi[anahtar] = c.execute(sorgu, {'ad': ARAMA_TABLOSU}).first() is not None
+            else:
+                _aktif_mi[anahtar] = conn.execute(sorgu, {'ad': ARAMA_TABLOSU}).first() is not None
+    return _aktif_mi[anahtar]
+
+
+def _indeksle(conn, kosul, params=None):
+    """'kosul'a uyan kiralamaların indeks satırlarını silip yeniden üretir."""
+    params = params or {}
+    conn.execute(
+        text(f"DELETE FROM {ARAMA_TABLOSU} WHERE rowid IN (SELECT k.id FROM kiralama k WHERE {kosul})"),
+        params
+    )
+    conn.execute(text(_INDEKS_SQL.format(kosul=kosul)), params)
+
+
+def arama_indeksini_yeniden_olustur():
+    """Tüm indeksi sıfırdan kurar ve indekslenen kiralama sayısını döndürür."""
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {ARAMA_TABLOSU}"))
+        conn.execute(text(_INDEKS_SQL.format(kosul='1 = 1')))
+        return conn.execute(text(f"SELECT count(*) FROM {ARAMA_TABLOSU}")).scalar()
+
+
+def arama_indeksini_guncelle(conn, kiralama_idler):
+    """
+    ORM dışı (toplu Core) yazımlardan sonra verilen kiralamaların indeks
+    satırlarını yeniler; after_flush dinleyicisi bu yazımları görmez.
+    """
+    idler = {int(i) for i in kiralama_idler if i is not None}
+    if idler and arama_indeksi_aktif(conn):
+        _indeksle(conn, f"k.id IN ({','.join(str(i) for i in idler)})")
+
+
+def kiralama_arama_sorgusu(q):
+    """
+    Arama ifadesine uyan kiralama id'lerini veren alt sorguyu döndürür.
+    İndeks kullanılamıyorsa (kısa ifade, farklı veritabanı) None döner;
+    çağıran taraf eski ilike aramasına düşer.
+    """
+    q = (q or '').strip()
+    if len(q) < MIN_ARAMA_UZUNLUGU or not arama_indeksi_aktif():
+        return None
+    ifade = '"' + q.replace('"', '""') + '"'
+    return text(
+        f"SELECT rowid FROM {ARAMA_TABLOSU} WHERE {ARAMA_TABLOSU} MATCH :arama_ifadesi"
+    ).bindparams(arama_ifadesi=ifade).columns(column('rowid'))
+
+
+# -------------------------------------------------------------------------
+# ORM SENKRONİZASYONU (bkz. app.olaylar)
+# -------------------------------------------------------------------------
+@event.listens_for(db.session, 'after_flush')
+def _arama_indeksini_guncelle(session, flush_context):
+    d = kiralama_degisiklikleri(session, ekipman_alanlari=('kod', 'seri_no', 'tipi', 'marka', 'model'))
+    if d.bos_mu():
+        return
+    conn = session.connection()
+    if not arama_indeksi_aktif(conn):
+        return
+
+    if d.silinen_idler:
+        conn.execute(
+            text(f"DELETE FROM {ARAMA_TABLOSU} WHERE rowid IN ({','.join(str(int(i)) for i in d.silinen_idler)})")
+        )
+    if d.kiralama_idler:
+        _indeksle(conn, f"k.id IN ({','.join(str(int(i)) for i in d.kiralama_idler)})")
+    if d.firma_idler:
+        _indeksle(conn, f"k.firma_musteri_id IN ({','.join(str(int(i)) for i in d.firma_idler)})")
+    arama_indeksini_guncelle(conn, makine_kiralamalari(conn, d.ekipman_idler))
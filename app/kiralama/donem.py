@@ -0,0 +1,174 @@
+"""
+Uzun süren kiralamalar için aylık dönem faturalaması.
+
+Kiralama açılırken sözleşme aralığı [başlangıç, bitiş] için tek gelir kaydı
+yazılır. Bitişi geçtiği halde sonlandırılmamış kalemlerde makine müşteride
+kalmaya devam eder, ama bu günler hiçbir yerde faturalanmıyordu. Dönem
+kapanışında (her ayın 1'inde, önceki ay için) açık kalemlerin o aya düşen
+sözleşme dışı günleri faturalanır:
+
+    faturalanan günler = [max(ay başı, başlangıç, bitiş + 1), ay sonu]
+
+Kalem başına bir 'donem' HizmetKaydi (müşteriye 'giden'; dış tedarik
+makinelerde tedarikçiden 'gelen') yazılır.
+
+  - Açık kalemler tek sorguda, ix_kiralama_kalemi_aktif_bitis kısmi
+    indeksinden okunur (filtre 'sonlandirildi == False' yazılmalıdır).
+  - Dönemin mevcut kayıtları tek sorguda okunup atlanır; (kalem, dönem, yön)
+    benzersiz indeksi tekrar çalıştırmayı güvenli kılar.
+  - Kayıtlar parça parça toplu INSERT ile yazılır, her parça ayrı commit.
+
+Çalıştırma 'flask kiralama donem-faturala' komutuyladır; zamanlaması
+deploy/crontab'dadır (ayın ilk üç günü, tekrar çalışma kesilenleri atlar).
+
+Kalem sonradan uzatılır ya da düzenlenirse ana gelir kaydı dönem
+faturalarının kapsadığı günleri yeniden saymaz (donem_kapsamlari / kapsanan_gun).
+"""
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.filo.models import Ekipman
+from app.filo.harici import makine_adi
+from app.cari.models import HizmetKaydi
+from app.kiralama.fiyatlama import kira_bedeli
+from app.kiralama.tahakkuk import gelir_tahakkuklarini_guncelle
+from app.cari.risk import firma_risklerini_guncelle
+
+PARCA_BOYUTU = 1000
+
+
+def donem_araligi(donem):
+    """Ayın herhangi bir gününden (ilk gün, son gün)."""
+    ilk = donem.replace(day=1)
+    sonraki = (ilk + timedelta(days=32)).replace(day=1)
+    return ilk, sonraki - timedelta(days=1)
+
+
+def kapanan_donem(bugun=None):
+    """Son kapanmış ayın ilk günü (bugünden önceki ay)."""
+    bugun = bugun or date.today()
+    return (bugun.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def kapsanan_gun(baslangic, bitis, kapsamlar):
+    """[baslangic, bitis] aralığının dönem faturalarıyla zaten faturalanmış gün sayısı."""
+    gun = 0
+    for d_bas, d_bit in kapsamlar or ():
+        ortak = (min(bitis, d_bit) - max(baslangic, d_bas)).days + 1
+        if ortak > 0:
+            gun += ortak
+    return gun
+
+
+def donem_kapsamlari(kiralama_idler, yon='giden'):
+    """
+    Kiralamaların dönem faturalarının (yon='giden': müşteri, 'gelen': tedarikçi)
+    kapsadığı günler: {kalem_id: [(donem_baslangic, donem_bitis), ...]}
+    (ix_hizmet_kaydi_kiralama_yon).
+    """
+    kapsamlar = {}
+    kiralama_idler = list(kiralama_idler)
+    if not kiralama_idler:
+        return kapsamlar
+    for kalem_id, bas, bit in db.session.execute(
+        select(HizmetKaydi.kalem_id, HizmetKaydi.donem_baslangic, HizmetKaydi.donem_bitis)
+        .where(HizmetKaydi.kiralama_id.in_(kiralama_idler), HizmetKaydi.yon == yon,
+               HizmetKaydi.kaynak_tipi == 'donem')
+    ):
+        kapsamlar.setdefault(kalem_id, []).append((bas, bit))
+    return kapsamlar
+
+
+def _makine_adi(k):
+    if k.is_dis_tedarik_ekipman:
+        return makine_adi(k.harici_marka, k.harici_model, 'Dış Tedarik')
+    return k.kod or '-'
+
+
+def donem_faturalarini_kes(donem=None, bugun=None, kuru=False, parca_boyutu=PARCA_BOYUTU):
+    """
+    Verilen ayın (varsayılan: son kapanmış ay) dönem faturalarını keser.
+    Kapanmamış dönem için ValueError. kuru=True ise yalnızca hesaplar.
+    Rapor sözlüğü döndürür.
+    """
+    bugun = bugun or date.today()
+    ilk, son = donem_araligi(donem or kapanan_donem(bugun))
+    if son >= bugun:
+        raise ValueError(f"{ilk.strftime('%m.%Y')} dönemi henüz kapanmadı; yalnızca geçmiş aylar faturalanabilir.")
+    baslangic_zamani = time.perf_counter()
+
+    harici = aliased(Ekipman)
+    kalemler = db.session.execute(
+        select(KiralamaKalemi.id, KiralamaKalemi.kiralama_id,
+               KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis,
+               KiralamaKalemi.kiralama_brm_fiyat, KiralamaKalemi.kiralama_alis_fiyat,
+               KiralamaKalemi.is_dis_tedarik_ekipman, KiralamaKalemi.harici_ekipman_tedarikci_id,
+               harici.marka.label('harici_marka'), harici.model.label('harici_model'),
+               Kiralama.firma_musteri_id, Kiralama.kiralama_form_no, Ekipman.kod)
+        .join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id)
+        .outerjoin(Ekipman, Ekipman.id == KiralamaKalemi.ekipman_id)
+        .outerjoin(harici, harici.id == KiralamaKalemi.harici_ekipman_id)
+        .where(KiralamaKalemi.sonlandirildi == False,  # kısmi indeks koşulu, bkz. app.kiralama.vade
+               KiralamaKalemi.kiralama_bitis < son,
+               KiralamaKalemi.kiralama_baslangici <= son)
+        .order_by(KiralamaKalemi.id)
+    ).all()
+
+    mevcut = set(db.session.execute(
+        select(HizmetKaydi.kalem_id, HizmetKaydi.yon)
+        .where(HizmetKaydi.donem == ilk, HizmetKaydi.kaynak_tipi == 'donem')
+    ).tuples())
+
+    kayitlar, atlanan = [], 0
+    toplam = {'giden': Decimal('0.00'), 'gelen': Decimal('0.00')}
+    for k in kalemler:
+        bas = max(ilk, k.kiralama_baslangici, k.kiralama_bitis + timedelta(days=1))
+        gun = (son - bas).days + 1
+        if gun <= 0:
+            continue
+        ortak = {
+            'tarih': son, 'fatura_no': k.kiralama_form_no, 'kaynak_tipi': 'donem',
+            'kiralama_id': k.kiralama_id, 'kalem_id': k.id,
+            'donem': ilk, 'donem_baslangic': bas, 'donem_bitis': son,
+        }
+        aciklama = f"Dönem Faturası {ilk.strftime('%m.%Y')} - {_makine_adi(k)} ({gun} gün)"
+
+        satirlar = [('giden', k.firma_musteri_id, k.kiralama_brm_fiyat)]
+        if k.is_dis_tedarik_ekipman and k.harici_ekipman_tedarikci_id:
+            satirlar.append(('gelen', k.harici_ekipman_tedarikci_id, k.kiralama_alis_fiyat))
+        for yon, firma_id, birim in satirlar:
+            tutar = kira_bedeli(gun, birim)
+            if tutar <= 0:
+                continue
+            if (k.id, yon) in mevcut:
+                atlanan += 1
+                continue
+            kayitlar.append(dict(ortak, firma_id=firma_id, yon=yon, tutar=tutar, aciklama=aciklama))
+            toplam[yon] += tutar
+
+    if not kuru:
+        for i in range(0, len(kayitlar), parca_boyutu):
+            parca = kayitlar[i:i + parca_boyutu]
+            db.session.execute(insert(HizmetKaydi), parca)
+            # Toplu INSERT flush dinleyicisini tetiklemez; tahakkuk ve firma riski aynı transaction'da yenilenir
+            gelir_tahakkuklarini_guncelle(db.session.connection(), {r['kiralama_id'] for r in parca})
+            firma_risklerini_guncelle(db.session.connection(), {r['firma_id'] for r in parca})
+            db.session.commit()
+
+    sure = time.perf_counter() - baslangic_zamani
+    return {
+        'donem': ilk,
+        'taranan_kalem': len(kalemler),
+        'giden': sum(1 for r in kayitlar if r['yon'] == 'giden'),
+        'gelen': sum(1 for r in kayitlar if r['yon'] == 'gelen'),
+        'atlanan': atlanan,
+        'giden_tutar': toplam['giden'],
+        'gelen_tutar': toplam['gelen'],
+        'sure_sn': round(sure, 2),
+    }
@@ -0,0 +1,129 @@
+"""
+Kiralama listesi fasetli filtreleri.
+
+Liste yalnızca serbest metin aramasını (q) destekliyordu. Buradaki filtreler
+doğrudan dar 'kiralama_ozet' tablosu üzerinde çalışır ve her biri bir bileşik
+indeksle desteklenir (bkz. KiralamaOzet.__table_args__):
+
+    musteri          firma_musteri_id                      ix_kiralama_ozet_musteri
+    durum            aktif / biten (aktif_kalem_sayisi)    ix_kiralama_ozet_durum
+    baslangic/bitis  dönem kesişimi (ilk_baslangic..son_bitis)  ix_kiralama_ozet_donem
+    ekipman          ozmal / harici (harici_kalem_sayisi)  ix_kiralama_ozet_tedarik
+    nakliye          ozmal / harici (harici_nakliye_sayisi)
+
+Faset sayıları tek gruplu sorguyla hesaplanır: faset dışı koşullar (arama,
+vade, tarih) uygulanmış küme müşteriye göre gruplanır ve her faset değeri
+koşullu SUM ile, diğer fasetlerin seçimleri uygulanarak sayılır (seçili değer
+kendi fasetinin diğer seçeneklerini sıfırlamaz).
+"""
+from datetime import date
+
+from sqlalchemy import and_, case, func
+
+from app.kiralama.models import KiralamaOzet
+
+FASETLER = {
+    'durum': ('aktif', 'biten'),
+    'ekipman': ('ozmal', 'harici'),
+    'nakliye': ('ozmal', 'harici'),
+}
+MUSTERI_FASET_LIMITI = 50
+
+
+def _tarih(deger):
+    try:
+        return date.fromisoformat(deger) if deger else None
+    except ValueError:
+        return None
+
+
+def filtre_oku(args):
+    """İstek parametrelerinden geçerli filtre değerleri (geçersizler None)."""
+    filtre = {
+        'musteri': args.get('musteri', type=int),
+        'baslangic': _tarih(args.get('baslangic', '')),
+        'bitis': _tarih(args.get('bitis', '')),
+    }
+    for faset, degerler in FASETLER.items():
+        deger = args.get(faset, '')
+        filtre[faset] = deger if deger in degerler else None
+    return filtre
+
+
+def _kosullar():
+    """Faset değeri -> KiralamaOzet koşulu."""
+    o = KiralamaOzet
+    return {
+        ('durum', 'aktif'): o.aktif_kalem_sayisi > 0,
+        ('durum', 'biten'): o.aktif_kalem_sayisi == 0,
+        ('ekipman', 'harici'): o.harici_kalem_sayisi > 0,
+        ('ekipman', 'ozmal'): o.harici_kalem_sayisi < o.kalem_sayisi,
+        ('nakliye', 'harici'): o.harici_nakliye_sayisi > 0,
+        ('nakliye', 'ozmal'): o.harici_nakliye_sayisi < o.kalem_sayisi,
+    }
+
+
+def tarih_kosullari(filtre):
+    """Dönem kesişimi: kiralama [ilk_baslangic, son_bitis] aralığı filtre penceresine değiyor mu."""
+    kosullar = []
+    if filtre['baslangic']:
+        kosullar.append(KiralamaOzet.son_bitis >= filtre['baslangic'])
+    if filtre['bitis']:
+        kosullar.append(KiralamaOzet.ilk_baslangic <= filtre['bitis'])
+    return kosullar
+
+
+def faset_kosullari(filtre):
+    """Seçili müşteri ve faset değerlerinin koşulları."""
+    kosullar = [_kosullar()[(faset, filtre[faset])] for faset in FASETLER if filtre[faset]]
+    if filtre['musteri']:
+        kosullar.append(KiralamaOzet.firma_musteri_id == filtre['musteri'])
+    return kosullar
+
+
+def filtre_uygula(query, filtre):
+    """KiralamaOzet sorgusuna tüm filtreleri ekler."""
+    kosullar = tarih_kosullari(filtre) + faset_kosullari(filtre)
+    return query.filter(and_(*kosullar)) if kosullar else query
+
+
+def faset_sayilari(query, filtre):
+    """
+    'query': faset dışı koşulları (arama, vade) uygulanmış KiralamaOzet sorgusu.
+    {'musteri': [(id, ad, adet)], 'durum': {'aktif': n, 'biten': n}, 'ekipman': {...}, 'nakliye': {...}}
+    """
+    kosullar = _kosullar()
+    secimler = {faset: kosullar[(faset, filtre[faset])] for faset in FASETLER if filtre[faset]}
+
+    def say(*kosul):
+        return func.sum(case((and_(*kosul), 1), else_=0)) if kosul else func.count()
+
+    # Her faset değeri, kendi fasetinin dışındaki seçimlerle sayılır
+    sutunlar = [
+        say(kosul, *[k for f, k in secimler.items() if f != faset]).label(f'{faset}_{deger}')
+        for (faset, deger), kosul in kosullar.items()
+    ]
+    sorgu = query.filter(*tarih_kosullari(filtre)).order_by(None) \
+        .with_entities(KiralamaOzet.firma_musteri_id, func.max(KiralamaOzet.musteri_adi).label('musteri_adi'),
+                       say(*secimler.values()).label('adet'), *sutunlar) \
+        .group_by(KiralamaOzet.firma_musteri_id)
+
+    sayilar = {faset: dict.fromkeys(degerler, 0) for faset, degerler in FASETLER.items()}
+    musteriler = []
+    for satir in sorgu:
+        if satir.adet:
+            musteriler.append((satir.firma_musteri_id, satir.musteri_adi, satir.adet))
+        if filtre['musteri'] and satir.firma_musteri_id != filtre['musteri']:
+            continue
+        for faset, degerler in FASETLER.items():
+            for deger in degerler:
+                sayilar[faset][deger] += getattr(satir, f'{faset}_{deger}') or 0
+
+    musteriler.sort(key=lambda m: (-m[2], m[1] or ''))
+    ilkler = musteriler[:MUSTERI_FASET_LIMITI]
+    sayilar['musteri'] = ilkler + [m for m in musteriler[MUSTERI_FASET_LIMITI:] if m[0] == filtre['musteri']]
+    return sayilar
+
+
+def aktif_filtre_var(filtre):
+    return any(filtre.values())
@@ -0,0 +1,111 @@
+"""
+Kiralama bedeli hesabı (tek motor).
+
+    gün   = max(bitiş - başlangıç + 1, asgari gün)
+    kira  = tarifeye göre gün bedeli
+    toplam = kira + nakliye satış
+
+Bu formül kiralama ekleme/düzenleme, toplu işlemler, özet tablosu, toplu
+aktarım, dönem faturası ve kiralama formu (docx) üretiminde ayrı ayrı
+yazılmıştı; döküman tarafı float kullanıyordu. Tüm hesaplar buradan geçer ve
+Decimal ile kuruşa yuvarlanır.
+
+Tarife: günlük fiyat zorunlu; haftalık ve aylık fiyat verilirse uzun süreler
+kademeli fiyatlanır (tam aylar aylık, kalan tam haftalar haftalık, kalan
+günler günlük fiyattan; artık günler bir haftalık, artık hafta+günler bir
+aylık bedeli aşmaz). Kalemlerde bugün yalnızca günlük fiyat tutulur; bu
+durumda sonuç eski (gün x birim fiyat) hesabıyla birebir aynıdır.
+
+Toplu API (toplu_fiyatla) raporlar ve yeniden hesaplamalar içindir: aynı
+(gün, tarife) çifti bir kez hesaplanır, tekrar eden fiyatlar sözlükten okunur.
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+AY_GUNU = 30
+HAFTA_GUNU = 7
+KURUS = Decimal('0.01')
+SIFIR = Decimal('0.00')
+
+Tarife = namedtuple('Tarife', 'gunluk haftalik aylik min_gun', defaults=(None, None, 1))
+Tarife.__doc__ = "Kiralama tarifesi: günlük (zorunlu), haftalık ve aylık fiyat (isteğe bağlı), asgari gün."
+
+Fiyat = namedtuple('Fiyat', 'gun kira nakliye toplam')
+Fiyat.__doc__ = "Bir kalemin bedeli: faturalanan gün, kira bedeli, nakliye satış ve toplam (Decimal)."
+
+
+def _decimal(deger):
+    if deger is None:
+        return SIFIR
+    if isinstance(deger, Decimal):
+        return deger
+    return Decimal(str(deger))
+
+
+def tarife(gunluk, haftalik=None, aylik=None, min_gun=1):
+    """Tarife üretir; fiyatları Decimal'e çevirir, boş/sıfır kademe fiyatlarını yok sayar."""
+    haftalik, aylik = _decimal(haftalik), _decimal(aylik)
+    return Tarife(_decimal(gunluk), haftalik if haftalik > 0 else None,
+                  aylik if aylik > 0 else None, max(int(min_gun or 1), 1))
+
+
+def kiralama_gunu(baslangic, bitis, min_gun=1):
+    """Faturalanan gün: iki uç dahil gün sayısı, en az min_gun."""
+    return max((bitis - baslangic).days + 1, min_gun)
+
+
+def kira_bedeli(gun, t):
+    """'gun' günün tarifeye göre kira bedeli (Decimal, kuruşa yuvarlı). t: Tarife ya da günlük fiyat."""
+    if not isinstance(t, Tarife):
+        t = tarife(t)
+    if gun <= 0:
+        return SIFIR
+    kalan, tutar = gun, SIFIR
+    if t.aylik is not None:
+        ay, kalan = divmod(kalan, AY_GUNU)
+        tutar += t.aylik * ay
+    if t.haftalik is not None:
+        hafta, kalan = divmod(kalan, HAFTA_GUNU)
+        artik = t.haftalik * hafta + min(t.gunluk * kalan, t.haftalik)
+    else:
+        artik = t.gunluk * kalan
+    if t.aylik is not None:
+        artik = min(artik, t.aylik)
+    return (tutar + artik).quantize(KURUS, rounding=ROUND_HALF_UP)
+
+
+def kalem_bedeli(baslangic, bitis, brm_fiyat, nakliye_satis=None, haric_gun=0):
+    """
+    Tek kalemin bedeli (Fiyat). brm_fiyat günlük fiyat ya da Tarife olabilir.
+    haric_gun: başka belgelerle zaten faturalanmış günler (ör. dönem faturaları).
+    """
+    t = brm_fiyat if isinstance(brm_fiyat, Tarife) else tarife(brm_fiyat)
+    gun = kiralama_gunu(baslangic, bitis, t.min_gun) - haric_gun
+    kira = kira_bedeli(gun, t)
+    nakliye = _decimal(nakliye_satis)
+    return Fiyat(gun, kira, nakliye, kira + nakliye)
+
+
+def toplu_fiyatla(satirlar, haric_gunler=None):
+    """
+    Çok sayıda kalemi tek geçişte fiyatlar.
+    satirlar: (baslangic, bitis, brm_fiyat ya da Tarife, nakliye_satis) demetleri.
+    haric_gunler: satırlarla aynı sırada hariç gün sayıları (isteğe bağlı).
+    [Fiyat, ...] döndürür.
+    """
+    tarifeler, bedeller, sonuc = {}, {}, []
+    ekle = sonuc.append
+    haric = iter(haric_gunler) if haric_gunler is not None else None
+    for baslangic, bitis, brm_fiyat, nakliye_satis in satirlar:
+        t = tarifeler.get(brm_fiyat)
+        if t is None:
+            t = tarifeler[brm_fiyat] = brm_fiyat if isinstance(brm_fiyat, Tarife) else tarife(brm_fiyat)
+        gun = max((bitis - baslangic).days + 1, t.min_gun)
+        if haric is not None:
+            gun -= next(haric)
+        kira = bedeller.get((gun, t))
+        if kira is None:
+            kira = bedeller[(gun, t)] = kira_bedeli(gun, t)
+        nakliye = _decimal(nakliye_satis)
+        ekle(Fiyat(gun, kira, nakliye, kira + nakliye))
+    return sonuc
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, IntegerField, DateField, SelectField, DecimalField, HiddenField, BooleanField, FieldList, FormField
 from wtforms.validators import DataRequired, Optional, InputRequired, NumberRange, ValidationError
-from app.utils import validate_currency, secim_hata_mesaji
+from app.utils import validate_currency, secim_hata_mesaji, KumeSelectField
 
 # 1. KALEM FORMU (Satır Bazlı Detaylar)
 class KiralamaKalemiForm(FlaskForm):
@@ -11,12 +11,15 @@ class KiralamaKalemiForm(FlaskForm):
     id = HiddenField('Kalem ID')
     
     # --- MAKİNE SEÇİM VE DIŞ TEDARİK ---
+    # Seçim alanları KumeSelectField: geçerli id kümeleri populate_kiralama_form_choices'ta
+    # istek başına bir kez kurulur ve tüm satırlarda paylaşılır.
     # JS tarafı 0/1 gönderdiği için IntegerField kullanımı senin orijinal yapınla daha uyumlu
     dis_tedarik_ekipman = IntegerField("Dış Tedarik?", default=0)
-    ekipman_id = SelectField('Pimaks Filosu', coerce=int, validators=[Optional()])
+    ekipman_id = KumeSelectField('Pimaks Filosu', coerce=int, validators=[Optional()])
     
     # Harici Ekipman Detayları (Yeni İskeletimiz İçin Şart)
-    harici_ekipman_tedarikci_id = SelectField('Ekipman Tedarikçisi', coerce=int, default=0, validators=[Optional()])
+    # Kalemde saklanmaz: kayıtta tedarikçinin makine kataloğunda bulunur ya da eklenir (app.filo.harici)
+    harici_ekipman_tedarikci_id = KumeSelectField('Ekipman Tedarikçisi', coerce=int, default=0, validators=[Optional()])
     harici_ekipman_tipi = StringField('Harici Ekipman Tipi', validators=[Optional()])
     harici_ekipman_marka = StringField('Harici Ekipman Markası', validators=[Optional()])
     harici_ekipman_model = StringField('Harici Ekipman Modeli', validators=[Optional()])
@@ -37,10 +40,10 @@ class KiralamaKalemiForm(FlaskForm):
     dis_tedarik_nakliye = IntegerField("Harici Nakliye?", default=0)
     nakliye_satis_fiyat = DecimalField('Nakliye Satış Fiyatı', places=2, validators=[Optional()], default=0.0)
     nakliye_alis_fiyat = DecimalField('Nakliye Alış Fiyatı', places=2, validators=[Optional()], default=0.0)
-    nakliye_tedarikci_id = SelectField('Nakliye Tedarikçisi', coerce=int, default=0, validators=[Optional()])
+    nakliye_tedarikci_id = KumeSelectField('Nakliye Tedarikçisi', coerce=int, default=0, validators=[Optional()])
     
     # ÖZ MAL NAKLİYE ARACI (Yeni Gereksinimimiz)
-    nakliye_araci_id = SelectField('Nakliye Aracı (Öz Mal)', coerce=int, default=0, validators=[Optional()])
+    nakliye_araci_id = KumeSelectField('Nakliye Aracı (Öz Mal)', coerce=int, default=0, validators=[Optional()])
 
     # --- ÖZEL DOĞRULAYICI: Tarih Kontrolü (Orijinal Mantık) ---
     def validate_kiralama_bitis(self, field):
@@ -53,7 +56,7 @@ class KiralamaForm(FlaskForm):
     kiralama_form_no = StringField('Kiralama Form No', validators=[Optional()])
     
     # Müşteri Seçimi (Özel hata mesajı korundu)
-    firma_musteri_id = SelectField('Müşteri (Firma) Seç', coerce=int, default=0, 
+    firma_musteri_id = KumeSelectField('Müşteri (Firma) Seç', coerce=int, default=0, 
                                  validators=[NumberRange(min=1, message=secim_hata_mesaji)])
     
     kdv_orani = IntegerField('KDV Oranı (%)', default=20, 
@@ -66,4 +69,15 @@ class KiralamaForm(FlaskForm):
     # HATA DÜZELTME: min_entries=1 yapıldı. 
     # ekle.html içinde form.kalemler[0] öğesine erişildiği için bu listenin boş olmaması gerekir.
     kalemler = FieldList(FormField(KiralamaKalemiForm), min_entries=1)
-    submit = SubmitField('Kiralama Formunu Kaydet')
\ No newline at end of file
+    submit = SubmitField('Kiralama Formunu Kaydet')
+
+# 3. TARİFE FORMU (Teklif motoru liste fiyatları, app.kiralama.teklif)
+class KiralamaTarifesiForm(FlaskForm):
+    tipi = StringField('Makine Tipi', validators=[DataRequired()])
+    yukseklik_bandi = SelectField('Yükseklik Bandı (m)', coerce=int, default=-1)
+    kapasite_bandi = SelectField('Kapasite Bandı (kg)', coerce=int, default=-1)
+    gunluk_fiyat = DecimalField('Günlük Fiyat', places=2, validators=[InputRequired(), NumberRange(min=0)])
+    haftalik_fiyat = DecimalField('Haftalık Fiyat', places=2, validators=[Optional(), NumberRange(min=0)])
+    aylik_fiyat = DecimalField('Aylık Fiyat', places=2, validators=[Optional(), NumberRange(min=0)])
+    min_gun = IntegerField('Asgari Gün', default=1, validators=[Optional(), NumberRange(min=1)])
+    submit = SubmitField('Tarifeyi Kaydet')
@@ -0,0 +1,348 @@
+"""
+Kiralama düzenleme için fark (change-set) motoru.
+
+Eski akış her kaydetmede formun tüm cari kayıtlarını silip yeniden ekliyor,
+kalem ve ekipmanları tek tek get() ile çekiyor ve döngü içinde flush
+yapıyordu. Burada:
+  1. Kiralama, kalemleri ve kalemlerin makineleri tek sorguda yüklenir;
+     formda yeni seçilen makineler tek IN sorgusuyla eklenir.
+  2. Gönderilen form ile mevcut durum karşılaştırılıp eklenecek, değişecek
+     ve silinecek kalemler ile makine durumu geçişleri hesaplanır.
+  3. Değişiklikler tek flush ile yazılır. Cari (gelir) kaydı yalnızca
+     tutarı veya müşterisi değiştiyse güncellenir; tedarikçi (alış) kayıtları
+     tedarikçi başına toplamı değiştiyse güncellenir, eklenir ya da silinir.
+     Makine durumu geçişleri
+     app.filo.durum üzerinden koşullu UPDATE ile yapılır; ayrılamayan makine
+     DurumCakismasi yükseltir. Dönem faturalarıyla (app.kiralama.donem)
+     faturalanmış günler ana gelir kaydında tekrar sayılmaz.
+  4. Dış tedarik makineleri tedarikçi kataloğunda (app.filo.harici) tek
+     toplu bul/ekle ile çözülür; kalem yalnızca katalog id'sini taşır.
+     Seri no'lu makinede formda düzeltilen bilgiler katalog satırına yazılır
+     ve değişiklik sayılır.
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.filo.models import Ekipman
+from app.filo.harici import (katalog_anahtari, katalog_idleri, katalog_duzeltmeleri,
+                             katalog_duzeltmelerini_uygula)
+from app.cari.models import HizmetKaydi
+from app.filo.durum import rezerve_et_hepsi, serbest_birak
+from app.kiralama.donem import donem_kapsamlari, kapsanan_gun
+from app.kiralama.fiyatlama import kalem_bedeli
+from app.nakliyeler.sevkiyat import kalem_olaylari
+
+
+def kiralama_duzenleme_icin_yukle(kiralama_id):
+    """Kiralama + kalemler + kalem makineleri (öz mal ve harici, tek sorgu). Bulunamazsa None."""
+    kalemler = joinedload(Kiralama.kalemler)
+    return Kiralama.query.options(
+        kalemler.joinedload(KiralamaKalemi.ekipman),
+        kalemler.joinedload(KiralamaKalemi.harici_ekipman),
+    ).filter(Kiralama.id == kiralama_id).first()
+
+
+def _kalem_tutari(alanlar, kapsam=None):
+    bas, bit = alanlar['kiralama_baslangici'], alanlar['kiralama_bitis']
+    return kalem_bedeli(bas, bit, alanlar['kiralama_brm_fiyat'], alanlar['nakliye_satis_fiyat'],
+                        haric_gun=kapsanan_gun(bas, bit, kapsam)).toplam
+
+
+def _alis_tutari(alanlar, kapsam=None):
+    """Dış tedarik kaleminin tedarikçiye alış bedeli (tedarikçi dönem faturalarının günleri hariç)."""
+    bas, bit = alanlar['kiralama_baslangici'], alanlar['kiralama_bitis']
+    return kalem_bedeli(bas, bit, alanlar['kiralama_alis_fiyat'], haric_gun=kapsanan_gun(bas, bit, kapsam)).kira
+
+
+_ARALIK_ALANLARI = {'ekipman_id', 'kiralama_baslangici', 'kiralama_bitis'}
+_SEVK_ALANLARI = {'nakliye_araci_id', 'kiralama_baslangici', 'kiralama_bitis'}
+TEDARIKCISIZ_HARICI_MESAJI = "Dış tedarik kalemlerinde ekipman tedarikçisi seçilmelidir."
+
+
+def _talep(hedef):
+    return hedef['ekipman_id'], hedef['kiralama_baslangici'], hedef['kiralama_bitis']
+
+
+def _arac_olaylari(hedef, kiralama_id):
+    return kalem_olaylari(hedef['nakliye_araci_id'], hedef['kiralama_baslangici'], hedef['kiralama_bitis'], kiralama_id)
+
+
+def _esit(eski, yeni):
+    """Boş metin ile NULL aynı kabul edilir (form '' gönderir, toplu aktarım NULL yazar)."""
+    if eski in (None, '') and yeni in (None, ''):
+        return True
+    return eski == yeni
+
+
+def _secim(deger):
+    deger = int(deger or 0)
+    return deger if deger > 0 else None
+
+
+def harici_mi(f):
+    return int(f.dis_tedarik_ekipman.data or 0) == 1
+
+
+def harici_talebi(f):
+    """Dış tedarik kalem alt formunun katalog talebi: (tedarikci_id, makine bilgisi)."""
+    return _secim(f.harici_ekipman_tedarikci_id.data), {
+        'tipi': f.harici_ekipman_tipi.data,
+        'marka': f.harici_ekipman_marka.data,
+        'model': f.harici_ekipman_model.data,
+        'seri_no': f.harici_ekipman_seri_no.data,
+        'calisma_yuksekligi': f.harici_ekipman_calisma_yuksekligi.data,
+        'kaldirma_kapasitesi': f.harici_ekipman_kaldirma_kapasitesi.data,
+        'uretim_tarihi': f.harici_ekipman_uretim_tarihi.data,
+    }
+
+
+def harici_katalog_idleri(kalem_formlari):
+    """
+    Formdaki dış tedarik makinelerini katalogda bulur/ekler (tek toplu işlem).
+    (alt form -> katalog ekipman_id fonksiyonu, katalog düzeltmeleri) döner;
+    tedarikçisiz kalemde fonksiyon None verir. Düzeltmeler
+    katalog_duzeltmelerini_uygula ile yazılır.
+    """
+    talepler = {id(f): harici_talebi(f) for f in kalem_formlari
+                if harici_mi(f) and f.kiralama_baslangici.data and f.kiralama_bitis.data}
+    idler = katalog_idleri(db.session, talepler.values())
+
+    def bul(f):
+        tedarikci_id, bilgi = talepler.get(id(f)) or (None, None)
+        return idler.get(katalog_anahtari(tedarikci_id, bilgi)) if tedarikci_id else None
+    return bul, katalog_duzeltmeleri(db.session, talepler.values(), idler)
+
+
+def tedarikcisiz_harici_var(kalem_formlari):
+    """Tedarikçisi seçilmemiş dış tedarik kalemi var mı (katalog tedarikçiye bağlıdır)."""
+    return any(harici_mi(f) and not _secim(f.harici_ekipman_tedarikci_id.data)
+               for f in kalem_formlari if f.kiralama_baslangici.data and f.kiralama_bitis.data)
+
+
+def _hedef_alanlar(f, mevcut_ekipman_id, katalog_id):
+    """Kalem alt formundan kalemin olması gereken alan değerlerini üretir."""
+    hedef = {
+        'kiralama_baslangici': f.kiralama_baslangici.data,
+        'kiralama_bitis': f.kiralama_bitis.data,
+        'kiralama_brm_fiyat': Decimal(str(f.kiralama_brm_fiyat.data or 0)),
+        'kiralama_alis_fiyat': Decimal(str(f.kiralama_alis_fiyat.data or 0)),
+        'nakliye_satis_fiyat': Decimal(str(f.nakliye_satis_fiyat.data or 0)),
+        'nakliye_alis_fiyat': Decimal(str(f.nakliye_alis_fiyat.data or 0)),
+    }
+
+    if harici_mi(f):
+        hedef.update({
+            'ekipman_id': None,
+            'is_dis_tedarik_ekipman': True,
+            'harici_ekipman_id': katalog_id(f),
+            'harici_ekipman_tedarikci_id': _secim(f.harici_ekipman_tedarikci_id.data),
+        })
+    else:
+        # Makine seçilmemişse mevcut makine korunur (eski davranış)
+        hedef['ekipman_id'] = _secim(f.ekipman_id.data) or mevcut_ekipman_id
+        hedef['is_dis_tedarik_ekipman'] = False
+
+    harici_nakliye = int(f.dis_tedarik_nakliye.data or 0) == 1
+    hedef.update({
+        'is_harici_nakliye': harici_nakliye,
+        'is_oz_mal_nakliye': not harici_nakliye,
+        'nakliye_tedarikci_id': _secim(f.nakliye_tedarikci_id.data) if harici_nakliye else None,
+        'nakliye_araci_id': None if harici_nakliye else _secim(f.nakliye_araci_id.data),
+    })
+    return hedef
+
+
+class DegisiklikSeti:
+    """Bir kiralama düzenlemesinin veritabanına uygulanacak farkları."""
+
+    def __init__(self, kiralama):
+        self.kiralama = kiralama
+        self.baslik = {}            # Kiralama alanı -> yeni değer
+        self.eklenecek = []         # [hedef alanlar]
+        self.guncellenecek = []     # [(kalem, {alan: yeni değer})]
+        self.silinecek = []         # [kalem]
+        self.ekipman_durumlari = {} # ekipman -> yeni çalışma durumu
+        self.cari_kayit = None
+        self.cari_islem = None      # None | 'ekle' | 'guncelle' | 'sil'
+        self.toplam_gelir = Decimal('0.00')
+        # Tedarikçi (gelen) alış kayıtları; tedarikçi başına ilk kayıt tutulur
+        self.gelen_guncellenecek = []  # [(kayit, yeni tutar)]
+        self.gelen_eklenecek = []      # [(tedarikci_id, tutar)]
+        self.gelen_silinecek = []      # [kayit]
+        self.katalog_duzeltmeleri = {} # katalog ekipman_id -> {alan: yeni değer}
+        # Çakışma kontrolü (app.filo.musaitlik.cakismalari_bul) için
+        self.makine_talepleri = []  # [(ekipman_id, baslangic, bitis)] yeni/tarihi-makinesi değişen kalemler
+        self.haric_kalem_idler = [] # eski aralığı artık geçerli olmayan kalemler
+        # Araç çakışması (app.nakliyeler.sevkiyat.arac_cakismalari) için: yeni/aracı-tarihi değişen kalemler
+        self.arac_olaylari = []     # [(arac_id, tarih, tur, kiralama_id)]
+
+    def bos_mu(self):
+        return not (self.baslik or self.eklenecek or self.guncellenecek or self.silinecek
+                    or self.ekipman_durumlari or self.cari_islem
+                    or self.gelen_guncellenecek or self.gelen_eklenecek or self.gelen_silinecek
+                    or self.katalog_duzeltmeleri)
+
+    def uygula(self):
+        """Farkları oturuma işler ve tek flush ile yazar."""
+        kiralama = self.kiralama
+        for alan, deger in self.baslik.items():
+            setattr(kiralama, alan, deger)
+
+        for kalem, alanlar in self.guncellenecek:
+            for alan, deger in alanlar.items():
+                setattr(kalem, alan, deger)
+        katalog_duzeltmelerini_uygula(self.katalog_duzeltmeleri)
+        for alanlar in self.eklenecek:
+            kiralama.kalemler.append(KiralamaKalemi(sonlandirildi=False, **alanlar))
+        for kalem in self.silinecek:
+            kiralama.kalemler.remove(kalem)  # delete-orphan ile silinir
+        if self.silinecek:
+            # SQLite'ta FK CASCADE çalışmaz; silinen kalemlerin dönem faturaları elle silinir
+            HizmetKaydi.query.filter(
+                HizmetKaydi.kalem_id.in_([k.id for k in self.silinecek])
+            ).delete(synchronize_session=False)
+
+        # Makine durumları koşullu UPDATE ile (öncesinde oturum otomatik flush edilir)
+        durumlar = self.ekipman_durumlari.items()
+        serbest_birak([e.id for e, durum in durumlar if durum == 'bosta'])
+        rezerve_et_hepsi([e.id for e, durum in durumlar if durum == 'kirada'])
+
+        if self.cari_islem == 'guncelle':
+            self.cari_kayit.tutar = self.toplam_gelir
+            self.cari_kayit.firma_id = kiralama.firma_musteri_id
+        elif self.cari_islem == 'sil':
+            db.session.delete(self.cari_kayit)
+        elif self.cari_islem == 'ekle':
+            db.session.add(HizmetKaydi(
+                firma_id=kiralama.firma_musteri_id, tarih=date.today(), tutar=self.toplam_gelir,
+                yon='giden', fatura_no=kiralama.kiralama_form_no,
+                kaynak_tipi='kiralama', kiralama_id=kiralama.id,
+                aciklama=f"Kiralama Güncelleme - {kiralama.kiralama_form_no}"
+            ))
+
+        for kayit, tutar in self.gelen_guncellenecek:
+            kayit.tutar = tutar
+        for kayit in self.gelen_silinecek:
+            db.session.delete(kayit)
+        for tedarikci_id, tutar in self.gelen_eklenecek:
+            db.session.add(HizmetKaydi(
+                firma_id=tedarikci_id, tarih=date.today(), tutar=tutar,
+                yon='gelen', fatura_no=kiralama.kiralama_form_no,
+                kaynak_tipi='kiralama', kiralama_id=kiralama.id,
+                aciklama=f"Dış Kiralama Güncelleme - {kiralama.kiralama_form_no}"
+            ))
+
+        db.session.flush()
+
+
+def degisiklik_seti_olustur(kiralama, form):
+    """
+    Gönderilen KiralamaForm'u kiralamanın mevcut durumuyla karşılaştırır.
+    'kiralama' kiralama_duzenleme_icin_yukle() ile yüklenmiş olmalıdır.
+    """
+    seti = DegisiklikSeti(kiralama)
+
+    for alan in ('firma_musteri_id', 'kdv_orani', 'doviz_kuru_usd', 'doviz_kuru_eur'):
+        yeni = getattr(form, alan).data
+        if not _esit(getattr(kiralama, alan), yeni):
+            seti.baslik[alan] = yeni
+
+    mevcut = {k.id: k for k in kiralama.kalemler}
+    hedefler = []  # [(kalem veya None, hedef alanlar)]
+    katalog_id, seti.katalog_duzeltmeleri = harici_katalog_idleri([k_form.form for k_form in form.kalemler])
+    for k_form in form.kalemler:
+        f = k_form.form
+        if not (f.kiralama_baslangici.data and f.kiralama_bitis.data):
+            continue
+        kalem_id = str(f.id.data or '')
+        # Başka bir kiralamaya ait kalem id'si gönderilirse yeni kalem sayılır
+        kalem = mevcut.pop(int(kalem_id), None) if kalem_id.isdigit() else None
+        hedefler.append((kalem, _hedef_alanlar(f, kalem.ekipman_id if kalem else None, katalog_id)))
+    seti.silinecek = list(mevcut.values())
+
+    # Kalemlerde bulunmayan, yeni seçilen makineler tek sorguda yüklenir
+    ekipmanlar = {k.ekipman_id: k.ekipman for k in kiralama.kalemler if k.ekipman_id}
+    yeni_idler = {h['ekipman_id'] for _, h in hedefler if h['ekipman_id']} - set(ekipmanlar)
+    if yeni_idler:
+        ekipmanlar.update({e.id: e for e in Ekipman.query.filter(Ekipman.id.in_(yeni_idler)).all()})
+
+    kapsamlar = donem_kapsamlari([kiralama.id])
+    gelen_kapsamlar = donem_kapsamlari([kiralama.id], yon='gelen')
+    bosalan, kiralanan = set(), set()
+    gelen_toplamlar = {}  # tedarikci_id -> alış bedeli
+    for kalem, hedef in hedefler:
+        seti.toplam_gelir += _kalem_tutari(hedef, kapsamlar.get(kalem.id) if kalem else None)
+        tedarikci_id = hedef.get('harici_ekipman_tedarikci_id')
+        if tedarikci_id and hedef['kiralama_alis_fiyat'] > 0:
+            gelen_toplamlar[tedarikci_id] = gelen_toplamlar.get(tedarikci_id, Decimal('0.00')) \
+                + _alis_tutari(hedef, gelen_kapsamlar.get(kalem.id) if kalem else None)
+        if kalem is None:
+            seti.eklenecek.append(hedef)
+            if hedef['ekipman_id']:
+                kiralanan.add(hedef['ekipman_id'])
+                seti.makine_talepleri.append(_talep(hedef))
+            seti.arac_olaylari += _arac_olaylari(hedef, kiralama.id)
+            continue
+
+        farklar = {alan: deger for alan, deger in hedef.items() if not _esit(getattr(kalem, alan), deger)}
+        if farklar:
+            seti.guncellenecek.append((kalem, farklar))
+        if farklar.keys() & _ARALIK_ALANLARI:
+            seti.haric_kalem_idler.append(kalem.id)
+            if hedef['ekipman_id']:
+                seti.makine_talepleri.append(_talep(hedef))
+        if farklar.keys() & _SEVK_ALANLARI:
+            seti.arac_olaylari += _arac_olaylari(hedef, kiralama.id)
+        if 'ekipman_id' in farklar:
+            # Sonlandırılmış kalemin makinesi başka bir kirada olabilir; boşa çıkarılmaz
+            if kalem.ekipman_id and not kalem.sonlandirildi:
+                bosalan.add(kalem.ekipman_id)
+            if hedef['ekipman_id'] and not kalem.sonlandirildi:
+                kiralanan.add(hedef['ekipman_id'])
+
+    for kalem in seti.silinecek:
+        seti.haric_kalem_idler.append(kalem.id)
+        if kalem.ekipman_id and not kalem.sonlandirildi:
+            bosalan.add(kalem.ekipman_id)
+
+    # Aynı düzenlemede bir kalemden çıkarılıp başka kaleme verilen makine kirada kalır
+    for ekipman_id, durum in [(i, 'bosta') for i in bosalan - kiralanan] + [(i, 'kirada') for i in kiralanan]:
+        ekipman = ekipmanlar.get(ekipman_id)
+        if ekipman and ekipman.calisma_durumu != durum:
+            seti.ekipman_durumlari[ekipman] = durum
+
+    # --- Cari (gelir) kaydı: yalnızca tutar/müşteri değiştiyse dokunulur ---
+    seti.cari_kayit = HizmetKaydi.query.filter_by(
+        kiralama_id=kiralama.id, yon='giden', kaynak_tipi='kiralama'
+    ).order_by(HizmetKaydi.id).first()
+    musteri = seti.baslik.get('firma_musteri_id', kiralama.firma_musteri_id)
+    if seti.cari_kayit is None:
+        if seti.toplam_gelir > 0:
+            seti.cari_islem = 'ekle'
+    elif seti.toplam_gelir <= 0:
+        seti.cari_islem = 'sil'
+    elif seti.cari_kayit.tutar != seti.toplam_gelir or seti.cari_kayit.firma_id != musteri:
+        seti.cari_islem = 'guncelle'
+
+    # --- Tedarikçi (gelen) kayıtları: tedarikçi başına toplam karşılaştırılır ---
+    # Kalem başına açılmış kayıtlar toplam tutmuyorsa ilk kayıtta birleştirilir
+    gelen_kayitlar = {}
+    for kayit in HizmetKaydi.query.filter_by(
+        kiralama_id=kiralama.id, yon='gelen', kaynak_tipi='kiralama'
+    ).order_by(HizmetKaydi.id):
+        gelen_kayitlar.setdefault(kayit.firma_id, []).append(kayit)
+    for tedarikci_id in gelen_toplamlar.keys() | gelen_kayitlar.keys():
+        tutar, kayitlar = gelen_toplamlar.get(tedarikci_id), gelen_kayitlar.get(tedarikci_id, [])
+        if not kayitlar:
+            seti.gelen_eklenecek.append((tedarikci_id, tutar))
+        elif tutar is None:
+            seti.gelen_silinecek += kayitlar
+        elif sum((Decimal(str(k.tutar or 0)) for k in kayitlar), Decimal('0.00')) != tutar:
+            seti.gelen_guncellenecek.append((kayitlar[0], tutar))
+            seti.gelen_silinecek += kayitlar[1:]
+
+    return seti
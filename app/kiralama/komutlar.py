@@ -0,0 +1,165 @@
+import csv
+import random
+import time
+import click
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.kiralama import kiralama_bp
+from app.kiralama.arama import arama_indeksi_aktif, arama_indeksini_yeniden_olustur
+from app.kiralama.ozet import kiralama_ozetlerini_yeniden_olustur
+from app.kiralama.tahakkuk import gelir_tahakkuklarini_yeniden_olustur
+from app.kiralama.aktarim import PARCA_BOYUTU, satirlari_oku, kiralamalari_ice_aktar
+from app.kiralama.donem import PARCA_BOYUTU as DONEM_PARCA_BOYUTU, donem_faturalarini_kes
+from app.kiralama.fiyatlama import tarife, kalem_bedeli, toplu_fiyatla
+from app.kiralama.mutabakat import PARCA_BOYUTU as MUTABAKAT_PARCA_BOYUTU, cari_mutabakat
+
+
+# -------------------------------------------------------------------------
+# flask kiralama arama-yeniden-olustur
+# -------------------------------------------------------------------------
+@kiralama_bp.cli.command('arama-yeniden-olustur')
+def arama_yeniden_olustur():
+    """Kiralama FTS5 arama indeksini sıfırdan kurar."""
+    if not arama_indeksi_aktif():
+        raise click.ClickException("Arama indeksi yok (SQLite değil ya da migration uygulanmamış).")
+    adet = arama_indeksini_yeniden_olustur()
+    click.echo(f"{adet} kiralama indekslendi.")
+
+
+# -------------------------------------------------------------------------
+# flask kiralama ozet-yeniden-olustur
+# -------------------------------------------------------------------------
+@kiralama_bp.cli.command('ozet-yeniden-olustur')
+def ozet_yeniden_olustur():
+    """kiralama_ozet tablosunu tüm kiralamalar için yeniden hesaplar."""
+    adet = kiralama_ozetlerini_yeniden_olustur()
+    click.echo(f"{adet} kiralama özeti oluşturuldu.")
+
+
+
+# -------------------------------------------------------------------------
+# flask kiralama tahakkuk-yeniden-olustur
+# -------------------------------------------------------------------------
+@kiralama_bp.cli.command('tahakkuk-yeniden-olustur')
+def tahakkuk_yeniden_olustur():
+    """gelir_tahakkuk tablosunu tüm kiralamalar için yeniden hesaplar."""
+    adet = gelir_tahakkuklarini_yeniden_olustur()
+    click.echo(f"{adet} kiralamanın gelir tahakkuku oluşturuldu.")
+
+# -------------------------------------------------------------------------
+# flask kiralama ice-aktar DOSYA [--parca 500] [--kuru]
+# -------------------------------------------------------------------------
+@kiralama_bp.cli.command('ice-aktar')
+@click.argument('dosya', type=click.Path(exists=True, dir_okay=False))
+@click.option('--parca', default=PARCA_BOYUTU, show_default=True, help='Transaction başına kiralama sayısı.')
+@click.option('--kuru', is_flag=True, help='Yalnızca doğrula, veritabanına yazma.')
+def ice_aktar(dosya, parca, kuru):
+    """CSV/JSON dosyasındaki kiralamaları toplu olarak aktarır."""
+    with open(dosya, 'rb') as f:
+        satirlar = satirlari_oku(f.read(), dosya)
+    rapor = kiralamalari_ice_aktar(satirlar, parca_boyutu=parca, kuru_calistir=kuru)
+
+    for hata in rapor['hatalar']:
+        click.echo(f"  satır {hata['satir']}: {hata['hata']}", err=True)
+    click.echo(
+        f"{rapor['toplam_satir']} satır okundu, {rapor['aktarilan_kiralama']} kiralama / "
+        f"{rapor['aktarilan_kalem']} kalem {'doğrulandı' if kuru else 'aktarıldı'}, "
+        f"{rapor['hatali_satir']} satır hatalı. Süre: {rapor['sure_sn']} sn "
+        f"({rapor['satir_per_sn']} satır/sn)"
+    )
+
+
+# -------------------------------------------------------------------------
+# flask kiralama donem-faturala [--donem YYYY-AA] [--parca 1000] [--kuru]
+# Zamanlama: deploy/crontab (ayın ilk üç günü; kesilmiş faturalar atlanır).
+# -------------------------------------------------------------------------
+@kiralama_bp.cli.command('donem-faturala')
+@click.option('--donem', default=None, help='Faturalanacak ay (YYYY-AA). Varsayılan: önceki ay.')
+@click.option('--parca', default=DONEM_PARCA_BOYUTU, show_default=True, help='INSERT/commit başına kayıt sayısı.')
+@click.option('--kuru', is_flag=True, help='Yalnızca hesapla, veritabanına yazma.')
+def donem_faturala(donem, parca, kuru):
+    """Sözleşme bitişini geçmiş açık kalemlerin aylık dönem faturalarını keser."""
+    ay = datetime.strptime(donem, '%Y-%m').date() if donem else None
+    try:
+        rapor = donem_faturalarini_kes(ay, kuru=kuru, parca_boyutu=parca)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{rapor['donem'].strftime('%m.%Y')}: {rapor['taranan_kalem']} açık kalem tarandı, "
+        f"{rapor['giden']} müşteri ({rapor['giden_tutar']}) / {rapor['gelen']} tedarikçi ({rapor['gelen_tutar']}) "
+        f"kaydı {'hesaplandı' if kuru else 'yazıldı'}, {rapor['atlanan']} kayıt zaten faturalanmış. "
+        f"Süre: {rapor['sure_sn']} sn"
+    )
+
+
+# -------------------------------------------------------------------------
+# flask kiralama cari-mutabakat [--uygula] [--parca 2000] [--rapor fark.csv] [--goster 20]
+# Zamanlama: deploy/crontab (haftada bir, uygulamasız; fark raporu izlenir).
+# -------------------------------------------------------------------------
+_MUTABAKAT_ALANLARI = ('kiralama_id', 'form_no', 'kaynak', 'yon', 'firma_id', 'kalem_id', 'mevcut', 'beklenen', 'islem')
+
+
+@kiralama_bp.cli.command('cari-mutabakat')
+@click.option('--uygula', '--apply', 'uygula', is_flag=True, help='Farkları düzelt (varsayılan: yalnızca rapor).')
+@click.option('--parca', default=MUTABAKAT_PARCA_BOYUTU, show_default=True, help='Okuma/commit başına kiralama sayısı.')
+@click.option('--rapor', default=None, type=click.Path(dir_okay=False), help='Tüm farkların yazılacağı CSV dosyası.')
+@click.option('--goster', default=20, show_default=True, help='Ekrana yazılacak fark sayısı.')
+def cari_mutabakat_komutu(uygula, parca, rapor, goster):
+    """Kiralamaların cari kayıtlarını beklenen tutarlarla karşılaştırır (ve --uygula ile düzeltir)."""
+    sonuc = cari_mutabakat(uygula=uygula, parca_boyutu=parca)
+    for f in sonuc['farklar'][:goster]:
+        click.echo(
+            f"  {f['islem']:9} {f['form_no'] or f['kiralama_id']} {f['kaynak']}/{f['yon']} firma={f['firma_id']}"
+            f"{f' kalem=' + str(f['kalem_id']) if f['kalem_id'] else ''}: {f['mevcut']} -> {f['beklenen']}"
+        )
+    if len(sonuc['farklar']) > goster:
+        click.echo(f"  ... {len(sonuc['farklar']) - goster} fark daha")
+    if rapor:
+        with open(rapor, 'w', newline='', encoding='utf-8') as dosya:
+            yazici = csv.DictWriter(dosya, fieldnames=_MUTABAKAT_ALANLARI, extrasaction='ignore')
+            yazici.writeheader()
+            yazici.writerows(sonuc['farklar'])
+    islemler = sonuc['islemler']
+    click.echo(
+        f"{sonuc['taranan_kiralama']} kiralama / {sonuc['taranan_kayit']} cari kayıt tarandı, "
+        f"{len(sonuc['farklar'])} fark ({islemler['guncelle']} güncelleme, {islemler['ekle']} eksik, "
+        f"{islemler['sil']} fazla; toplam {sonuc['fark_tutari']}) {'düzeltildi' if uygula else 'bulundu'}. "
+        f"Süre: {sonuc['sure_sn']} sn"
+    )
+
+
+# -------------------------------------------------------------------------
+# flask kiralama fiyat-olcum [--adet 100000]
+# -------------------------------------------------------------------------
+@kiralama_bp.cli.command('fiyat-olcum')
+@click.option('--adet', default=100000, show_default=True, help='Fiyatlanacak sentetik kalem sayısı.')
+def fiyat_olcum(adet):
+    """Fiyatlama motorunun mikro ölçümü: tekil ve toplu API, günlük ve kademeli tarife."""
+    rastgele = random.Random(42)
+    ilk = date(2025, 1, 1)
+    fiyatlar = [Decimal(f) for f in ('450.00', '750.00', '1200.00', '1850.50', '2400.00')]
+    kademeli = [tarife(f, haftalik=f * 6, aylik=f * 22) for f in fiyatlar]
+
+    def satirlar(tarifeler):
+        sonuc = []
+        for _ in range(adet):
+            bas = ilk + timedelta(days=rastgele.randrange(365))
+            sonuc.append((bas, bas + timedelta(days=rastgele.randrange(120)),
+                          rastgele.choice(tarifeler), Decimal(rastgele.choice((0, 1500, 3000)))))
+        return sonuc
+
+    for ad, tarifeler in (('günlük', fiyatlar), ('kademeli', kademeli)):
+        veri = satirlar(tarifeler)
+        t0 = time.perf_counter()
+        tekil = [kalem_bedeli(*s) for s in veri]
+        t1 = time.perf_counter()
+        toplu = toplu_fiyatla(veri)
+        t2 = time.perf_counter()
+        if tekil != toplu:
+            raise click.ClickException(f"{ad}: tekil ve toplu sonuçlar farklı.")
+        toplam = sum(f.toplam for f in toplu)
+        click.echo(
+            f"{ad:9} {adet} kalem | tekil: {t1 - t0:.3f} sn ({adet / (t1 - t0):,.0f}/sn) | "
+            f"toplu: {t2 - t1:.3f} sn ({adet / (t2 - t1):,.0f}/sn) | toplam: {toplam:,.2f}"
+        )
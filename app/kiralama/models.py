@@ -32,13 +32,9 @@ class KiralamaKalemi(db.Model):
     
     # --- DIŞ TEDARİK (HARİCİ) EKİPMAN BİLGİLERİ ---
     is_dis_tedarik_ekipman = db.Column(db.Boolean, default=False)
-    harici_ekipman_tipi = db.Column(db.String(100))
-    harici_ekipman_marka = db.Column(db.String(100))
-    harici_ekipman_model = db.Column(db.String(100))
-    harici_ekipman_seri_no = db.Column(db.String(100))
-    harici_ekipman_kapasite = db.Column(db.Integer) 
-    harici_ekipman_yukseklik = db.Column(db.Integer)
-    harici_ekipman_uretim_yili = db.Column(db.Integer)
+    # Makine bilgileri tedarikçi makine kataloğundadır (ekipman.firma_tedarikci_id dolu satırlar,
+    # bkz. app.filo.harici); tedarikçi cari/risk hesapları için kalemde de tutulur.
+    harici_ekipman_id = db.Column(db.Integer, db.ForeignKey('ekipman.id'), nullable=True, index=True)
     harici_ekipman_tedarikci_id = db.Column(db.Integer, db.ForeignKey('firma.id'), nullable=True)
     
     # --- TARİHLER ---
@@ -67,9 +63,141 @@ class KiralamaKalemi(db.Model):
     
     # Nakliye aracı ilişkisi (Backref ekleyerek karışıklığı önledik)
     nakliye_araci = db.relationship('Ekipman', foreign_keys=[nakliye_araci_id], backref='yapilan_nakliyeler')
+
+    # Dış tedarik makinesi (katalog satırı)
+    harici_ekipman = db.relationship('Ekipman', foreign_keys=[harici_ekipman_id])
     
     harici_tedarikci = db.relationship('Firma', foreign_keys=[harici_ekipman_tedarikci_id])
     nakliye_tedarikci = db.relationship('Firma', foreign_keys=[nakliye_tedarikci_id])
 
+    __table_args__ = (
+        # Müsaitlik / çakışma sorguları (app.filo.musaitlik) için aralık indeksi:
+        # makine başına tarih aralıkları indeksten okunur, tabloya dönülmez.
+        db.Index('ix_kiralama_kalemi_musaitlik', 'ekipman_id', 'kiralama_baslangici', 'kiralama_bitis', 'sonlandirildi'),
+        # Yaklaşan/geciken sorguları (app.kiralama.vade) için kısmi indeks: yalnızca açık kalemler
+        db.Index('ix_kiralama_kalemi_aktif_bitis', 'kiralama_bitis',
+                 sqlite_where=db.text('sonlandirildi = 0'), postgresql_where=db.text('NOT sonlandirildi')),
+        # Sevkiyat panosu / araç çakışmaları (app.nakliyeler.sevkiyat): teslim ve iade günleri,
+        # yalnızca öz mal nakliye aracı atanmış kalemler
+        db.Index('ix_kiralama_kalemi_sevk_teslim', 'kiralama_baslangici', 'nakliye_araci_id',
+                 sqlite_where=db.text('nakliye_araci_id IS NOT NULL'),
+                 postgresql_where=db.text('nakliye_araci_id IS NOT NULL')),
+        db.Index('ix_kiralama_kalemi_sevk_iade', 'kiralama_bitis', 'nakliye_araci_id',
+                 sqlite_where=db.text('nakliye_araci_id IS NOT NULL'),
+                 postgresql_where=db.text('nakliye_araci_id IS NOT NULL')),
+    )
+
+    def __repr__(self):
+        return f'<KiralamaKalemi {self.id}>'
+
+
+class KiralamaOzet(db.Model):
+    """
+    Kiralama listesi için önceden hesaplanmış özet (kiralama başına tek satır).
+    Kalem ekleme/güncelleme/silme sırasında app.kiralama.ozet tarafından güncellenir;
+    liste sayfası kalemler koleksiyonunu yüklemeden bu tablodan çizilir.
+    """
+    __tablename__ = 'kiralama_ozet'
+    
+    kiralama_id = db.Column(db.Integer, db.ForeignKey('kiralama.id', ondelete='CASCADE'), primary_key=True)
+    kiralama_form_no = db.Column(db.String(100), nullable=True)
+    firma_musteri_id = db.Column(db.Integer, nullable=True)
+    musteri_adi = db.Column(db.String(150), nullable=True)
+    
+    # --- SAYAÇLAR ---
+    kalem_sayisi = db.Column(db.Integer, nullable=False, default=0)
+    aktif_kalem_sayisi = db.Column(db.Integer, nullable=False, default=0)
+    harici_kalem_sayisi = db.Column(db.Integer, nullable=False, default=0)
+    
+    harici_nakliye_sayisi = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Sonlandırılmamış kalemler arasındaki en yakın bitiş tarihi
+    en_yakin_bitis = db.Column(db.Date, nullable=True, index=True)
+    # Kiralamanın kapsadığı dönem (liste tarih filtresi): ilk başlangıç - son bitiş
+    ilk_baslangic = db.Column(db.Date, nullable=True)
+    son_bitis = db.Column(db.Date, nullable=True)
+    
+    # --- TUTARLAR (Gün x Birim Fiyat + Nakliye) ---
+    brut_tutar = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    aktif_tutar = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    
+    # Satırdaki makine listesi ve kalem bazlı sağ tık menüsü için hafif kalem özeti
+    kalemler = db.Column(db.JSON, nullable=False, default=list)
+
+    __table_args__ = (
+        # Liste filtreleri (app.kiralama.filtre); sıralama/sayfalama kiralama_id DESC.
+        # Müşteri indeksi faset sayım sorgusunu kapsar (geniş 'kalemler' satırları okunmaz).
+        db.Index('ix_kiralama_ozet_musteri', 'firma_musteri_id', 'aktif_kalem_sayisi', 'kalem_sayisi',
+                 'harici_kalem_sayisi', 'harici_nakliye_sayisi', 'ilk_baslangic', 'son_bitis', 'musteri_adi'),
+        db.Index('ix_kiralama_ozet_donem', 'ilk_baslangic', 'son_bitis'),
+        db.Index('ix_kiralama_ozet_durum', 'aktif_kalem_sayisi', 'kiralama_id'),
+        db.Index('ix_kiralama_ozet_tedarik', 'harici_kalem_sayisi', 'harici_nakliye_sayisi', 'kiralama_id'),
+    )
+
+    def __repr__(self):
+        return f'<KiralamaOzet {self.kiralama_form_no}>'
+
+
+class GelirTahakkuk(db.Model):
+    """
+    Kiralama gelirinin takvim aylarına dağılımı (kalem x ay başına tek satır).
+    app.kiralama.tahakkuk tarafından değişen kiralamalar için yeniden yazılır;
+    aylık gelir raporu bu tablodan toplanır.
+    """
+    __tablename__ = 'gelir_tahakkuk'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kalem_id = db.Column(db.Integer, db.ForeignKey('kiralama_kalemi.id', ondelete='CASCADE'), nullable=False)
+    kiralama_id = db.Column(db.Integer, db.ForeignKey('kiralama.id', ondelete='CASCADE'), nullable=False)
+    firma_musteri_id = db.Column(db.Integer, nullable=True)
+
+    # Ayın ilk günü ve o aya düşen kiralama günü
+    donem = db.Column(db.Date, nullable=False)
+    gun = db.Column(db.Integer, nullable=False, default=0)
+
+    # --- TUTARLAR ---
+    kira_tutari = db.Column(db.Numeric(15, 2), nullable=False, default=0)     # sözleşme bedelinin bu aya düşen payı
+    donem_tutari = db.Column(db.Numeric(15, 2), nullable=False, default=0)    # dönem faturaları (app.kiralama.donem)
+    nakliye_tutari = db.Column(db.Numeric(15, 2), nullable=False, default=0)  # başlangıç ayına yazılır
+
+    __table_args__ = (
+        db.Index('uq_gelir_tahakkuk_kalem_donem', 'kalem_id', 'donem', unique=True),
+        db.Index('ix_gelir_tahakkuk_kiralama_id', 'kiralama_id'),
+        db.Index('ix_gelir_tahakkuk_donem', 'donem'),
+    )
+
+    def __repr__(self):
+        return f'<GelirTahakkuk {self.kalem_id} {self.donem}>'
+
+
+class KiralamaTarifesi(db.Model):
+    """
+    Makine tipi ve yükseklik/kapasite bandı başına liste fiyatı.
+    Bant değerleri bandın alt sınırıdır (app.kiralama.teklif.YUKSEKLIK_BANTLARI /
+    KAPASITE_BANTLARI); boş bant o tipin tüm makinelerine uyar. Teklif motoru
+    (app.kiralama.teklif) tabloyu bellekte tutar ve guncelleme_zamani üzerinden
+    yalnızca değişen satırları yeniden okur; bu yüzden satırlar silinmez, pasife alınır.
+    """
+    __tablename__ = 'kiralama_tarifesi'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipi = db.Column(db.String(100), nullable=False)
+    yukseklik_bandi = db.Column(db.Integer, nullable=True)
+    kapasite_bandi = db.Column(db.Integer, nullable=True)
+
+    # --- FİYATLAR (app.kiralama.fiyatlama.Tarife) ---
+    gunluk_fiyat = db.Column(db.Numeric(15, 2), nullable=False)
+    haftalik_fiyat = db.Column(db.Numeric(15, 2), nullable=True)
+    aylik_fiyat = db.Column(db.Numeric(15, 2), nullable=True)
+    min_gun = db.Column(db.Integer, nullable=False, default=1)
+
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    guncelleme_zamani = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_kiralama_tarifesi_anahtar', 'tipi', 'yukseklik_bandi', 'kapasite_bandi'),
+        db.Index('ix_kiralama_tarifesi_guncelleme', 'guncelleme_zamani'),
+    )
+
     def __repr__(self):
-        return f'<KiralamaKalemi {self.id}>'
\ No newline at end of file
+        return f'<KiralamaTarifesi {self.tipi} {self.yukseklik_bandi}/{self.kapasite_bandi}>'
@@ -0,0 +1,260 @@
+"""
+Kiralama cari kayıtlarının mutabakatı (beklenen HizmetKaydi tutarları).
+
+Cari kayıtlar kalemlerle birlikte değişmediğinde sessizce kayıyordu: eski
+toplam güncelleme hataları yalnızca print ile yutuyordu, kiralama
+düzenlemesi dış tedarik alış ('gelen') kayıtlarına hiç dokunmuyordu ve
+farkı fark eden bir şey yoktu. Burada tüm kiralamalar parça parça taranır
+ve her kiralamanın beklenen kayıtları fiyatlama motoruyla yeniden
+hesaplanıp mevcut kayıtlarla karşılaştırılır:
+
+    kiralama / giden  müşteri: kalemlerin toplamı (kira + nakliye satış),
+                      dönem faturalarının kapsadığı günler hariç
+    kiralama / gelen  tedarikçi başına: dış tedarik kalemlerinin alış bedeli,
+                      tedarikçi dönem faturalarının kapsadığı günler hariç
+                      (kalem başına açılan kayıtlar toplam olarak karşılaştırılır)
+    donem             kalemin güncel birim fiyatıyla faturalanan günlerin bedeli;
+                      kalemi silinmiş dönem kaydı artıktır
+
+Parça başına üç okuma yapılır (kalemler, dönem kayıtları, kiralama
+kayıtlarının kiralama/yön/firma gruplu toplamları). uygula=True ise farklar
+parça başına toplu UPDATE / INSERT / DELETE ile düzeltilir ve her parça ayrı
+commit edilir; firma riski ve gelir tahakkuku aynı transaction'da yenilenir.
+Kiralaması silinmiş cari kayıtlar (artık kayıtlar) ayrıca tek sorguyla bulunur.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.cari.models import HizmetKaydi
+from app.cari.risk import firma_risklerini_guncelle
+from app.kiralama.donem import kapsanan_gun
+from app.kiralama.fiyatlama import KURUS, kalem_bedeli, kira_bedeli, toplu_fiyatla
+from app.kiralama.tahakkuk import gelir_tahakkuklarini_guncelle
+
+PARCA_BOYUTU = 2000
+SIFIR = Decimal('0.00')
+ISLEMLER = ('guncelle', 'ekle', 'sil')
+
+
+def _tutar(deger):
+    return Decimal(str(deger or 0)).quantize(KURUS)
+
+
+def _fark(kiralama, kaynak, yon, firma_id, mevcut, beklenen, islem, kayit_id=None, kalem_id=None, silinecek=()):
+    return {
+        'kiralama_id': kiralama.id if kiralama else None,
+        'form_no': kiralama.kiralama_form_no if kiralama else None,
+        'kaynak': kaynak, 'yon': yon, 'firma_id': firma_id, 'kalem_id': kalem_id,
+        'mevcut': mevcut, 'beklenen': beklenen, 'islem': islem,
+        'kayit_id': kayit_id, 'silinecek': list(silinecek),
+    }
+
+
+def _parca_farklari(parca):
+    """Bir kiralama parçasının farkları ve taranan kayıt sayısı."""
+    kiralamalar = {k.id: k for k in db.session.execute(
+        select(Kiralama.id, Kiralama.firma_musteri_id, Kiralama.kiralama_form_no).where(Kiralama.id.in_(parca))
+    )}
+    kalemler = db.session.execute(
+        select(KiralamaKalemi.id, KiralamaKalemi.kiralama_id, KiralamaKalemi.kiralama_baslangici,
+               KiralamaKalemi.kiralama_bitis, KiralamaKalemi.kiralama_brm_fiyat, KiralamaKalemi.kiralama_alis_fiyat,
+               KiralamaKalemi.nakliye_satis_fiyat, KiralamaKalemi.is_dis_tedarik_ekipman,
+               KiralamaKalemi.harici_ekipman_tedarikci_id)
+        .where(KiralamaKalemi.kiralama_id.in_(parca))
+        .order_by(KiralamaKalemi.id)
+    ).all()
+    donemler = db.session.execute(
+        select(HizmetKaydi.id, HizmetKaydi.kiralama_id, HizmetKaydi.kalem_id, HizmetKaydi.yon, HizmetKaydi.firma_id,
+               HizmetKaydi.tutar, HizmetKaydi.donem_baslangic, HizmetKaydi.donem_bitis)
+        .where(HizmetKaydi.kiralama_id.in_(parca), HizmetKaydi.kaynak_tipi == 'donem')
+    ).all()
+    gruplar = db.session.execute(
+        select(HizmetKaydi.kiralama_id, HizmetKaydi.yon, HizmetKaydi.firma_id,
+               func.count().label('adet'), func.sum(HizmetKaydi.tutar).label('tutar'),
+               func.min(HizmetKaydi.id).label('ilk_id'))
+        .where(HizmetKaydi.kiralama_id.in_(parca), HizmetKaydi.kaynak_tipi == 'kiralama')
+        .group_by(HizmetKaydi.kiralama_id, HizmetKaydi.yon, HizmetKaydi.firma_id)
+    ).all()
+
+    # Dönem faturalarının kapsadığı günler: (kalem, yön) -> [(başlangıç, bitiş)]
+    kapsamlar = {}
+    for d in donemler:
+        kapsamlar.setdefault((d.kalem_id, d.yon), []).append((d.donem_baslangic, d.donem_bitis))
+
+    # --- Beklenen kiralama kayıtları: (kiralama, yön, firma) -> tutar ---
+    beklenen = {}
+    fiyatlar = toplu_fiyatla(
+        [(k.kiralama_baslangici, k.kiralama_bitis, k.kiralama_brm_fiyat, k.nakliye_satis_fiyat) for k in kalemler],
+        haric_gunler=[kapsanan_gun(k.kiralama_baslangici, k.kiralama_bitis, kapsamlar.get((k.id, 'giden')))
+                      for k in kalemler],
+    )
+    for k, fiyat in zip(kalemler, fiyatlar):
+        anahtar = (k.kiralama_id, 'giden', kiralamalar[k.kiralama_id].firma_musteri_id)
+        beklenen[anahtar] = beklenen.get(anahtar, SIFIR) + fiyat.toplam
+        if k.is_dis_tedarik_ekipman and k.harici_ekipman_tedarikci_id and _tutar(k.kiralama_alis_fiyat) > 0:
+            alis = kalem_bedeli(k.kiralama_baslangici, k.kiralama_bitis, k.kiralama_alis_fiyat,
+                                haric_gun=kapsanan_gun(k.kiralama_baslangici, k.kiralama_bitis,
+                                                       kapsamlar.get((k.id, 'gelen')))).kira
+            anahtar = (k.kiralama_id, 'gelen', k.harici_ekipman_tedarikci_id)
+            beklenen[anahtar] = beklenen.get(anahtar, SIFIR) + alis
+    beklenen = {anahtar: tutar for anahtar, tutar in beklenen.items() if tutar > 0 and anahtar[2] is not None}
+
+    farklar = []
+    mevcut = {(g.kiralama_id, g.yon, g.firma_id): g for g in gruplar}
+    fazla_gruplar = [g for g in gruplar if g.adet > 1]
+    fazla_idler = {}
+    if fazla_gruplar:
+        # Birden çok kaydı olan grupların id'leri: düzeltmede ilk kayıt tutulur, diğerleri silinir
+        for kayit_id, kiralama_id, yon, firma_id in db.session.execute(
+            select(HizmetKaydi.id, HizmetKaydi.kiralama_id, HizmetKaydi.yon, HizmetKaydi.firma_id)
+            .where(HizmetKaydi.kiralama_id.in_({g.kiralama_id for g in fazla_gruplar}),
+                   HizmetKaydi.kaynak_tipi == 'kiralama')
+        ):
+            fazla_idler.setdefault((kiralama_id, yon, firma_id), []).append(kayit_id)
+
+    # Müşterisi değişmiş kiralamanın giden kaydı silinip yeniden açılmaz, yeni müşteriye taşınır
+    tasinacak = {}
+    for anahtar in beklenen.keys() - mevcut.keys():
+        kiralama_id, yon, _ = anahtar
+        eski = [a for a in mevcut.keys() - beklenen.keys() if a[0] == kiralama_id and a[1] == yon]
+        if yon == 'giden' and len(eski) == 1:
+            tasinacak[eski[0]] = anahtar
+
+    for anahtar in sorted(beklenen.keys() | mevcut.keys(), key=lambda a: (a[0], a[1], a[2] or 0)):
+        kiralama_id, yon, firma_id = anahtar
+        kiralama = kiralamalar[kiralama_id]
+        g = mevcut.get(anahtar)
+        if anahtar in tasinacak.values():
+            continue
+        hedef = tasinacak.get(anahtar)
+        tutar = beklenen.get(hedef or anahtar)
+        # Giden kaydı kiralama başına tektir; gelen kayıtları kalem başına açılır ve
+        # yalnızca toplamları tutmuyorsa ilk kayıtta birleştirilir
+        fazla = g is not None and g.adet > 1 and (yon == 'giden' or _tutar(g.tutar) != tutar)
+        silinecek = sorted(fazla_idler[anahtar])[1:] if fazla else ()
+        if g is None:
+            farklar.append(_fark(kiralama, 'kiralama', yon, firma_id, None, tutar, 'ekle'))
+        elif tutar is None:
+            farklar.append(_fark(kiralama, 'kiralama', yon, firma_id, _tutar(g.tutar), None, 'sil',
+                                 silinecek=sorted(fazla_idler.get(anahtar, [g.ilk_id]))))
+        else:
+            mevcut_tutar = _tutar(g.tutar)
+            if hedef or silinecek or mevcut_tutar != tutar:
+                farklar.append(_fark(kiralama, 'kiralama', yon, hedef[2] if hedef else firma_id,
+                                     mevcut_tutar, tutar, 'guncelle', kayit_id=g.ilk_id, silinecek=silinecek))
+
+    # --- Dönem kayıtları ---
+    kalem_sozluk = {k.id: k for k in kalemler}
+    for d in donemler:
+        kiralama, k = kiralamalar.get(d.kiralama_id), kalem_sozluk.get(d.kalem_id)
+        mevcut_tutar = _tutar(d.tutar)
+        if k is None or (d.yon == 'gelen' and not (k.is_dis_tedarik_ekipman and k.harici_ekipman_tedarikci_id)):
+            farklar.append(_fark(kiralama, 'donem', d.yon, d.firma_id, mevcut_tutar, None, 'sil',
+                                 kalem_id=d.kalem_id, silinecek=[d.id]))
+            continue
+        gun = (d.donem_bitis - d.donem_baslangic).days + 1
+        if d.yon == 'giden':
+            firma_id, tutar = kiralama.firma_musteri_id, kira_bedeli(gun, k.kiralama_brm_fiyat)
+        else:
+            firma_id, tutar = k.harici_ekipman_tedarikci_id, kira_bedeli(gun, k.kiralama_alis_fiyat)
+        if tutar != mevcut_tutar or firma_id != d.firma_id:
+            farklar.append(_fark(kiralama, 'donem', d.yon, firma_id, mevcut_tutar, tutar, 'guncelle',
+                                 kayit_id=d.id, kalem_id=d.kalem_id))
+
+    return farklar, sum(g.adet for g in gruplar) + len(donemler)
+
+
+def _farklari_uygula(farklar):
+    """Farkları toplu UPDATE / INSERT / DELETE ile yazar; etkilenen firma ve kiralamaları döndürür."""
+    guncellenecek, eklenecek, silinecek = [], [], []
+    firmalar, kiralamalar = set(), set()
+    for f in farklar:
+        firmalar.add(f['firma_id'])
+        kiralamalar.add(f['kiralama_id'])
+        silinecek += f['silinecek']
+        if f['islem'] == 'guncelle':
+            guncellenecek.append({'id': f['kayit_id'], 'tutar': f['beklenen'], 'firma_id': f['firma_id']})
+        elif f['islem'] == 'ekle':
+            eklenecek.append({
+                'firma_id': f['firma_id'], 'tarih': date.today(), 'tutar': f['beklenen'], 'yon': f['yon'],
+                'fatura_no': f['form_no'], 'kaynak_tipi': 'kiralama', 'kiralama_id': f['kiralama_id'],
+                'aciklama': f"Cari Mutabakat - {f['form_no']}",
+            })
+    if guncellenecek:
+        # Eski firma da etkilenir (müşteri değişikliği)
+        firmalar.update(db.session.execute(
+            select(HizmetKaydi.firma_id).where(HizmetKaydi.id.in_([g['id'] for g in guncellenecek]))
+        ).scalars())
+        db.session.execute(update(HizmetKaydi), guncellenecek)
+    if eklenecek:
+        db.session.execute(insert(HizmetKaydi), eklenecek)
+    if silinecek:
+        db.session.execute(delete(HizmetKaydi).where(HizmetKaydi.id.in_(silinecek)),
+                           execution_options={'synchronize_session': False})
+    return firmalar, kiralamalar
+
+
+def _uygula_ve_tazele(farklar):
+    # Toplu yazımlar flush dinleyicilerini tetiklemez; firma riski ve tahakkuk aynı transaction'da yenilenir
+    firmalar, kiralamalar = _farklari_uygula(farklar)
+    conn = db.session.connection()
+    firma_risklerini_guncelle(conn, firmalar)
+    donem_kiralamalari = {f['kiralama_id'] for f in farklar if f['kaynak'] == 'donem'}
+    if donem_kiralamalari:
+        gelir_tahakkuklarini_guncelle(conn, donem_kiralamalari)
+
+
+def artik_kayitlar():
+    """Kiralaması silinmiş kiralama/dönem cari kayıtları: [(id, kiralama_id, firma_id, yon, tutar)]."""
+    return db.session.execute(
+        select(HizmetKaydi.id, HizmetKaydi.kiralama_id, HizmetKaydi.firma_id, HizmetKaydi.yon, HizmetKaydi.tutar)
+        .outerjoin(Kiralama, Kiralama.id == HizmetKaydi.kiralama_id)
+        .where(HizmetKaydi.kiralama_id.isnot(None), Kiralama.id.is_(None))
+    ).all()
+
+
+def cari_mutabakat(uygula=False, parca_boyutu=PARCA_BOYUTU):
+    """
+    Tüm kiralamaların cari kayıtlarını beklenen tutarlarla karşılaştırır.
+    uygula=True ise farklar düzeltilir (parça başına commit). Rapor sözlüğü döndürür.
+    """
+    baslangic_zamani = time.perf_counter()
+    farklar, taranan_kiralama, taranan_kayit, son_id = [], 0, 0, 0
+    while True:
+        parca = db.session.execute(
+            select(Kiralama.id).where(Kiralama.id > son_id).order_by(Kiralama.id).limit(parca_boyutu)
+        ).scalars().all()
+        if not parca:
+            break
+        son_id = parca[-1]
+        parca_farklari, kayit = _parca_farklari(parca)
+        taranan_kiralama += len(parca)
+        taranan_kayit += kayit
+        farklar += parca_farklari
+        if uygula and parca_farklari:
+            _uygula_ve_tazele(parca_farklari)
+            db.session.commit()
+
+    artiklar = [dict(_fark(None, 'artik', a.yon, a.firma_id, _tutar(a.tutar), None, 'sil', silinecek=[a.id]),
+                     kiralama_id=a.kiralama_id) for a in artik_kayitlar()]
+    farklar += artiklar
+    if uygula and artiklar:
+        _uygula_ve_tazele(artiklar)
+        db.session.commit()
+
+    sure = time.perf_counter() - baslangic_zamani
+    return {
+        'taranan_kiralama': taranan_kiralama,
+        'taranan_kayit': taranan_kayit,
+        'farklar': farklar,
+        'islemler': {islem: sum(1 for f in farklar if f['islem'] == islem) for islem in ISLEMLER},
+        'fark_tutari': sum((abs((f['beklenen'] or SIFIR) - (f['mevcut'] or SIFIR)) for f in farklar), SIFIR),
+        'uygulandi': uygula,
+        'sure_sn': round(sure, 2),
+    }
+
@@ -0,0 +1,170 @@
+"""
+Kiralama listesi özet tablosu ('kiralama_ozet').
+
+Liste sayfası her kiralamanın kalemler koleksiyonunu, ekipmanını ve harici
+tedarikçisini joinedload ile yükleyip gün/tutar/durum hesaplarını şablonda
+yapıyordu. Bu hesaplar artık kalem ekleme/güncelleme/silme anında, yalnızca
+etkilenen kiralamalar için yapılır ve tek satırlık özetlere yazılır.
+
+Özetler flush sırasında güncellenir (app.olaylar); toplu Core yazımlarından
+sonra kiralama_ozetlerini_guncelle() çağrılmalı. Tutarsızlık şüphesinde
+'flask kiralama ozet-yeniden-olustur' çalıştırılır.
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import event, select, delete
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi, KiralamaOzet
+from app.firmalar.models import Firma
+from app.filo.models import Ekipman
+from app.kiralama.fiyatlama import kalem_bedeli
+from app.olaylar import kiralama_degisiklikleri, makine_kiralamalari
+
+# Tek sorguda yeniden hesaplanacak en fazla kiralama sayısı (IN listesi sınırı)
+PARCA_BOYUTU = 500
+
+
+def kalem_tutari(baslangic, bitis, brm_fiyat, nakliye_satis):
+    """Liste ekranındaki sözleşme bedeli: (gün x birim fiyat) + nakliye satış."""
+    return kalem_bedeli(baslangic, bitis, brm_fiyat, nakliye_satis).toplam
+
+
+def _ozet_satirlari(conn, kiralama_idler):
+    """Verilen kiralamaların özet satırlarını (dict) hesaplar."""
+    tedarikci, harici = aliased(Firma), aliased(Ekipman)
+    kiralamalar = conn.execute(
+        select(Kiralama.id, Kiralama.kiralama_form_no, Kiralama.firma_musteri_id, Firma.firma_adi)
+        .outerjoin(Firma, Firma.id == Kiralama.firma_musteri_id)
+        .where(Kiralama.id.in_(kiralama_idler))
+    ).all()
+
+    ozetler = {}
+    for k in kiralamalar:
+        ozetler[k.id] = {
+            'kiralama_id': k.id,
+            'kiralama_form_no': k.kiralama_form_no,
+            'firma_musteri_id': k.firma_musteri_id,
+            'musteri_adi': k.firma_adi,
+            'kalem_sayisi': 0,
+            'aktif_kalem_sayisi': 0,
+            'harici_kalem_sayisi': 0,
+            'harici_nakliye_sayisi': 0,
+            'en_yakin_bitis': None,
+            'ilk_baslangic': None,
+            'son_bitis': None,
+            'brut_tutar': Decimal('0'),
+            'aktif_tutar': Decimal('0'),
+            'kalemler': [],
+        }
+
+    kalemler = conn.execute(
+        select(
+            KiralamaKalemi.id, KiralamaKalemi.kiralama_id, KiralamaKalemi.is_dis_tedarik_ekipman,
+            harici.marka.label('harici_marka'), harici.model.label('harici_model'),
+            KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis,
+            KiralamaKalemi.kiralama_brm_fiyat, KiralamaKalemi.nakliye_satis_fiyat,
+            KiralamaKalemi.sonlandirildi, KiralamaKalemi.is_harici_nakliye,
+            Ekipman.kod, Ekipman.tipi, tedarikci.firma_adi.label('tedarikci_adi')
+        )
+        .outerjoin(Ekipman, Ekipman.id == KiralamaKalemi.ekipman_id)
+        .outerjoin(tedarikci, tedarikci.id == KiralamaKalemi.harici_ekipman_tedarikci_id)
+        .outerjoin(harici, harici.id == KiralamaKalemi.harici_ekipman_id)
+        .where(KiralamaKalemi.kiralama_id.in_(kiralama_idler))
+        .order_by(KiralamaKalemi.id)
+    ).all()
+
+    for kalem in kalemler:
+        ozet = ozetler.get(kalem.kiralama_id)
+        if ozet is None:
+            continue
+        tutar = kalem_tutari(kalem.kiralama_baslangici, kalem.kiralama_bitis,
+                             kalem.kiralama_brm_fiyat, kalem.nakliye_satis_fiyat)
+        ozet['kalem_sayisi'] += 1
+        ozet['brut_tutar'] += tutar
+        if kalem.is_dis_tedarik_ekipman:
+            ozet['harici_kalem_sayisi'] += 1
+        if kalem.is_harici_nakliye:
+            ozet['harici_nakliye_sayisi'] += 1
+        if ozet['ilk_baslangic'] is None or kalem.kiralama_baslangici < ozet['ilk_baslangic']:
+            ozet['ilk_baslangic'] = kalem.kiralama_baslangici
+        if ozet['son_bitis'] is None or kalem.kiralama_bitis > ozet['son_bitis']:
+            ozet['son_bitis'] = kalem.kiralama_bitis
+        if not kalem.sonlandirildi:
+            ozet['aktif_kalem_sayisi'] += 1
+            ozet['aktif_tutar'] += tutar
+            if ozet['en_yakin_bitis'] is None or kalem.kiralama_bitis < ozet['en_yakin_bitis']:
+                ozet['en_yakin_bitis'] = kalem.kiralama_bitis
+
+        ozet['kalemler'].append({
+            'id': kalem.id,
+            'harici': bool(kalem.is_dis_tedarik_ekipman),
+            'kod': kalem.kod,
+            'tipi': kalem.tipi,
+            'marka': kalem.harici_marka,
+            'model': kalem.harici_model,
+            'tedarikci': kalem.tedarikci_adi,
+            'baslangic': kalem.kiralama_baslangici.isoformat(),
+            'bitis': kalem.kiralama_bitis.isoformat(),
+            'sonlandirildi': bool(kalem.sonlandirildi),
+        })
+
+    return list(ozetler.values())
+
+
+def kiralama_ozetlerini_guncelle(conn, kiralama_idler):
+    """Verilen kiralamaların özetlerini silip yeniden yazar (silinmiş kiralamalar düşer)."""
+    idler = sorted({int(i) for i in kiralama_idler if i is not None})
+    tablo = KiralamaOzet.__table__
+    for i in range(0, len(idler), PARCA_BOYUTU):
+        parca = idler[i:i + PARCA_BOYUTU]
+        conn.execute(delete(tablo).where(tablo.c.kiralama_id.in_(parca)))
+        satirlar = _ozet_satirlari(conn, parca)
+        if satirlar:
+            conn.execute(tablo.insert(), satirlar)
+
+
+def kiralama_ozetlerini_yeniden_olustur():
+    """Tüm özet tablosunu sıfırdan kurar ve özetlenen kiralama sayısını döndürür."""
+    with db.engine.begin() as conn:
+        conn.execute(delete(KiralamaOzet.__table__))
+        idler = conn.execute(select(Kiralama.id)).scalars().all()
+        kiralama_ozetlerini_guncelle(conn, idler)
+        return len(idler)
+
+
+def ozet_kalemleri(ozet):
+    """Özetteki kalem listesini tarih alanları date nesnesi olacak şekilde döndürür."""
+    kalemler = []
+    for kalem in ozet.kalemler or []:
+        kalem = dict(kalem)
+        kalem['baslangic'] = date.fromisoformat(kalem['baslangic'])
+        kalem['bitis'] = date.fromisoformat(kalem['bitis'])
+        kalemler.append(kalem)
+    return kalemler
+
+
+# -------------------------------------------------------------------------
+# ORM SENKRONİZASYONU (bkz. app.olaylar)
+# -------------------------------------------------------------------------
+@event.listens_for(db.session, 'after_flush')
+def _kiralama_ozetlerini_senkronize_et(session, flush_context):
+    # Özet öz mal makinede kod/tip, harici katalog makinesinde tip/marka/model gösterir
+    d = kiralama_degisiklikleri(session, ekipman_alanlari=('kod', 'tipi', 'marka', 'model'))
+    if d.bos_mu():
+        return
+
+    # Silinen kiralamanın özet satırı da silinir (kiralama_ozetlerini_guncelle)
+    kiralama_idler = d.kiralama_idler | d.silinen_idler
+    conn = session.connection()
+    if d.firma_idler:
+        kiralama_idler.update(conn.execute(
+            select(Kiralama.id).where(Kiralama.firma_musteri_id.in_(d.firma_idler))
+            .union(select(KiralamaKalemi.kiralama_id)
+                   .where(KiralamaKalemi.harici_ekipman_tedarikci_id.in_(d.firma_idler)))
+        ).scalars())
+    kiralama_idler.update(makine_kiralamalari(conn, d.ekipman_idler))
+
+    kiralama_ozetlerini_guncelle(conn, kiralama_idler)
@@ -1,82 +1,63 @@
 import json
 import traceback
-import requests 
-import xml.etree.ElementTree as ET 
 from datetime import datetime, date
 from decimal import Decimal
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, jsonify, abort, current_app
 from sqlalchemy import or_, and_
-from sqlalchemy.orm import joinedload
-
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from sqlalchemy.orm import joinedload, aliased
 
 from app import db
 from app.kiralama import kiralama_bp
 
 # Modeller
 from app.firmalar.models import Firma
-from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.kiralama.models import Kiralama, KiralamaKalemi, KiralamaOzet, KiralamaTarifesi
 from app.filo.models import Ekipman
 from app.cari.models import HizmetKaydi 
-
-from app.kiralama.forms import KiralamaForm
+from app.cari.doviz import kurlari_getir
+from app.kiralama.arama import kiralama_arama_sorgusu
+from app.kiralama.ozet import ozet_kalemleri
+from app.kiralama.aktarim import satirlari_oku, kiralamalari_ice_aktar
+from app.kiralama.guncelleme import (kiralama_duzenleme_icin_yukle, degisiklik_seti_olustur,
+                                     harici_katalog_idleri, harici_mi, tedarikcisiz_harici_var,
+                                     TEDARIKCISIZ_HARICI_MESAJI)
+from app.filo.harici import makine_bilgisi, katalog_duzeltmelerini_uygula
+from app.sayfalama import keyset_sayfala
+from app import referans
+from app.main.sayac import belge_no_al, belge_no_onizle
+from app.filo.musaitlik import cakismalari_bul, cakisma_mesaji
+from app.nakliyeler.sevkiyat import kalem_olaylari, arac_cakismalari, arac_cakisma_mesaji
+from app.cari.risk import kredi_durumu, kredi_limiti_mesaji, limit_davranisi
+from app.filo.durum import DurumCakismasi, rezerve_et_hepsi, serbest_birak
+from app.kiralama.toplu import toplu_kalem_islemi
+from app.kiralama.fiyatlama import kalem_bedeli
+from app.kiralama.teklif import teklif_hazirla, YUKSEKLIK_BANTLARI, KAPASITE_BANTLARI
+from app.kiralama.tahakkuk import aylik_gelir, musteri_gelirleri
+from app.kiralama.filtre import filtre_oku, filtre_uygula, faset_sayilari, aktif_filtre_var
+from app.kiralama.vade import vade_kiralama_idleri, vade_sayilari, vade_ozeti, VARSAYILAN_GUN
+
+from app.kiralama.forms import KiralamaForm, KiralamaTarifesiForm
 
 # -------------------------------------------------------------------------
 # YARDIMCI FONKSİYONLAR
 # -------------------------------------------------------------------------
 
-def get_tcmb_kurlari():
-    """TCMB'den günlük USD ve EUR kurlarını çeker."""
-    rates = {'USD': Decimal('0.00'), 'EUR': Decimal('0.00')}
-    try:
-        url = "https://www.tcmb.gov.tr/kurlar/today.xml"
-        response = requests.get(url, verify=False, timeout=2)
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            usd = root.find("./Currency[@CurrencyCode='USD']/ForexSelling")
-            eur = root.find("./Currency[@CurrencyCode='EUR']/ForexSelling")
-            if usd is not None: rates['USD'] = Decimal(usd.text)
-            if eur is not None: rates['EUR'] = Decimal(eur.text)
-    except: pass
-    return rates
-
-def guncelle_cari_toplam(kiralama_id):
-    """Kiralama güncellendiğinde veya sonlandırıldığında cariyi senkronize eder."""
-    try:
-        kiralama = Kiralama.query.get(kiralama_id)
-        if not kiralama: return
-        
-        cari_kayit = HizmetKaydi.query.filter_by(fatura_no=kiralama.kiralama_form_no, yon='giden').first()
-        
-        toplam_gelir = Decimal('0.00')
-        for kalem in kiralama.kalemler:
-            if not (kalem.kiralama_baslangici and kalem.kiralama_bitis): continue
-            gun = max((kalem.kiralama_bitis - kalem.kiralama_baslangici).days + 1, 1)
-            toplam_gelir += (kalem.kiralama_brm_fiyat * gun) + (kalem.nakliye_satis_fiyat or 0)
-
-        if cari_kayit:
-            cari_kayit.tutar = toplam_gelir
-            db.session.commit()
-    except Exception as e:
-        print(f"Cari hatası: {e}")
-
 def populate_kiralama_form_choices(form, kiralama_objesi=None, include_ids=None):
-    """Tüm SelectField seçeneklerini form nesnesine enjekte eder."""
-    if include_ids is None: include_ids = []
-    
-    musteriler = Firma.query.filter_by(is_musteri=True, is_active=True).order_by(Firma.firma_adi).all()
-    form.firma_musteri_id.choices = [(0, '--- Müşteri Seçiniz ---')] + [(f.id, f.firma_adi) for f in musteriler]
+    """Tüm SelectField seçeneklerini form nesnesine enjekte eder (referans önbelleğinden, sorgusuz)."""
+    include_ids = set(include_ids or [])
     
-    tedarikciler = Firma.query.filter_by(is_tedarikci=True, is_active=True).order_by(Firma.firma_adi).all()
-    ted_choices = [(0, '--- Tedarikçi Seçiniz ---')] + [(f.id, f.firma_adi) for f in tedarikciler]
+    form.firma_musteri_id.choices = [(0, '--- Müşteri Seçiniz ---')] + list(referans.firmalar('musteri'))
     
-    filo_query = Ekipman.query.filter(
-        Ekipman.firma_tedarikci_id.is_(None),
-        or_(Ekipman.calisma_durumu == 'bosta', Ekipman.id.in_(include_ids))
-    ).order_by(Ekipman.kod).all()
+    ted_choices = [(0, '--- Tedarikçi Seçiniz ---')] + list(referans.firmalar('tedarikci'))
     
-    pimaks_choices = [(0, '--- Seçiniz ---')] + [(e.id, f"{e.kod} ({e.tipi})") for e in filo_query]
+    pimaks_choices = [(0, '--- Seçiniz ---')] + [
+        (e_id, f"{kod} ({tipi})") for e_id, kod, tipi, durum in referans.filo_makineleri()
+        if durum == 'bosta' or e_id in include_ids
+    ]
+
+    # Doğrulama için kümeler bir kez kurulur; satır başına liste taranmaz
+    pimaks_idleri = frozenset(e_id for e_id, _ in pimaks_choices)
+    ted_idleri = frozenset(f_id for f_id, _ in ted_choices)
 
     for subform in form.kalemler:
         f = subform.form
@@ -84,6 +65,18 @@ def populate_kiralama_form_choices(form, kiralama_objesi=None, include_ids=None)
         f.harici_ekipman_tedarikci_id.choices = ted_choices
         f.nakliye_tedarikci_id.choices = ted_choices
         f.nakliye_araci_id.choices = pimaks_choices
+        f.ekipman_id.gecerli_degerler = f.nakliye_araci_id.gecerli_degerler = pimaks_idleri
+        f.harici_ekipman_tedarikci_id.gecerli_degerler = f.nakliye_tedarikci_id.gecerli_degerler = ted_idleri
+
+def _form_sayfasi(sablon, form, dahil_ekipmanlar, **baglam):
+    """
+    Ekle/düzelt şablonu. Makine ve tedarikçi listeleri sayfaya gömülmez;
+    sayfa bunları sürümlü /kiralama/secenekler paketinden bir kez yükler.
+    dahil_ekipmanlar: boşta olmasa da listede gösterilecek makineler.
+    """
+    surum, _ = referans.kiralama_secenekleri()
+    return render_template(sablon, form=form, secenek_surumu=surum,
+                           dahil_ekipmanlar=sorted(set(dahil_ekipmanlar)), **baglam)
 
 # -------------------------------------------------------------------------
 # ROUTES
@@ -93,47 +86,191 @@ def populate_kiralama_form_choices(form, kiralama_objesi=None, include_ids=None)
 @kiralama_bp.route('/index')
 def index():
     try:
-        page = request.args.get('page', 1, type=int)
+        imlec = request.args.get('imlec', type=str)
         q = request.args.get('q', '', type=str)
+        vade = request.args.get('vade', '', type=str)
+        gun = request.args.get('gun', 3, type=int)
         today = date.today() 
         
-        query = Kiralama.query.options(
-            joinedload(Kiralama.firma_musteri), 
-            joinedload(Kiralama.kalemler).joinedload(KiralamaKalemi.ekipman),
-            joinedload(Kiralama.kalemler).joinedload(KiralamaKalemi.harici_tedarikci)
-        )
+        # Liste tek ve dar 'kiralama_ozet' tablosundan çizilir (kalem yüklemesi yok)
+        query = KiralamaOzet.query
         
-        if q:
+        arama_sorgusu = kiralama_arama_sorgusu(q) if q else None
+        if arama_sorgusu is not None:
+            # FTS5 indeksi: birleştirme ve DISTINCT olmadan tek indeks araması
+            query = query.filter(KiralamaOzet.kiralama_id.in_(arama_sorgusu))
+        elif q:
             search = f"%{q}%"
-            query = query.join(Firma, Kiralama.firma_musteri_id == Firma.id)\
+            harici = aliased(Ekipman)
+            eslesen_idler = db.session.query(Kiralama.id)\
+                         .join(Firma, Kiralama.firma_musteri_id == Firma.id)\
                          .outerjoin(KiralamaKalemi, Kiralama.id == KiralamaKalemi.kiralama_id)\
                          .outerjoin(Ekipman, KiralamaKalemi.ekipman_id == Ekipman.id)\
+                         .outerjoin(harici, KiralamaKalemi.harici_ekipman_id == harici.id)\
                          .filter(
                 or_(
                     Kiralama.kiralama_form_no.ilike(search),
                     Firma.firma_adi.ilike(search),
                     Ekipman.kod.ilike(search),
                     Ekipman.seri_no.ilike(search),
-                    KiralamaKalemi.harici_ekipman_marka.ilike(search),
-                    KiralamaKalemi.harici_ekipman_model.ilike(search),
-                    KiralamaKalemi.harici_ekipman_seri_no.ilike(search)
+                    harici.marka.ilike(search),
+                    harici.model.ilike(search),
+                    harici.seri_no.ilike(search)
                 )
-            ).distinct()
-            
-        pagination = query.order_by(Kiralama.id.desc()).paginate(page=page, per_page=20)
+            )
+            query = query.filter(KiralamaOzet.kiralama_id.in_(eslesen_idler))
+
+        # Panel kartlarından gelen filtre: bitişi yaklaşan / geciken kalemi olan kiralamalar
+        if vade in ('yaklasan', 'geciken'):
+            query = query.filter(KiralamaOzet.kiralama_id.in_(vade_kiralama_idleri(vade, gun, today)))
+        else:
+            vade = ''
+
+        # Fasetli filtreler: sayılar faset seçimleri uygulanmadan önce tek gruplu sorguyla
+        filtre = filtre_oku(request.args)
+        fasetler = faset_sayilari(query, filtre)
+        query = filtre_uygula(query, filtre)
+
+        # Keyset sayfalama: OFFSET yerine son görülen id'den devam (id DESC)
+        pagination = keyset_sayfala(
+            query, [KiralamaOzet.kiralama_id], imlec=imlec, per_page=20, azalan=True,
+            sayim_anahtari=('kiralama.index', q, vade, gun, *filtre.values())
+        )
+        for ozet in pagination.items:
+            ozet.kalem_listesi = ozet_kalemleri(ozet)
         
         return render_template(
             'kiralama/index.html', 
             kiralamalar=pagination.items, 
             pagination=pagination, 
             q=q, 
-            kurlar=get_tcmb_kurlari(),
+            vade=vade,
+            gun=gun,
+            filtre=filtre,
+            fasetler=fasetler,
+            filtre_aktif=aktif_filtre_var(filtre),
+            vade_sayilari=vade_sayilari(gun, today),
+            kurlar=kurlari_getir(),
             today=today
         )
     except Exception as e:
         flash(f"Liste Hatası: {e}", "danger")
         traceback.print_exc()
-        return render_template('kiralama/index.html', kiralamalar=[], kurlar={}, today=date.today())
+        return render_template('kiralama/index.html', kiralamalar=[], kurlar={}, today=date.today(),
+                               filtre=filtre_oku(request.args))
+
+@kiralama_bp.route('/vade', methods=['GET'])
+def vade_listesi():
+    """Bitişi 'gun' gün içinde olan ve gecikmiş açık kalemler (JSON)."""
+    gun = request.args.get('gun', VARSAYILAN_GUN, type=int)
+    if gun < 0:
+        return jsonify({'hata': "gun negatif olamaz."}), 400
+    ozet = vade_ozeti(gun, limit=request.args.get('limit', type=int))
+    for anahtar in ('yaklasan', 'geciken'):
+        for satir in ozet[anahtar]:
+            satir['baslangic'], satir['bitis'] = satir['baslangic'].isoformat(), satir['bitis'].isoformat()
+    return jsonify(ozet)
+
+@kiralama_bp.route('/gelir-tahakkuk', methods=['GET'])
+def gelir_tahakkuk():
+    """Aylık gelir tahakkuku raporu; ?ay= verilirse o ayın müşteri kırılımı da gösterilir."""
+    yil = request.args.get('yil', date.today().year, type=int)
+    ay = request.args.get('ay', type=int)
+    try:
+        aylar = aylik_gelir(yil)
+        secili = date(yil, ay, 1) if ay and 1 <= ay <= 12 else None
+        musteriler = musteri_gelirleri(secili) if secili else []
+    except Exception as e:
+        flash(f"Rapor Hatası: {e}", "danger")
+        traceback.print_exc()
+        aylar, secili, musteriler = [], None, []
+    return render_template(
+        'kiralama/gelir_tahakkuk.html',
+        yil=yil, aylar=aylar, secili=secili, musteriler=musteriler,
+        yil_toplami=sum((a['toplam'] for a in aylar), Decimal('0.00')),
+    )
+
+@kiralama_bp.route('/teklif', methods=['POST'])
+def teklif():
+    """
+    Anında fiyat teklifi (JSON, app.kiralama.teklif).
+    {"satirlar": [{"ekipman_id": 5, "baslangic": "YYYY-AA-GG", "bitis": "YYYY-AA-GG"},
+                  {"tipi": "Makaslı", "yukseklik": 12, "kapasite": 230, "baslangic": ..., "bitis": ...}]}
+    """
+    veri = request.get_json(silent=True)
+    if not isinstance(veri, dict):
+        return jsonify({'hata': "İstek gövdesi {\"satirlar\": [...]} biçiminde JSON olmalıdır."}), 400
+    try:
+        satirlar = teklif_hazirla(veri.get('satirlar') or [])
+    except ValueError as e:
+        return jsonify({'hata': str(e)}), 400
+    except Exception:
+        traceback.print_exc()
+        return jsonify({'hata': "Teklif hesaplanamadı."}), 500
+    toplam = sum((s['kira'] for s in satirlar if 'kira' in s), Decimal('0.00'))
+    return jsonify({'satirlar': satirlar, 'toplam': toplam})
+
+def _bant_secenekleri(bantlar, birim):
+    return [(-1, 'Tümü')] + [(b, f"{b}+ {birim}") for b in bantlar]
+
+@kiralama_bp.route('/tarifeler', methods=['GET', 'POST'])
+def tarifeler():
+    """Teklif motoru liste fiyatları; aynı tip/bant için kayıt güncellenir."""
+    form = KiralamaTarifesiForm()
+    form.yukseklik_bandi.choices = _bant_secenekleri(YUKSEKLIK_BANTLARI, 'm')
+    form.kapasite_bandi.choices = _bant_secenekleri(KAPASITE_BANTLARI, 'kg')
+
+    if form.validate_on_submit():
+        try:
+            anahtar = {
+                'tipi': form.tipi.data.strip(),
+                'yukseklik_bandi': form.yukseklik_bandi.data if form.yukseklik_bandi.data >= 0 else None,
+                'kapasite_bandi': form.kapasite_bandi.data if form.kapasite_bandi.data >= 0 else None,
+            }
+            kayit = KiralamaTarifesi.query.filter_by(**anahtar).first() or KiralamaTarifesi(**anahtar)
+            kayit.gunluk_fiyat = form.gunluk_fiyat.data
+            kayit.haftalik_fiyat = form.haftalik_fiyat.data
+            kayit.aylik_fiyat = form.aylik_fiyat.data
+            kayit.min_gun = form.min_gun.data or 1
+            kayit.is_active = True
+            db.session.add(kayit); db.session.commit()
+            flash('Tarife kaydedildi.', 'success')
+            return redirect(url_for('kiralama.tarifeler'))
+        except Exception as e:
+            db.session.rollback(); traceback.print_exc(); flash(f"Kayıt Hatası: {e}", "danger")
+
+    kayitlar = KiralamaTarifesi.query.filter_by(is_active=True).order_by(
+        KiralamaTarifesi.tipi, KiralamaTarifesi.yukseklik_bandi, KiralamaTarifesi.kapasite_bandi).all()
+    return render_template('kiralama/tarifeler.html', form=form, tarifeler=kayitlar)
+
+@kiralama_bp.route('/tarifeler/<int:tarife_id>/pasif', methods=['POST'])
+def tarife_pasif(tarife_id):
+    # Silinmez: teklif motoru pasife alınan satırı guncelleme_zamani ile görür
+    kayit = KiralamaTarifesi.query.get_or_404(tarife_id)
+    try:
+        kayit.is_active = False
+        db.session.commit(); flash('Tarife kaldırıldı.', 'success')
+    except Exception as e:
+        db.session.rollback(); flash(f'Hata: {e}', 'danger')
+    return redirect(url_for('kiralama.tarifeler'))
+
+@kiralama_bp.route('/secenekler', methods=['GET'])
+def secenekler():
+    """
+    Ekle/düzelt sayfalarının ortak seçim listeleri (JSON, ETag'li).
+    ?v= güncel sürümle eşleşirse yanıt uzun süre önbelleklenir; sürüm değişince
+    sayfalar yeni URL ister. Eşleşmezse tarayıcı ETag ile doğrular (304).
+    """
+    surum, govde = referans.kiralama_secenekleri()
+    yanit = current_app.response_class(govde, mimetype='application/json')
+    yanit.set_etag(surum)
+    if request.args.get('v') == surum:
+        yanit.cache_control.private = True
+        yanit.cache_control.max_age = 365 * 24 * 3600
+        yanit.cache_control.immutable = True
+    else:
+        yanit.cache_control.no_cache = True
+    return yanit.make_conditional(request)
 
 @kiralama_bp.route('/ekle', methods=['GET', 'POST'])
 def ekle():
@@ -145,14 +282,49 @@ def ekle():
     populate_kiralama_form_choices(form, include_ids=ids_in_form)
 
     if request.method == 'GET':
-        kurlar = get_tcmb_kurlari()
+        kurlar = kurlari_getir()
         form.doviz_kuru_usd.data, form.doviz_kuru_eur.data = kurlar['USD'], kurlar['EUR']
-        last = Kiralama.query.order_by(Kiralama.id.desc()).first()
-        form.kiralama_form_no.data = f"PF-{datetime.now().year}/{(last.id + 1 if last else 1):04d}"
+        # Yalnızca önizleme; numara kayıt anında belge_sayac'tan ayrılır
+        form.kiralama_form_no.data = belge_no_onizle('PF')
         if ekipman_id: form.kalemler.append_entry({'ekipman_id': ekipman_id})
 
     if form.validate_on_submit():
+        # Dış tedarik makinesi tedarikçinin kataloğuna bağlanır (app.filo.harici)
+        if tedarikcisiz_harici_var([k_form.form for k_form in form.kalemler]):
+            flash(TEDARIKCISIZ_HARICI_MESAJI, 'danger')
+            return _form_sayfasi('kiralama/ekle.html', form, ids_in_form)
+        # Makine aynı tarihlerde başka bir kalemde (ya da bu formda iki kez) kullanılamaz
+        cakismalar = cakismalari_bul([
+            (int(k_form.ekipman_id.data or 0), k_form.kiralama_baslangici.data, k_form.kiralama_bitis.data)
+            for k_form in form.kalemler if int(k_form.dis_tedarik_ekipman.data or 0) != 1
+        ])
+        if cakismalar:
+            flash(cakisma_mesaji(cakismalar), 'danger')
+            return _form_sayfasi('kiralama/ekle.html', form, ids_in_form)
+        # Öz mal nakliye aracı aynı gün başka bir kiralamanın teslimat/iadesine ayrılamaz
+        cakismalar = arac_cakismalari([
+            olay for k_form in form.kalemler if int(k_form.dis_tedarik_nakliye.data or 0) != 1
+            for olay in kalem_olaylari(int(k_form.nakliye_araci_id.data or 0),
+                                       k_form.kiralama_baslangici.data, k_form.kiralama_bitis.data)
+        ])
+        if cakismalar:
+            flash(arac_cakisma_mesaji(cakismalar), 'danger')
+            return _form_sayfasi('kiralama/ekle.html', form, ids_in_form)
+        # Kredi limiti: müşteri riski firma_risk tablosundan tek satırla okunur
+        yeni_tutar = sum((
+            kalem_bedeli(k_form.kiralama_baslangici.data, k_form.kiralama_bitis.data,
+                         k_form.kiralama_brm_fiyat.data or 0, k_form.nakliye_satis_fiyat.data or 0).toplam
+            for k_form in form.kalemler if k_form.kiralama_baslangici.data and k_form.kiralama_bitis.data
+        ), Decimal('0.00'))
+        kredi = kredi_durumu(form.firma_musteri_id.data, yeni_tutar)
+        kredi_uyarisi = kredi_limiti_mesaji(kredi) if kredi and kredi.asim else None
+        if kredi_uyarisi and limit_davranisi() == 'engelle':
+            flash(kredi_uyarisi, 'danger')
+            return _form_sayfasi('kiralama/ekle.html', form, ids_in_form)
+
         try:
+            # Form no atomik sayaçtan alınır (eşzamanlı kayıtlarda mükerrer numara oluşmaz)
+            form.kiralama_form_no.data = belge_no_al('PF')
             yeni_kiralama = Kiralama(
                 kiralama_form_no=form.kiralama_form_no.data,
                 firma_musteri_id=form.firma_musteri_id.data,
@@ -163,6 +335,10 @@ def ekle():
             db.session.add(yeni_kiralama); db.session.flush()
 
             toplam_gelir = Decimal('0.00')
+            ayrilacak_makineler = []
+            # Dış tedarik makineleri katalogda tek toplu bul/ekle ile çözülür
+            katalog_id, katalog_duzeltmeleri = harici_katalog_idleri([k_form.form for k_form in form.kalemler])
+            katalog_duzeltmelerini_uygula(katalog_duzeltmeleri)
 
             for k_form in form.kalemler:
                 bas, bit = k_form.kiralama_baslangici.data, k_form.kiralama_bitis.data
@@ -179,25 +355,22 @@ def ekle():
                     sonlandirildi=0
                 )
 
-                if int(k_form.dis_tedarik_ekipman.data or 0) == 1:
+                if harici_mi(k_form.form):
                     kalem.is_dis_tedarik_ekipman = True
-                    kalem.harici_ekipman_marka = k_form.harici_ekipman_marka.data
-                    kalem.harici_ekipman_model = k_form.harici_ekipman_model.data
-                    kalem.harici_ekipman_seri_no = k_form.harici_ekipman_seri_no.data
+                    kalem.harici_ekipman_id = katalog_id(k_form.form)
                     kalem.harici_ekipman_tedarikci_id = k_form.harici_ekipman_tedarikci_id.data
                     if kalem.kiralama_alis_fiyat > 0:
-                        gun = max((bit - bas).days + 1, 1)
                         db.session.add(HizmetKaydi(
                             firma_id=kalem.harici_ekipman_tedarikci_id, tarih=date.today(),
-                            tutar=(kalem.kiralama_alis_fiyat * gun), yon='gelen',
-                            fatura_no=yeni_kiralama.kiralama_form_no, aciklama=f"Dış Kiralama: {kalem.harici_ekipman_marka}"
+                            tutar=kalem_bedeli(bas, bit, kalem.kiralama_alis_fiyat).kira, yon='gelen',
+                            fatura_no=yeni_kiralama.kiralama_form_no, aciklama=f"Dış Kiralama: {k_form.harici_ekipman_marka.data}",
+                            kaynak_tipi='kiralama', kiralama_id=yeni_kiralama.id
                         ))
                 else:
                     eid = int(k_form.ekipman_id.data or 0)
                     if eid > 0:
                         kalem.ekipman_id = eid
-                        ekip = Ekipman.query.get(eid)
-                        if ekip: ekip.calisma_durumu = 'kirada'
+                        ayrilacak_makineler.append(eid)
 
                 if int(k_form.dis_tedarik_nakliye.data or 0) == 1:
                     kalem.is_harici_nakliye, kalem.is_oz_mal_nakliye = True, False
@@ -208,24 +381,32 @@ def ekle():
                     kalem.nakliye_araci_id = arac_id if arac_id > 0 else None
 
                 db.session.add(kalem)
-                toplam_gelir += (kalem.kiralama_brm_fiyat * max((bit - bas).days + 1, 1)) + (kalem.nakliye_satis_fiyat or 0)
+                toplam_gelir += kalem_bedeli(bas, bit, kalem.kiralama_brm_fiyat, kalem.nakliye_satis_fiyat).toplam
 
             if toplam_gelir > 0:
                 db.session.add(HizmetKaydi(
                     firma_id=yeni_kiralama.firma_musteri_id, tarih=date.today(), tutar=toplam_gelir,
-                    yon='giden', fatura_no=yeni_kiralama.kiralama_form_no, ozel_id=yeni_kiralama.id,
+                    yon='giden', fatura_no=yeni_kiralama.kiralama_form_no,
+                    kaynak_tipi='kiralama', kiralama_id=yeni_kiralama.id,
                     aciklama=f"Kiralama Bedeli - {yeni_kiralama.kiralama_form_no}"
                 ))
 
-            db.session.commit(); flash('Kiralama başarıyla kaydedildi.', 'success'); return redirect(url_for('kiralama.index'))
+            # Koşullu UPDATE: aynı makineyi eşzamanlı kiralayan ikinci işlem burada düşer
+            rezerve_et_hepsi(ayrilacak_makineler)
+
+            db.session.commit(); flash('Kiralama başarıyla kaydedildi.', 'success')
+            if kredi_uyarisi: flash(kredi_uyarisi, 'warning')
+            return redirect(url_for('kiralama.index'))
+        except DurumCakismasi as e:
+            db.session.rollback(); flash(str(e), "danger")
         except Exception as e:
             db.session.rollback(); traceback.print_exc(); flash(f"Kayıt Hatası: {e}", "danger")
 
-    return render_template('kiralama/ekle.html', form=form)
+    return _form_sayfasi('kiralama/ekle.html', form, ids_in_form)
 
 @kiralama_bp.route('/duzenle/<int:kiralama_id>', methods=['GET', 'POST'])
 def duzenle(kiralama_id):
-    kiralama = Kiralama.query.get_or_404(kiralama_id)
+    kiralama = kiralama_duzenleme_icin_yukle(kiralama_id) or abort(404)
     form = KiralamaForm()
 
     if request.method == 'GET':
@@ -239,6 +420,8 @@ def duzenle(kiralama_id):
             form.kalemler.pop_entry()
             
         for k in kiralama.kalemler:
+            # Dış tedarik makine bilgileri katalogdan (app.filo.harici)
+            harici = makine_bilgisi(k.harici_ekipman) if k.harici_ekipman else {}
             entry = form.kalemler.append_entry({
                 'ekipman_id': k.ekipman_id,
                 'kiralama_baslangici': k.kiralama_baslangici,
@@ -248,13 +431,13 @@ def duzenle(kiralama_id):
                 'nakliye_satis_fiyat': k.nakliye_satis_fiyat,
                 'nakliye_alis_fiyat': k.nakliye_alis_fiyat,
                 'dis_tedarik_ekipman': 1 if k.is_dis_tedarik_ekipman else 0,
-                'harici_ekipman_marka': k.harici_ekipman_marka,
-                'harici_ekipman_model': k.harici_ekipman_model,
-                'harici_ekipman_seri_no': k.harici_ekipman_seri_no,
-                'harici_ekipman_tipi': k.harici_ekipman_tipi,
-                'harici_ekipman_kaldirma_kapasitesi': k.harici_ekipman_kapasite,
-                'harici_ekipman_calisma_yuksekligi': k.harici_ekipman_yukseklik,
-                'harici_ekipman_uretim_tarihi': k.harici_ekipman_uretim_yili,
+                'harici_ekipman_marka': harici.get('marka'),
+                'harici_ekipman_model': harici.get('model'),
+                'harici_ekipman_seri_no': harici.get('seri_no'),
+                'harici_ekipman_tipi': harici.get('tipi'),
+                'harici_ekipman_kaldirma_kapasitesi': harici.get('kaldirma_kapasitesi'),
+                'harici_ekipman_calisma_yuksekligi': harici.get('calisma_yuksekligi'),
+                'harici_ekipman_uretim_tarihi': harici.get('uretim_tarihi'),
                 'harici_ekipman_tedarikci_id': k.harici_ekipman_tedarikci_id,
                 'dis_tedarik_nakliye': 1 if k.is_harici_nakliye else 0, 
                 'nakliye_tedarikci_id': k.nakliye_tedarikci_id,
@@ -265,122 +448,150 @@ def duzenle(kiralama_id):
         if len(form.kalemler) == 0:
             form.kalemler.append_entry()
 
-    populate_kiralama_form_choices(form, kiralama_objesi=kiralama, include_ids=[k.ekipman_id for k in kiralama.kalemler if k.ekipman_id])
+    ids_in_form = [k.ekipman_id for k in kiralama.kalemler if k.ekipman_id]
+    populate_kiralama_form_choices(form, kiralama_objesi=kiralama, include_ids=ids_in_form)
 
     if form.validate_on_submit():
+        if tedarikcisiz_harici_var([k_form.form for k_form in form.kalemler]):
+            flash(TEDARIKCISIZ_HARICI_MESAJI, 'danger')
+            return _form_sayfasi('kiralama/duzelt.html', form, ids_in_form, kiralama=kiralama)
         try:
-            HizmetKaydi.query.filter_by(fatura_no=kiralama.kiralama_form_no).delete(synchronize_session=False)
-            
-            kiralama.firma_musteri_id = form.firma_musteri_id.data
-            kiralama.kdv_orani = form.kdv_orani.data
-            kiralama.doviz_kuru_usd = form.doviz_kuru_usd.data
-            kiralama.doviz_kuru_eur = form.doviz_kuru_eur.data
-            
-            toplam_gelir = Decimal('0.00')
-            formdan_gelen_idler = []
-
-            for k_form in form.kalemler:
-                f = k_form.form 
-                bas, bit = f.kiralama_baslangici.data, f.kiralama_bitis.data
-                if not (bas and bit): continue
-
-                kalem_id = f.id.data
-                aktif = KiralamaKalemi.query.get(int(kalem_id)) if (kalem_id and str(kalem_id).isdigit()) else KiralamaKalemi(kiralama_id=kiralama.id)
-                
-                # Önce NOT NULL alanlarını doldurarak IntegrityError'u engelle
-                aktif.kiralama_baslangici, aktif.kiralama_bitis = bas, bit
-                aktif.kiralama_brm_fiyat = Decimal(str(f.kiralama_brm_fiyat.data or 0))
-                aktif.kiralama_alis_fiyat = Decimal(str(f.kiralama_alis_fiyat.data or 0))
-                aktif.nakliye_satis_fiyat = Decimal(str(f.nakliye_satis_fiyat.data or 0))
-                aktif.nakliye_alis_fiyat = Decimal(str(f.nakliye_alis_fiyat.data or 0))
-                aktif.sonlandirildi = 0
-
-                is_dis = int(f.dis_tedarik_ekipman.data or 0) == 1
-                if not is_dis:
-                    y_eid = int(f.ekipman_id.data or 0)
-                    if y_eid > 0:
-                        if aktif.ekipman_id and aktif.ekipman_id != y_eid:
-                            eski = Ekipman.query.get(aktif.ekipman_id)
-                            if eski: eski.calisma_durumu = 'bosta'
-                        
-                        aktif.ekipman_id, aktif.is_dis_tedarik_ekipman = y_eid, False
-                        ekip = Ekipman.query.get(y_eid)
-                        if ekip: ekip.calisma_durumu = 'kirada'
-                else:
-                    if aktif.ekipman_id:
-                        eski = Ekipman.query.get(aktif.ekipman_id)
-                        if eski: eski.calisma_durumu = 'bosta'
-                    aktif.ekipman_id, aktif.is_dis_tedarik_ekipman = None, True
-                    aktif.harici_ekipman_marka = f.harici_ekipman_marka.data
-                    aktif.harici_ekipman_model = f.harici_ekipman_model.data
-                    aktif.harici_ekipman_tedarikci_id = f.harici_ekipman_tedarikci_id.data if int(f.harici_ekipman_tedarikci_id.data or 0) > 0 else None
-
-                aktif.is_harici_nakliye = int(f.dis_tedarik_nakliye.data or 0) == 1
-                aktif.is_oz_mal_nakliye = not aktif.is_harici_nakliye
-                aktif.nakliye_tedarikci_id = f.nakliye_tedarikci_id.data if aktif.is_harici_nakliye else None
-                aktif.nakliye_araci_id = f.nakliye_araci_id.data if (aktif.is_oz_mal_nakliye and int(f.nakliye_araci_id.data or 0) > 0) else None
-                
-                gun = max((bit - bas).days + 1, 1)
-                toplam_gelir += (aktif.kiralama_brm_fiyat * gun) + aktif.nakliye_satis_fiyat
-                
-                if not aktif.id: db.session.add(aktif)
-                db.session.flush()
-                formdan_gelen_idler.append(aktif.id)
-            
-            for k in list(kiralama.kalemler):
-                if k.id not in formdan_gelen_idler:
-                    if k.ekipman: k.ekipman.calisma_durumu = 'bosta'
-                    db.session.delete(k)
-
-            if toplam_gelir > 0:
-                db.session.add(HizmetKaydi(
-                    firma_id=kiralama.firma_musteri_id, tarih=date.today(), tutar=toplam_gelir,
-                    yon='giden', fatura_no=kiralama.kiralama_form_no, ozel_id=kiralama.id,
-                    aciklama=f"Kiralama Güncelleme - {kiralama.kiralama_form_no}"
-                ))
+            # Fark motoru: yalnızca değişen kalem/makine/cari satırlarına dokunur, tek flush
+            degisiklik = degisiklik_seti_olustur(kiralama, form)
+            if degisiklik.bos_mu():
+                flash('Değişiklik yapılmadı.', 'info')
+                return redirect(url_for('kiralama.index'))
+            cakismalar = cakismalari_bul(degisiklik.makine_talepleri, degisiklik.haric_kalem_idler)
+            if cakismalar:
+                flash(cakisma_mesaji(cakismalar), 'danger')
+                return _form_sayfasi('kiralama/duzelt.html', form, ids_in_form, kiralama=kiralama)
+            cakismalar = arac_cakismalari(degisiklik.arac_olaylari)
+            if cakismalar:
+                flash(arac_cakisma_mesaji(cakismalar), 'danger')
+                return _form_sayfasi('kiralama/duzelt.html', form, ids_in_form, kiralama=kiralama)
+            degisiklik.uygula()
             
             db.session.commit()
             flash('Kiralama güncellendi.', 'success')
             return redirect(url_for('kiralama.index'))
+        except DurumCakismasi as e:
+            db.session.rollback()
+            flash(str(e), "danger")
         except Exception as e:
             db.session.rollback()
             traceback.print_exc()
             flash(f"Hata: {e}", "danger")
 
-    return render_template('kiralama/duzelt.html', form=form, kiralama=kiralama)
+    return _form_sayfasi('kiralama/duzelt.html', form, ids_in_form, kiralama=kiralama)
 
 @kiralama_bp.route('/sil/<int:kiralama_id>', methods=['POST'])
 def sil(kiralama_id):
     kiralama = Kiralama.query.get_or_404(kiralama_id)
     try:
-        HizmetKaydi.query.filter_by(fatura_no=kiralama.kiralama_form_no).delete()
-        for k in kiralama.kalemler:
-            if k.ekipman: k.ekipman.calisma_durumu = 'bosta'
+        # Kiralamanın tüm cari satırları: ix_hizmet_kaydi_kiralama_yon üzerinden tek DELETE
+        HizmetKaydi.query.filter_by(kiralama_id=kiralama.id).delete(synchronize_session=False)
+        # Yalnızca açık kalemlerin makineleri boşa çıkar (sonlandırılanlar başka kirada olabilir)
+        serbest_birak([k.ekipman_id for k in kiralama.kalemler if k.ekipman_id and not k.sonlandirildi])
         db.session.delete(kiralama); db.session.commit(); flash('Kiralama silindi.', 'success')
     except Exception as e:
         db.session.rollback(); flash(f'Hata: {e}', 'danger')
     return redirect(url_for('kiralama.index'))
 
-@kiralama_bp.route('/kalem/sonlandir', methods=['POST'])
-def sonlandir_kalem():
+def _tekil_kalem_islemi(islem, basari_mesaji):
+    """Tek kalemlik sonlandır/geri al: toplu motorla aynı yol, tek commit."""
     try:
         kalem = KiralamaKalemi.query.get_or_404(request.form.get('kalem_id', type=int))
         bitis = request.form.get('bitis_tarihi')
-        if bitis: kalem.kiralama_bitis = datetime.strptime(bitis, '%Y-%m-%d').date()
-        kalem.sonlandirildi = True
-        if kalem.ekipman: kalem.ekipman.calisma_durumu = 'bosta'
-        db.session.commit(); guncelle_cari_toplam(kalem.kiralama_id); flash("Kalem sonlandırıldı.", "success")
+        bitis = datetime.strptime(bitis, '%Y-%m-%d').date() if bitis else None
+        sonuc = toplu_kalem_islemi([kalem.id], islem, bitis=bitis)
+        if sonuc.atlanan:
+            db.session.rollback(); flash(sonuc.atlanan[kalem.id], "danger")
+        else:
+            db.session.commit(); flash(basari_mesaji, "success")
     except Exception as e:
         db.session.rollback(); flash(f"Hata: {e}", "danger")
     return redirect(url_for('kiralama.index'))
 
+@kiralama_bp.route('/kalem/sonlandir', methods=['POST'])
+def sonlandir_kalem():
+    return _tekil_kalem_islemi('sonlandir', "Kalem sonlandırıldı.")
+
 @kiralama_bp.route('/kalem/iptal_et', methods=['POST'])
 def iptal_et_kalem():
+    return _tekil_kalem_islemi('geri_al', "Sonlandırma geri alındı.")
+
+@kiralama_bp.route('/kalem/toplu', methods=['POST'])
+def toplu_kalem():
+    """
+    Toplu sonlandır / uzat / geri al (tek transaction, tek commit).
+    JSON: {"kalem_ids": [...], "islem": "sonlandir|uzat|geri_al", "bitis_tarihi": "YYYY-AA-GG"}
+    Form: kalem_ids (çoklu ya da virgülle ayrılmış), islem, bitis_tarihi.
+    JSON isteğe sonuç JSON'u döner; form gönderimi listeye yönlendirilir.
+    """
+    if request.is_json:
+        veri = request.get_json(silent=True) or {}
+        ham_idler = veri.get('kalem_ids') or []
+    else:
+        veri = request.form
+        ham_idler = [p for d in request.form.getlist('kalem_ids') for p in str(d).split(',')]
     try:
-        kalem = KiralamaKalemi.query.get_or_404(request.form.get('kalem_id', type=int))
-        kalem.sonlandirildi = False
-        if kalem.ekipman: kalem.ekipman.calisma_durumu = 'kirada'
-        db.session.commit(); guncelle_cari_toplam(kalem.kiralama_id); flash("Sonlandırma geri alındı.", "success")
+        kalem_idler = [int(i) for i in ham_idler if str(i).strip()]
+        bitis = veri.get('bitis_tarihi')
+        bitis = date.fromisoformat(bitis) if bitis else None
+        if not kalem_idler:
+            raise ValueError("En az bir kalem seçilmelidir.")
+        sonuc = toplu_kalem_islemi(kalem_idler, veri.get('islem'), bitis=bitis)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify({'hata': str(e)}), 400
+        flash(f"Hata: {e}", "danger")
+        return redirect(url_for('kiralama.index'))
     except Exception as e:
-        db.session.rollback(); flash(f"Hata: {e}", "danger")
-    return redirect(url_for('kiralama.index'))
\ No newline at end of file
+        db.session.rollback()
+        traceback.print_exc()
+        if request.is_json:
+            return jsonify({'hata': str(e)}), 500
+        flash(f"Hata: {e}", "danger")
+        return redirect(url_for('kiralama.index'))
+
+    if request.is_json:
+        return jsonify(sonuc.sozluk())
+    flash(sonuc.mesaj(), "success" if not sonuc.atlanan else "warning")
+    for kalem_id, neden in sorted(sonuc.atlanan.items())[:10]:
+        flash(f"Kalem #{kalem_id}: {neden}", "warning")
+    return redirect(url_for('kiralama.index'))
+
+@kiralama_bp.route('/ice-aktar', methods=['GET', 'POST'])
+def ice_aktar():
+    """Toplu kiralama aktarımı: JSON gövdesi (API) ya da CSV/JSON dosya yükleme."""
+    rapor = None
+    if request.method == 'POST':
+        kuru = request.args.get('kuru', type=int) == 1 or bool(request.form.get('kuru_calistir'))
+        try:
+            if request.is_json:
+                satirlar = request.get_json()
+                satirlar = satirlar.get('satirlar', []) if isinstance(satirlar, dict) else satirlar
+            else:
+                dosya = request.files.get('dosya')
+                if not dosya or not dosya.filename:
+                    flash("Lütfen bir CSV veya JSON dosyası seçiniz.", "warning")
+                    return redirect(url_for('kiralama.ice_aktar'))
+                satirlar = satirlari_oku(dosya.read(), dosya.filename)
+            rapor = kiralamalari_ice_aktar(satirlar, kuru_calistir=kuru)
+        except Exception as e:
+            db.session.rollback(); traceback.print_exc()
+            if request.is_json:
+                return jsonify({'hata': str(e)}), 400
+            flash(f"Aktarım Hatası: {e}", "danger")
+            return redirect(url_for('kiralama.ice_aktar'))
+
+        if request.is_json:
+            return jsonify(rapor)
+        flash(f"{rapor['aktarilan_kiralama']} kiralama / {rapor['aktarilan_kalem']} kalem "
+              f"{'doğrulandı' if kuru else 'aktarıldı'}, {rapor['hatali_satir']} satır hatalı "
+              f"({rapor['satir_per_sn']} satır/sn).",
+              "success" if not rapor['hatali_satir'] else "warning")
+
+    return render_template('kiralama/ice_aktar.html', rapor=rapor)
@@ -0,0 +1,216 @@
+"""
+Gelir tahakkuku: kiralama gelirinin takvim aylarına dağıtılması ('gelir_tahakkuk').
+
+Cari kayıtlar kiralamanın tüm bedelini kayıt tarihine yazar; birkaç aya yayılan
+bir kiralamanın geliri ay bazında görülemiyordu. Burada her kalem için:
+
+  - Sözleşme bedeli (app.kiralama.fiyatlama) [başlangıç, bitiş] aralığının
+    aylara düşen gün sayısıyla orantılı dağıtılır. Dönem faturalarının
+    kapsadığı günler (ana kayıtta da sayılmaz) dağıtımdan düşülür; yuvarlama
+    farkı son aya yazılır.
+  - Dönem faturaları (app.kiralama.donem) kendi aylarına yazılır.
+  - Nakliye satış bedeli başlangıç ayına yazılır.
+
+Aralıklar gün gün değil ay sınırlarından bölünür (ay başına tek işlem).
+Tablo kiralama özeti gibi yalnızca değişen kiralamalar için yeniden yazılır:
+ORM flush'ında otomatik, toplu (Core) güncellemelerden sonra
+gelir_tahakkuklarini_guncelle() ile. Tutarsızlık şüphesinde
+'flask kiralama tahakkuk-yeniden-olustur' çalıştırılır.
+"""
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import delete, event, func, select
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi, GelirTahakkuk
+from app.cari.models import HizmetKaydi
+from app.firmalar.models import Firma
+from app.kiralama.fiyatlama import KURUS, toplu_fiyatla
+from app.kiralama.ozet import PARCA_BOYUTU
+from app.olaylar import degisti, eski_degerler
+
+SIFIR = Decimal('0.00')
+
+# Tahakkuku etkileyen kalem alanları ('kiralama': koleksiyondan çıkarılan, flush'ta silinecek kalem)
+_KALEM_ALANLARI = ('kiralama', 'kiralama_id', 'kiralama_baslangici', 'kiralama_bitis',
+                   'kiralama_brm_fiyat', 'nakliye_satis_fiyat')
+
+
+def ay_dilimleri(baslangic, bitis):
+    """[baslangic, bitis] aralığını aylara böler: [(ayın ilk günü, gün sayısı), ...]."""
+    dilimler = []
+    gun = baslangic
+    while gun <= bitis:
+        ay_sonu = (gun.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        son = min(ay_sonu, bitis)
+        dilimler.append((gun.replace(day=1), (son - gun).days + 1))
+        gun = son + timedelta(days=1)
+    return dilimler
+
+
+def _dagit(tutar, agirliklar):
+    """tutar'ı ağırlıklarla orantılı böler (kuruşa yuvarlı); fark son paya eklenir."""
+    toplam_agirlik = sum(agirliklar)
+    paylar = [(tutar * a / toplam_agirlik).quantize(KURUS, rounding=ROUND_HALF_UP) for a in agirliklar]
+    paylar[-1] += tutar - sum(paylar)
+    return paylar
+
+
+def _tahakkuk_satirlari(conn, kiralama_idler):
+    """Verilen kiralamaların tahakkuk satırlarını (dict) hesaplar."""
+    kalemler = conn.execute(
+        select(KiralamaKalemi.id, KiralamaKalemi.kiralama_id, Kiralama.firma_musteri_id,
+               KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis,
+               KiralamaKalemi.kiralama_brm_fiyat, KiralamaKalemi.nakliye_satis_fiyat)
+        .join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id)
+        .where(KiralamaKalemi.kiralama_id.in_(kiralama_idler))
+        .order_by(KiralamaKalemi.id)
+    ).all()
+
+    # Müşteri dönem faturaları: kalem -> [(ay, başlangıç, bitiş, tutar)]
+    donemler = {}
+    for d in conn.execute(
+        select(HizmetKaydi.kalem_id, HizmetKaydi.donem, HizmetKaydi.donem_baslangic,
+               HizmetKaydi.donem_bitis, HizmetKaydi.tutar)
+        .where(HizmetKaydi.kiralama_id.in_(kiralama_idler), HizmetKaydi.yon == 'giden',
+               HizmetKaydi.kaynak_tipi == 'donem')
+    ):
+        donemler.setdefault(d.kalem_id, []).append(d)
+
+    # Dönem faturalarının sözleşme aralığına düşen günleri: kalem -> {ay: gün}
+    kapsanan = {}
+    for k in kalemler:
+        for d in donemler.get(k.id, ()):
+            ortak = (min(k.kiralama_bitis, d.donem_bitis) - max(k.kiralama_baslangici, d.donem_baslangic)).days + 1
+            if ortak > 0:
+                aylar = kapsanan.setdefault(k.id, {})
+                aylar[d.donem] = aylar.get(d.donem, 0) + ortak
+
+    fiyatlar = toplu_fiyatla(
+        [(k.kiralama_baslangici, k.kiralama_bitis, k.kiralama_brm_fiyat, k.nakliye_satis_fiyat) for k in kalemler],
+        haric_gunler=[sum(kapsanan.get(k.id, {}).values()) for k in kalemler],
+    )
+
+    satirlar = []
+    for k, fiyat in zip(kalemler, fiyatlar):
+        aylar = {}
+
+        def ay(donem):
+            if donem not in aylar:
+                aylar[donem] = {
+                    'kalem_id': k.id, 'kiralama_id': k.kiralama_id, 'firma_musteri_id': k.firma_musteri_id,
+                    'donem': donem, 'gun': 0,
+                    'kira_tutari': SIFIR, 'donem_tutari': SIFIR, 'nakliye_tutari': SIFIR,
+                }
+            return aylar[donem]
+
+        haric = kapsanan.get(k.id, {})
+        dilimler = [(donem, gun - haric.get(donem, 0)) for donem, gun in ay_dilimleri(k.kiralama_baslangici, k.kiralama_bitis)]
+        dilimler = [(donem, gun) for donem, gun in dilimler if gun > 0]
+        if fiyat.kira and dilimler:
+            for (donem, gun), pay in zip(dilimler, _dagit(fiyat.kira, [gun for _, gun in dilimler])):
+                satir = ay(donem)
+                satir['gun'] += gun
+                satir['kira_tutari'] += pay
+        elif fiyat.kira:
+            # Asgari gün nedeniyle aralık dışında kalan bedel başlangıç ayına
+            ay(k.kiralama_baslangici.replace(day=1))['kira_tutari'] += fiyat.kira
+
+        for d in donemler.get(k.id, ()):
+            satir = ay(d.donem)
+            satir['gun'] += (d.donem_bitis - d.donem_baslangic).days + 1
+            satir['donem_tutari'] += d.tutar
+
+        if fiyat.nakliye:
+            ay(k.kiralama_baslangici.replace(day=1))['nakliye_tutari'] += fiyat.nakliye
+
+        satirlar.extend(aylar.values())
+    return satirlar
+
+
+def gelir_tahakkuklarini_guncelle(conn, kiralama_idler):
+    """Verilen kiralamaların tahakkuk satırlarını silip yeniden yazar (silinmiş kiralama/kalemler düşer)."""
+    idler = sorted({int(i) for i in kiralama_idler if i is not None})
+    tablo = GelirTahakkuk.__table__
+    for i in range(0, len(idler), PARCA_BOYUTU):
+        parca = idler[i:i + PARCA_BOYUTU]
+        conn.execute(delete(tablo).where(tablo.c.kiralama_id.in_(parca)))
+        satirlar = _tahakkuk_satirlari(conn, parca)
+        if satirlar:
+            conn.execute(tablo.insert(), satirlar)
+
+
+def gelir_tahakkuklarini_yeniden_olustur():
+    """Tüm tahakkuk tablosunu sıfırdan kurar ve işlenen kiralama sayısını döndürür."""
+    with db.engine.begin() as conn:
+        conn.execute(delete(GelirTahakkuk.__table__))
+        idler = conn.execute(select(Kiralama.id)).scalars().all()
+        gelir_tahakkuklarini_guncelle(conn, idler)
+        return len(idler)
+
+
+# -------------------------------------------------------------------------
+# RAPOR
+# -------------------------------------------------------------------------
+def aylik_gelir(yil):
+    """Yılın 12 ayı için tahakkuk toplamları: [{'donem', 'kira', 'donem_faturasi', 'nakliye', 'toplam', 'gun'}]."""
+    toplamlar = {
+        r.donem: r for r in db.session.execute(
+            select(GelirTahakkuk.donem, func.sum(GelirTahakkuk.gun).label('gun'),
+                   func.sum(GelirTahakkuk.kira_tutari).label('kira'),
+                   func.sum(GelirTahakkuk.donem_tutari).label('donem_faturasi'),
+                   func.sum(GelirTahakkuk.nakliye_tutari).label('nakliye'))
+            .where(GelirTahakkuk.donem >= date(yil, 1, 1), GelirTahakkuk.donem <= date(yil, 12, 1))
+            .group_by(GelirTahakkuk.donem)
+        )
+    }
+    aylar = []
+    for no in range(1, 13):
+        r = toplamlar.get(date(yil, no, 1))
+        kira, donem, nakliye = (Decimal(str(r.kira or 0)), Decimal(str(r.donem_faturasi or 0)),
+                                Decimal(str(r.nakliye or 0))) if r else (SIFIR, SIFIR, SIFIR)
+        aylar.append({
+            'donem': date(yil, no, 1), 'gun': (r.gun or 0) if r else 0,
+            'kira': kira, 'donem_faturasi': donem, 'nakliye': nakliye, 'toplam': kira + donem + nakliye,
+        })
+    return aylar
+
+
+def musteri_gelirleri(donem, limit=20):
+    """Bir ayın tahakkukunun müşteri kırılımı (en yüksek önce): [(firma_musteri_id, firma_adi, toplam)]."""
+    toplam = func.sum(GelirTahakkuk.kira_tutari + GelirTahakkuk.donem_tutari + GelirTahakkuk.nakliye_tutari)
+    return db.session.execute(
+        select(GelirTahakkuk.firma_musteri_id, Firma.firma_adi, toplam.label('toplam'))
+        .outerjoin(Firma, Firma.id == GelirTahakkuk.firma_musteri_id)
+        .where(GelirTahakkuk.donem == donem)
+        .group_by(GelirTahakkuk.firma_musteri_id, Firma.firma_adi)
+        .order_by(toplam.desc())
+        .limit(limit)
+    ).all()
+
+
+# -------------------------------------------------------------------------
+# ORM SENKRONİZASYONU (bkz. app.olaylar)
+# -------------------------------------------------------------------------
+@event.listens_for(db.session, 'after_flush')
+def _gelir_tahakkuklarini_senkronize_et(session, flush_context):
+    kiralama_idler = set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Kiralama):
+            kiralama_idler.add(obj.id)
+        elif isinstance(obj, KiralamaKalemi) or (isinstance(obj, HizmetKaydi) and obj.kaynak_tipi == 'donem'):
+            kiralama_idler.add(obj.kiralama_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, KiralamaKalemi):
+            if degisti(obj, *_KALEM_ALANLARI):
+                kiralama_idler.add(obj.kiralama_id)
+                kiralama_idler.update(eski_degerler(obj, 'kiralama_id'))
+        elif isinstance(obj, Kiralama):
+            if degisti(obj, 'firma_musteri_id'):
+                kiralama_idler.add(obj.id)
+
+    kiralama_idler.discard(None)
+    if kiralama_idler:
+        gelir_tahakkuklarini_guncelle(session.connection(), kiralama_idler)
@@ -0,0 +1,262 @@
+"""
+Anında fiyat teklifi (bellek içi tarife endeksi).
+
+Satış ekibi teklif verirken geçmiş kalemlerin kiralama_brm_fiyat değerlerine
+elle bakıyordu. Teklif motoru iki kaynağı bellekte, sözlük endekslerinde tutar:
+
+  1. Tarife tablosu (KiralamaTarifesi): (tipi, yükseklik bandı, kapasite
+     bandı) -> fiyatlama.Tarife. Süre kademesi tarifenin içindedir (günlük /
+     haftalık / aylık fiyat, app.kiralama.fiyatlama.kira_bedeli).
+  2. Geçmiş kalem fiyatları (son GECMIS_GUN gün): (tipi, yükseklik bandı,
+     kapasite bandı, süre kademesi) -> günlük fiyatların medyanı. Tarifesi
+     olmayan makineler için kullanılır.
+
+Arama sırası: tam bant tarifesi, yalnız yükseklik bandı, yalnız kapasite
+bandı, tipin genel tarifesi; ardından aynı sırayla geçmiş fiyatlar. Satır
+başına yalnızca sözlük okumaları ve fiyatlama.toplu_fiyatla (aynı gün/tarife
+bir kez hesaplanır) kalır; veritabanına istek başına sabit sayıda sorgu gider.
+
+Yenileme artımlıdır: her teklifte tarife tablosunun en son guncelleme_zamani
+okunur, yalnızca o andan sonra değişen tarife satırları yeniden yüklenir;
+geçmişe yalnızca son görülen kalem id'sinden sonraki kalemler eklenir. Eski
+kalemlerdeki düzeltmeler için geçmiş endeksi TEKLIF_GECMIS_TTL saniyede bir
+sıfırdan kurulur.
+"""
+import threading
+import time
+from bisect import bisect_right, insort
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.filo.models import Ekipman
+from app.kiralama.models import KiralamaKalemi, KiralamaTarifesi
+from app.kiralama.fiyatlama import AY_GUNU, HAFTA_GUNU, KURUS, kiralama_gunu, tarife, toplu_fiyatla
+
+# Bant alt sınırları: makine, değerinin düştüğü en büyük alt sınırın bandındadır
+YUKSEKLIK_BANTLARI = (0, 6, 8, 10, 12, 14, 16, 20, 26, 32)     # metre
+KAPASITE_BANTLARI = (0, 200, 230, 300, 450, 1000, 2500)        # kg
+GECMIS_GUN = 730
+EN_FAZLA_SATIR = 500
+
+
+def bant(deger, bantlar):
+    """Değerin bant alt sınırı; değer yoksa None."""
+    if deger is None:
+        return None
+    return bantlar[max(bisect_right(bantlar, deger) - 1, 0)]
+
+
+def sure_kademesi(gun):
+    if gun >= AY_GUNU:
+        return 'aylik'
+    if gun >= HAFTA_GUNU:
+        return 'haftalik'
+    return 'gunluk'
+
+
+def _tip(deger):
+    return (deger or '').strip().lower()
+
+
+def _adaylar(tipi, yb, kb):
+    """Aranacak bant anahtarları (en özelden en genele)."""
+    return ((tipi, yb, kb), (tipi, yb, None), (tipi, None, kb), (tipi, None, None))
+
+
+class TeklifMotoru:
+    """Tarife ve geçmiş fiyat endeksleri; tazele() ile artımlı güncellenir."""
+
+    def __init__(self):
+        self.tarifeler = {}         # (tipi, yb, kb) -> Tarife
+        self._tarife_anahtarlari = {}  # tarife id -> (tipi, yb, kb)
+        self.son_guncelleme = None  # okunan en son guncelleme_zamani
+        self.gecmis = {}            # (tipi, yb, kb, kademe) -> sıralı günlük fiyatlar
+        self._medyanlar = {}        # aynı anahtar -> Tarife (gecmis değişince silinir)
+        self.son_kalem_id = 0
+        self.gecmis_zamani = None   # geçmişin son tam kurulum zamanı (monotonic)
+        self._kilit = threading.Lock()
+
+    # --- yükleme ---------------------------------------------------------
+    def _tarifeleri_yukle(self):
+        son = db.session.execute(select(func.max(KiralamaTarifesi.guncelleme_zamani))).scalar()
+        if son is None or (self.son_guncelleme is not None and son <= self.son_guncelleme):
+            return
+        sorgu = select(KiralamaTarifesi.id, KiralamaTarifesi.tipi, KiralamaTarifesi.yukseklik_bandi,
+                       KiralamaTarifesi.kapasite_bandi, KiralamaTarifesi.gunluk_fiyat,
+                       KiralamaTarifesi.haftalik_fiyat, KiralamaTarifesi.aylik_fiyat,
+                       KiralamaTarifesi.min_gun, KiralamaTarifesi.is_active)
+        if self.son_guncelleme is not None:
+            sorgu = sorgu.where(KiralamaTarifesi.guncelleme_zamani > self.son_guncelleme)
+        for t in db.session.execute(sorgu.order_by(KiralamaTarifesi.guncelleme_zamani)):
+            eski = self._tarife_anahtarlari.pop(t.id, None)
+            if eski is not None:
+                self.tarifeler.pop(eski, None)
+            if t.is_active:
+                anahtar = (_tip(t.tipi), t.yukseklik_bandi, t.kapasite_bandi)
+                self.tarifeler[anahtar] = tarife(t.gunluk_fiyat, t.haftalik_fiyat, t.aylik_fiyat, t.min_gun)
+                self._tarife_anahtarlari[t.id] = anahtar
+        self.son_guncelleme = son
+
+    def _gecmisi_yukle(self, bugun):
+        ttl = current_app.config.get('TEKLIF_GECMIS_TTL', 3600)
+        if self.gecmis_zamani is None or time.monotonic() - self.gecmis_zamani > ttl:
+            self.gecmis, self._medyanlar, self.son_kalem_id = {}, {}, 0
+            self.gecmis_zamani = time.monotonic()
+
+        # Dış tedarik kalemlerinin makinesi katalogdadır; bilinmeyen yükseklik/kapasite 0 saklanır
+        harici = aliased(Ekipman)
+        tipi = func.coalesce(Ekipman.tipi, harici.tipi)
+        satirlar = db.session.execute(
+            select(KiralamaKalemi.id, tipi.label('tipi'),
+                   func.coalesce(Ekipman.calisma_yuksekligi, func.nullif(harici.calisma_yuksekligi, 0)).label('yukseklik'),
+                   func.coalesce(Ekipman.kaldirma_kapasitesi, func.nullif(harici.kaldirma_kapasitesi, 0)).label('kapasite'),
+                   KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis,
+                   KiralamaKalemi.kiralama_brm_fiyat)
+            .outerjoin(Ekipman, Ekipman.id == KiralamaKalemi.ekipman_id)
+            .outerjoin(harici, harici.id == KiralamaKalemi.harici_ekipman_id)
+            .where(KiralamaKalemi.id > self.son_kalem_id,
+                   KiralamaKalemi.kiralama_baslangici >= bugun - timedelta(days=GECMIS_GUN),
+                   KiralamaKalemi.kiralama_brm_fiyat > 0)
+            .order_by(KiralamaKalemi.id)
+        ).all()
+        for k in satirlar:
+            tip = _tip(k.tipi)
+            if not tip:
+                continue
+            yb, kb = bant(k.yukseklik, YUKSEKLIK_BANTLARI), bant(k.kapasite, KAPASITE_BANTLARI)
+            kademe = sure_kademesi(kiralama_gunu(k.kiralama_baslangici, k.kiralama_bitis))
+            for anahtar in {a + (kademe,) for a in _adaylar(tip, yb, kb)}:
+                insort(self.gecmis.setdefault(anahtar, []), k.kiralama_brm_fiyat)
+                self._medyanlar.pop(anahtar, None)
+        if satirlar:
+            self.son_kalem_id = satirlar[-1].id
+
+    def tazele(self, bugun=None):
+        """Değişen tarifeleri ve yeni kalemleri endekslere işler (istek başına iki küçük sorgu)."""
+        with self._kilit:
+            self._tarifeleri_yukle()
+            self._gecmisi_yukle(bugun or date.today())
+
+    # --- arama -----------------------------------------------------------
+    def _medyan(self, anahtar):
+        t = self._medyanlar.get(anahtar)
+        if t is None:
+            fiyatlar = self.gecmis.get(anahtar)
+            if not fiyatlar:
+                return None
+            t = self._medyanlar[anahtar] = tarife(fiyatlar[len(fiyatlar) // 2])
+        return t
+
+    def tarife_bul(self, tipi, yukseklik, kapasite, gun):
+        """(Tarife, kaynak, anahtar) ya da (None, None, None)."""
+        tip = _tip(tipi)
+        adaylar = _adaylar(tip, bant(yukseklik, YUKSEKLIK_BANTLARI), bant(kapasite, KAPASITE_BANTLARI))
+        for anahtar in adaylar:
+            t = self.tarifeler.get(anahtar)
+            if t is not None:
+                return t, 'tarife', anahtar
+        kademe = sure_kademesi(gun)
+        for anahtar in adaylar:
+            t = self._medyan(anahtar + (kademe,))
+            if t is not None:
+                return t, 'gecmis', anahtar
+        return None, None, None
+
+
+_motor = TeklifMotoru()
+
+
+def teklif_motoru():
+    return _motor
+
+
+def _tarih(deger, alan):
+    try:
+        return date.fromisoformat(str(deger))
+    except ValueError:
+        raise ValueError(f"Geçersiz {alan}: {deger!r}")
+
+
+def _tamsayi(deger, alan):
+    """Boş değer None; sayıya çevrilemeyen değerde kullanıcıya gösterilecek ValueError."""
+    if deger in (None, ''):
+        return None
+    try:
+        return int(deger)
+    except (TypeError, ValueError):
+        raise ValueError(f"Geçersiz {alan}: {deger!r}")
+
+
+def _ekipman_id(s):
+    deger = s.get('ekipman_id')
+    return int(deger) if str(deger or '').isdecimal() else None
+
+
+def teklif_hazirla(satirlar, bugun=None):
+    """
+    satirlar: [{'ekipman_id' ya da 'tipi'/'yukseklik'/'kapasite', 'baslangic', 'bitis'}]
+    Satır başına {'sira', 'tipi', 'yukseklik_bandi', 'kapasite_bandi', 'baslangic', 'bitis',
+    'gun', 'kira', 'gunluk_ortalama', 'kaynak', 'tarife'} ya da {'sira', 'hata'} döner;
+    nesne olmayan ya da hatalı satırlar kendi sırasında hata olarak raporlanır.
+    Satır listesi liste değilse, boşsa ya da EN_FAZLA_SATIR'ı aşarsa ValueError.
+    """
+    if not isinstance(satirlar, list):
+        raise ValueError("'satirlar' bir liste olmalıdır.")
+    if not satirlar:
+        raise ValueError("En az bir teklif satırı gereklidir.")
+    if len(satirlar) > EN_FAZLA_SATIR:
+        raise ValueError(f"Tek teklifte en fazla {EN_FAZLA_SATIR} satır fiyatlanabilir.")
+    motor = teklif_motoru()
+    motor.tazele(bugun)
+
+    # Makineyle verilen satırların tip/yükseklik/kapasitesi tek sorguda
+    idler = {_ekipman_id(s) for s in satirlar if isinstance(s, dict)} - {None}
+    makineler = {e.id: e for e in db.session.execute(
+        select(Ekipman.id, Ekipman.kod, Ekipman.tipi, Ekipman.calisma_yuksekligi, Ekipman.kaldirma_kapasitesi)
+        .where(Ekipman.id.in_(idler))
+    )} if idler else {}
+
+    sonuc, fiyatlanacak = [], []
+    for sira, s in enumerate(satirlar):
+        try:
+            if not isinstance(s, dict):
+                raise ValueError("Satır bir nesne olmalıdır.")
+            baslangic, bitis = _tarih(s.get('baslangic'), 'başlangıç'), _tarih(s.get('bitis'), 'bitiş')
+            if bitis < baslangic:
+                raise ValueError("Bitiş tarihi başlangıçtan önce olamaz.")
+            satir = {'sira': sira, 'baslangic': baslangic.isoformat(), 'bitis': bitis.isoformat()}
+            if s.get('ekipman_id'):
+                e = makineler.get(_ekipman_id(s))
+                if e is None:
+                    raise ValueError("Makine bulunamadı.")
+                satir.update(ekipman_id=e.id, kod=e.kod)
+                tipi, yukseklik, kapasite = e.tipi, e.calisma_yuksekligi, e.kaldirma_kapasitesi
+            else:
+                tipi = s.get('tipi')
+                if tipi is not None and not isinstance(tipi, str):
+                    raise ValueError("Geçersiz makine tipi.")
+                yukseklik = _tamsayi(s.get('yukseklik'), 'yükseklik')
+                kapasite = _tamsayi(s.get('kapasite'), 'kapasite')
+            if not _tip(tipi):
+                raise ValueError("Makine tipi gereklidir.")
+            t, kaynak, anahtar = motor.tarife_bul(tipi, yukseklik, kapasite, kiralama_gunu(baslangic, bitis))
+            if t is None:
+                raise ValueError(f"'{tipi}' için tarife ya da geçmiş fiyat bulunamadı.")
+        except ValueError as e:
+            # Yalnızca bu modülün ürettiği mesajlar istemciye gider
+            sonuc.append({'sira': sira, 'hata': str(e)})
+            continue
+        satir.update(tipi=tipi, yukseklik_bandi=anahtar[1], kapasite_bandi=anahtar[2], kaynak=kaynak,
+                     tarife={'gunluk': t.gunluk, 'haftalik': t.haftalik, 'aylik': t.aylik, 'min_gun': t.min_gun})
+        sonuc.append(satir)
+        fiyatlanacak.append((satir, (baslangic, bitis, t, None)))
+
+    for (satir, _), fiyat in zip(fiyatlanacak, toplu_fiyatla(f for _, f in fiyatlanacak)):
+        satir.update(gun=fiyat.gun, kira=fiyat.kira,
+                     gunluk_ortalama=(fiyat.kira / fiyat.gun).quantize(KURUS, rounding=ROUND_HALF_UP) if fiyat.gun else fiyat.kira)
+    return sonuc
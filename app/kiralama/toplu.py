@@ -0,0 +1,261 @@
+"""
+Toplu kalem işlemleri: sonlandırma, uzatma ve sonlandırmayı geri alma.
+
+Tekil uçlar her kalem için ayrı commit ve ardından guncelle_cari_toplam ile
+ikinci bir commit yapıyordu; ay sonunda yüzlerce kalem tek tek işleniyordu.
+Burada:
+  1. Seçilen kalemler tek sorguda (parça başına) okunur; işleme uygun
+     olmayanlar (zaten sonlandırılmış, bitiş başlangıçtan önce, uzatmada
+     yeni bitiş mevcut bitişten önce, makine ya da nakliye aracı çakışması,
+     makine müsait değil) gerekçesiyle ayrılır.
+  2. Kalemler ve makine durumları küme tabanlı UPDATE'lerle güncellenir
+     (makine geçişleri app.filo.durum üzerinden).
+  3. Etkilenen kiralamaların cari toplamları (müşteri gelir ve tedarikçi
+     alış kayıtları) tek gruplu geçişte yeniden hesaplanır; özet tablosu aynı
+     transaction içinde yenilenir.
+Commit çağıran taraftadır (tek commit).
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import delete, func, select, update
+
+from app.extensions import db
+from app.kiralama.models import KiralamaKalemi
+from app.cari.models import HizmetKaydi
+from app.kiralama.ozet import kiralama_ozetlerini_guncelle, PARCA_BOYUTU
+from app.kiralama.donem import donem_kapsamlari, kapsanan_gun
+from app.kiralama.fiyatlama import toplu_fiyatla
+from app.kiralama.tahakkuk import gelir_tahakkuklarini_guncelle
+from app.cari.risk import firma_risklerini_guncelle, kiralamalarin_firmalari
+from app.filo.durum import rezerve_edilenler, serbest_birak
+from app.filo.musaitlik import cakismalari_bul
+from app.nakliyeler.sevkiyat import arac_cakismalari
+
+ISLEMLER = {
+    'sonlandir': 'Sonlandırma',
+    'uzat': 'Uzatma',
+    'geri_al': 'Sonlandırmayı geri alma',
+}
+
+
+def _parcalar(idler):
+    idler = list(idler)
+    for i in range(0, len(idler), PARCA_BOYUTU):
+        yield idler[i:i + PARCA_BOYUTU]
+
+
+class TopluSonuc:
+    """Toplu işlemin sonucu: işlenen kalemler ve atlananların gerekçeleri."""
+
+    def __init__(self, islem):
+        self.islem = islem
+        self.islenen = []           # [kalem_id]
+        self.atlanan = {}           # kalem_id -> gerekçe
+        self.kiralama_idler = set() # cari/özet yenilenen kiralamalar
+
+    def sozluk(self):
+        return {
+            'islem': self.islem,
+            'islenen': self.islenen,
+            'atlanan': [{'kalem_id': k, 'neden': n} for k, n in sorted(self.atlanan.items())],
+            'kiralama_sayisi': len(self.kiralama_idler),
+        }
+
+    def mesaj(self):
+        metin = f"{ISLEMLER[self.islem]}: {len(self.islenen)} kalem işlendi"
+        if self.atlanan:
+            metin += f", {len(self.atlanan)} kalem atlandı"
+        return metin + "."
+
+
+def toplu_kalem_islemi(kalem_idler, islem, bitis=None, bugun=None):
+    """
+    islem: 'sonlandir' (bitis verilirse bitiş tarihi de yazılır), 'uzat'
+    (bitis zorunlu) ya da 'geri_al'. Geçersiz parametrede ValueError.
+    Değişiklikler oturuma yazılır (flush); commit çağıran taraftadır.
+    """
+    if islem not in ISLEMLER:
+        raise ValueError("Geçersiz işlem.")
+    if islem == 'uzat' and bitis is None:
+        raise ValueError("Uzatma için yeni bitiş tarihi gereklidir.")
+    bugun = bugun or date.today()
+    sonuc = TopluSonuc(islem)
+
+    kalem_idler = sorted({int(i) for i in kalem_idler})
+    kalemler = {}
+    for parca in _parcalar(kalem_idler):
+        kalemler.update((k.id, k) for k in db.session.execute(
+            select(KiralamaKalemi.id, KiralamaKalemi.kiralama_id, KiralamaKalemi.ekipman_id,
+                   KiralamaKalemi.nakliye_araci_id, KiralamaKalemi.kiralama_baslangici,
+                   KiralamaKalemi.kiralama_bitis, KiralamaKalemi.sonlandirildi)
+            .where(KiralamaKalemi.id.in_(parca))
+        ))
+    for kalem_id in kalem_idler:
+        if kalem_id not in kalemler:
+            sonuc.atlanan[kalem_id] = "Kalem bulunamadı."
+
+    # --- 1. Uygunluk ---
+    uygun = {}  # kalem_id -> yeni bitiş
+    for k in kalemler.values():
+        if islem == 'geri_al':
+            if not k.sonlandirildi:
+                sonuc.atlanan[k.id] = "Kalem zaten açık."
+                continue
+            yeni_bitis = k.kiralama_bitis
+        else:
+            if k.sonlandirildi:
+                sonuc.atlanan[k.id] = "Kalem sonlandırılmış."
+                continue
+            yeni_bitis = bitis or k.kiralama_bitis
+        if yeni_bitis < k.kiralama_baslangici:
+            sonuc.atlanan[k.id] = "Bitiş tarihi başlangıçtan önce olamaz."
+            continue
+        if islem == 'uzat' and yeni_bitis < k.kiralama_bitis:
+            sonuc.atlanan[k.id] = ("Uzatmada yeni bitiş mevcut bitişten "
+                                   f"({k.kiralama_bitis.strftime('%d.%m.%Y')}) önce olamaz; sonlandırma kullanın.")
+            continue
+        uygun[k.id] = yeni_bitis
+
+    # Makine çakışmaları: açık kalan kalem makineyi bugüne kadar tutar
+    talepler, talep_kalemleri = [], []
+    for kalem_id, yeni_bitis in uygun.items():
+        k = kalemler[kalem_id]
+        if k.ekipman_id:
+            fiili = yeni_bitis if islem == 'sonlandir' else max(yeni_bitis, bugun)
+            talepler.append((k.ekipman_id, k.kiralama_baslangici, fiili))
+            talep_kalemleri.append(kalem_id)
+    cakisan = {}
+    for c in cakismalari_bul(talepler, haric_kalem_idler=talep_kalemleri, bugun=bugun):
+        cakisan.setdefault(c['ekipman_id'], c)
+    for kalem_id in talep_kalemleri:
+        c = cakisan.get(kalemler[kalem_id].ekipman_id)
+        if c:
+            sonuc.atlanan[kalem_id] = (f"{c['kod']} çakışıyor ({c['kiralama_form_no'] or 'seçilen kalemler'}: "
+                                       f"{c['baslangic'].strftime('%d.%m.%Y')} - {c['bitis'].strftime('%d.%m.%Y')}).")
+            del uygun[kalem_id]
+
+    # Nakliye aracı çakışmaları: bitişi değişen kalemin iade günü aracın başka sevkiyatına denk gelmemeli
+    olaylar = [(kalemler[i].nakliye_araci_id, yeni_bitis, 'iade', kalemler[i].kiralama_id)
+               for i, yeni_bitis in uygun.items()
+               if kalemler[i].nakliye_araci_id and yeni_bitis != kalemler[i].kiralama_bitis]
+    if olaylar:
+        cakisan = {(c['arac_id'], c['tarih']): c for c in arac_cakismalari(olaylar, haric_kalem_idler=list(uygun))}
+        for kalem_id in list(uygun):
+            c = cakisan.get((kalemler[kalem_id].nakliye_araci_id, uygun[kalem_id]))
+            if c:
+                sonuc.atlanan[kalem_id] = (f"Nakliye aracı {c['arac_kod']} {c['tarih'].strftime('%d.%m.%Y')} günü "
+                                           f"başka sevkiyatta ({c['kiralama_form_no'] or 'seçilen kalemler'}).")
+                del uygun[kalem_id]
+
+    # --- 2. Makine durumları ---
+    makineler = {kalemler[i].ekipman_id for i in uygun if kalemler[i].ekipman_id}
+    if islem == 'sonlandir':
+        serbest_birak(makineler)
+    elif islem == 'geri_al':
+        ayrilan = rezerve_edilenler(makineler)
+        for kalem_id in list(uygun):
+            eid = kalemler[kalem_id].ekipman_id
+            if eid and eid not in ayrilan:
+                sonuc.atlanan[kalem_id] = "Makine müsait değil (kirada ya da serviste)."
+                del uygun[kalem_id]
+
+    # --- 3. Kalemler ---
+    degerler = {'sonlandir': {'sonlandirildi': True}, 'uzat': {}, 'geri_al': {'sonlandirildi': False}}[islem]
+    if bitis is not None and islem != 'geri_al':
+        degerler['kiralama_bitis'] = bitis
+    for parca in _parcalar(sorted(uygun)):
+        db.session.execute(
+            update(KiralamaKalemi).where(KiralamaKalemi.id.in_(parca)).values(**degerler),
+            execution_options={'synchronize_session': False},
+        )
+
+    sonuc.islenen = sorted(uygun)
+    sonuc.kiralama_idler = {kalemler[i].kiralama_id for i in uygun}
+    if sonuc.kiralama_idler:
+        cari_toplamlarini_guncelle(sonuc.kiralama_idler)
+        # ORM dışı UPDATE: özetler, gelir tahakkukları ve firma riskleri elle yenilenir
+        conn = db.session.connection()
+        kiralama_ozetlerini_guncelle(conn, sonuc.kiralama_idler)
+        gelir_tahakkuklarini_guncelle(conn, sonuc.kiralama_idler)
+        firma_risklerini_guncelle(conn, kiralamalarin_firmalari(conn, sonuc.kiralama_idler))
+    return sonuc
+
+
+def cari_toplamlarini_guncelle(kiralama_idler):
+    """
+    Kiralamaların cari kayıtlarını kalemlerden yeniden hesaplar: müşteri
+    gelir (giden) kaydı ve tedarikçi başına alış (gelen) kayıtları. Tüm
+    kiralamalar için parça başına tek kalem okuması ve yön başına tek toplu
+    UPDATE. Cari kaydı olmayan kiralamaya/tedarikçiye yeni kayıt açılmaz.
+    Dönem faturalarıyla (app.kiralama.donem) faturalanmış günler ana
+    kayıtlarda tekrar sayılmaz.
+    """
+    for parca in _parcalar(sorted(kiralama_idler)):
+        toplamlar = dict.fromkeys(parca, Decimal('0.00'))
+        kapsamlar = donem_kapsamlari(parca)
+        kalemler = db.session.execute(
+            select(KiralamaKalemi.id, KiralamaKalemi.kiralama_id, KiralamaKalemi.kiralama_baslangici,
+                   KiralamaKalemi.kiralama_bitis, KiralamaKalemi.kiralama_brm_fiyat, KiralamaKalemi.nakliye_satis_fiyat,
+                   KiralamaKalemi.kiralama_alis_fiyat, KiralamaKalemi.is_dis_tedarik_ekipman,
+                   KiralamaKalemi.harici_ekipman_tedarikci_id)
+            .where(KiralamaKalemi.kiralama_id.in_(parca))
+        ).all()
+        fiyatlar = toplu_fiyatla(
+            [(k.kiralama_baslangici, k.kiralama_bitis, k.kiralama_brm_fiyat, k.nakliye_satis_fiyat) for k in kalemler],
+            haric_gunler=[kapsanan_gun(k.kiralama_baslangici, k.kiralama_bitis, kapsamlar.get(k.id)) for k in kalemler],
+        )
+        for k, fiyat in zip(kalemler, fiyatlar):
+            toplamlar[k.kiralama_id] += fiyat.toplam
+        _gelen_toplamlarini_guncelle(parca, [k for k in kalemler if k.is_dis_tedarik_ekipman
+                                             and k.harici_ekipman_tedarikci_id and k.kiralama_alis_fiyat])
+
+        kayitlar = db.session.execute(
+            select(func.min(HizmetKaydi.id), HizmetKaydi.kiralama_id)
+            .where(HizmetKaydi.kiralama_id.in_(parca), HizmetKaydi.yon == 'giden',
+                   HizmetKaydi.kaynak_tipi == 'kiralama')
+            .group_by(HizmetKaydi.kiralama_id)
+        ).all()
+        if kayitlar:
+            db.session.execute(update(HizmetKaydi), [
+                {'id': kayit_id, 'tutar': toplamlar[kiralama_id]} for kayit_id, kiralama_id in kayitlar
+            ])
+
+
+def _gelen_toplamlarini_guncelle(parca, harici_kalemler):
+    """
+    Tedarikçi (gelen) alış kayıtlarını (kiralama, tedarikçi) başına beklenen
+    toplama eşitler. Kalem başına açılmış kayıtlar toplam tutmuyorsa ilk
+    kayıtta birleştirilir, diğerleri silinir.
+    """
+    kapsamlar = donem_kapsamlari(parca, yon='gelen')
+    fiyatlar = toplu_fiyatla(
+        [(k.kiralama_baslangici, k.kiralama_bitis, k.kiralama_alis_fiyat, 0) for k in harici_kalemler],
+        haric_gunler=[kapsanan_gun(k.kiralama_baslangici, k.kiralama_bitis, kapsamlar.get(k.id))
+                      for k in harici_kalemler],
+    )
+    beklenen = {}
+    for k, fiyat in zip(harici_kalemler, fiyatlar):
+        anahtar = (k.kiralama_id, k.harici_ekipman_tedarikci_id)
+        beklenen[anahtar] = beklenen.get(anahtar, Decimal('0.00')) + fiyat.kira
+
+    kayitlar = {}
+    for kayit_id, kiralama_id, firma_id, tutar in db.session.execute(
+        select(HizmetKaydi.id, HizmetKaydi.kiralama_id, HizmetKaydi.firma_id, HizmetKaydi.tutar)
+        .where(HizmetKaydi.kiralama_id.in_(parca), HizmetKaydi.yon == 'gelen',
+               HizmetKaydi.kaynak_tipi == 'kiralama')
+        .order_by(HizmetKaydi.id)
+    ):
+        kayitlar.setdefault((kiralama_id, firma_id), []).append((kayit_id, Decimal(str(tutar or 0))))
+
+    guncellenecek, silinecek = [], []
+    for anahtar, tutar in beklenen.items():
+        mevcut = kayitlar.get(anahtar)
+        if mevcut and sum(t for _, t in mevcut) != tutar:
+            guncellenecek.append({'id': mevcut[0][0], 'tutar': tutar})
+            silinecek += [kayit_id for kayit_id, _ in mevcut[1:]]
+    if guncellenecek:
+        db.session.execute(update(HizmetKaydi), guncellenecek)
+    if silinecek:
+        db.session.execute(delete(HizmetKaydi).where(HizmetKaydi.id.in_(silinecek)),
+                           execution_options={'synchronize_session': False})
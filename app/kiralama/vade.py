@@ -0,0 +1,95 @@
+"""
+Bitişi yaklaşan ve gecikmiş (süresi dolmuş ama sonlandırılmamış) kalemler.
+
+Liste ekranı kalan günü şablonda her kalem için hesaplıyordu; bu yüzden
+"bu hafta bitenler" ya da "gecikenler" ancak tüm sayfalar gezilerek
+bulunabiliyordu. Buradaki sorgular doğrudan SQL'de çalışır ve
+ix_kiralama_kalemi_aktif_bitis kısmi indeksini (kiralama_bitis WHERE
+sonlandirildi = 0) kullanır: yalnızca açık kalemler indekste bulunur.
+
+Not: indeksin kullanılabilmesi için filtre 'sonlandirildi == False'
+biçiminde yazılmalıdır (SQLite 'IS 0' koşulunu indeks koşuluyla eşlemez).
+"""
+from datetime import date, timedelta
+
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.firmalar.models import Firma
+from app.filo.models import Ekipman
+from app.filo.harici import makine_adi
+
+VARSAYILAN_GUN = 7
+
+
+def _acik_kalemler():
+    harici = aliased(Ekipman)
+    return db.session.query(
+        KiralamaKalemi.id, KiralamaKalemi.kiralama_id, Kiralama.kiralama_form_no,
+        Firma.firma_adi.label('musteri'), Ekipman.kod, KiralamaKalemi.is_dis_tedarik_ekipman,
+        harici.marka.label('harici_marka'), harici.model.label('harici_model'),
+        KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis,
+    ).join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id) \
+     .outerjoin(Firma, Firma.id == Kiralama.firma_musteri_id) \
+     .outerjoin(Ekipman, Ekipman.id == KiralamaKalemi.ekipman_id) \
+     .outerjoin(harici, harici.id == KiralamaKalemi.harici_ekipman_id) \
+     .filter(KiralamaKalemi.sonlandirildi == False)  # kısmi indeks koşulu, bkz. modül notu
+
+
+def yaklasan_kalemler_sorgusu(gun=VARSAYILAN_GUN, bugun=None):
+    """Bugün ile bugün+gun arasında biten açık kalemler (bitişe göre)."""
+    bugun = bugun or date.today()
+    return _acik_kalemler().filter(
+        KiralamaKalemi.kiralama_bitis >= bugun,
+        KiralamaKalemi.kiralama_bitis <= bugun + timedelta(days=gun),
+    ).order_by(KiralamaKalemi.kiralama_bitis, KiralamaKalemi.id)
+
+
+def geciken_kalemler_sorgusu(bugun=None):
+    """Bitiş tarihi geçmiş ama sonlandırılmamış kalemler (en eski önce)."""
+    bugun = bugun or date.today()
+    return _acik_kalemler().filter(
+        KiralamaKalemi.kiralama_bitis < bugun,
+    ).order_by(KiralamaKalemi.kiralama_bitis, KiralamaKalemi.id)
+
+
+def vade_kiralama_idleri(durum, gun=VARSAYILAN_GUN, bugun=None):
+    """Liste filtresi için: 'yaklasan' ya da 'geciken' kalemi olan kiralama id'leri (alt sorgu)."""
+    sorgu = geciken_kalemler_sorgusu(bugun) if durum == 'geciken' else yaklasan_kalemler_sorgusu(gun, bugun)
+    return sorgu.order_by(None).with_entities(KiralamaKalemi.kiralama_id)
+
+
+def _satir(s, bugun):
+    return {
+        'kalem_id': s.id, 'kiralama_id': s.kiralama_id, 'kiralama_form_no': s.kiralama_form_no,
+        'musteri': s.musteri,
+        'makine': s.kod if not s.is_dis_tedarik_ekipman else makine_adi(s.harici_marka, s.harici_model),
+        'harici': bool(s.is_dis_tedarik_ekipman),
+        'baslangic': s.kiralama_baslangici, 'bitis': s.kiralama_bitis,
+        'kalan_gun': (s.kiralama_bitis - bugun).days,
+    }
+
+
+def vade_sayilari(gun=VARSAYILAN_GUN, bugun=None):
+    """{'yaklasan': n, 'geciken': n} — iki indeksli COUNT sorgusu."""
+    bugun = bugun or date.today()
+    return {
+        'yaklasan': yaklasan_kalemler_sorgusu(gun, bugun).order_by(None).count(),
+        'geciken': geciken_kalemler_sorgusu(bugun).order_by(None).count(),
+    }
+
+
+def vade_ozeti(gun=VARSAYILAN_GUN, limit=None, bugun=None):
+    """
+    JSON için: {'gun', 'yaklasan', 'geciken', 'yaklasan_adet', 'geciken_adet'}.
+    limit verilirse listeler kısaltılır, adetler yine toplamı verir.
+    """
+    bugun = bugun or date.today()
+    sonuc = {'gun': gun}
+    for anahtar, sorgu in (('yaklasan', yaklasan_kalemler_sorgusu(gun, bugun)),
+                           ('geciken', geciken_kalemler_sorgusu(bugun))):
+        satirlar = sorgu.limit(limit).all() if limit else sorgu.all()
+        sonuc[anahtar] = [_satir(s, bugun) for s in satirlar]
+        sonuc[f'{anahtar}_adet'] = sorgu.order_by(None).count() if limit and len(satirlar) == limit else len(satirlar)
+    return sonuc
@@ -0,0 +1,19 @@
+from app.extensions import db
+
+
+# BELGE SAYACI (PF / PS gibi yıl bazlı belge numaraları)
+class BelgeSayac(db.Model):
+    __tablename__ = 'belge_sayac'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Belge ön eki: 'PF' (Kiralama Formu), 'PS' (Genel Sözleşme)
+    onek = db.Column(db.String(10), nullable=False)
+    yil = db.Column(db.Integer, nullable=False)
+    
+    # Bu (onek, yil) için en son verilen numara
+    son_deger = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('onek', 'yil', name='_belge_sayac_onek_yil_uc'),)
+    
+    def __repr__(self):
+        return f'<BelgeSayac {self.onek}-{self.yil}: {self.son_deger}>'
@@ -1,8 +1,11 @@
 
 from flask import render_template, url_for
 from . import main_bp
+from app.kiralama.vade import vade_ozeti
 
 @main_bp.route('/')
 @main_bp.route('/index')
 def index():
-    return render_template('main/index.html')
\ No newline at end of file
+    # Ana ekran paneli: geciken ve 7 gün içinde bitecek kalemler (ilk 5'er kayıt)
+    vade = vade_ozeti(gun=7, limit=5)
+    return render_template('main/index.html', vade=vade)
@@ -0,0 +1,111 @@
+"""
+Belge numarası sayacı.
+
+PF (kiralama formu) ve PS (genel sözleşme) numaraları eskiden son kayıttan
+okunup bir artırılarak üretiliyordu; eşzamanlı iki istek aynı numarayı
+alabiliyordu. Numara artık 'belge_sayac' tablosundaki (onek, yil) satırında
+tek bir koşulsuz UPDATE ile artırılıp okunur. UPDATE satırı transaction
+sonuna kadar kilitlediği için iki işlem aynı değeri göremez; transaction
+geri alınırsa numara da yanmaz.
+"""
+from datetime import date
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.main.models import BelgeSayac
+
+# Ön ek -> numara biçimi
+BELGE_BICIMLERI = {
+    'PF': '{onek}-{yil}/{no:04d}',
+    'PS': '{onek}-{yil}-{no:03d}',
+}
+
+
+def _artir(onek, yil):
+    sorgu = (
+        update(BelgeSayac)
+        .where(BelgeSayac.onek == onek, BelgeSayac.yil == yil)
+        .values(son_deger=BelgeSayac.son_deger + 1)
+    )
+    if db.engine.dialect.update_returning:
+        return db.session.execute(sorgu.returning(BelgeSayac.son_deger)).scalar()
+    if db.session.execute(sorgu).rowcount == 0:
+        return None
+    # UPDATE satırı kilitledi; aynı transaction içinde okumak güvenli
+    return db.session.execute(
+        select(BelgeSayac.son_deger).where(BelgeSayac.onek == onek, BelgeSayac.yil == yil)
+    ).scalar()
+
+
+def _sayac_olustur(onek, yil):
+    """Yılın ilk numarası için satır açar; başka işlem önce açtıysa sessizce geçer."""
+    tablo = BelgeSayac.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        db.session.execute(
+            insert(tablo).values(onek=onek, yil=yil, son_deger=0)
+            .on_conflict_do_nothing(index_elements=['onek', 'yil'])
+        )
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(tablo.insert().values(onek=onek, yil=yil, son_deger=0))
+    except IntegrityError:
+        pass
+
+
+def sayac_artir(onek, yil=None):
+    """
+    (onek, yil) sayacını atomik olarak bir artırır ve yeni değeri döndürür.
+    Değer çağıranın transaction'ı commit edildiğinde kalıcı olur.
+    """
+    yil = yil or date.today().year
+    deger = _artir(onek, yil)
+    if deger is None:
+        _sayac_olustur(onek, yil)
+        deger = _artir(onek, yil)
+    return deger
+
+
+def sayac_onizle(onek, yil=None):
+    """Sıradaki numarayı tüketmeden döndürür (yalnızca ekranda göstermek için)."""
+    yil = yil or date.today().year
+    son = db.session.execute(
+        select(BelgeSayac.son_deger).where(BelgeSayac.onek == onek, BelgeSayac.yil == yil)
+    ).scalar()
+    return (son or 0) + 1
+
+
+def belge_no_bicimle(onek, yil, no):
+    return BELGE_BICIMLERI[onek].format(onek=onek, yil=yil, no=no)
+
+
+def belge_no_al(onek, yil=None):
+    """Sıradaki belge numarasını ayırır ve biçimli olarak döndürür. Örn: 'PF-2026/0043'"""
+    yil = yil or date.today().year
+    return belge_no_bicimle(onek, yil, sayac_artir(onek, yil))
+
+
+def belge_no_onizle(onek, yil=None):
+    """Sıradaki belge numarasının biçimli önizlemesi (numara ayrılmaz)."""
+    yil = yil or date.today().year
+    return belge_no_bicimle(onek, yil, sayac_onizle(onek, yil))
+
+
+def sayac_en_az(onek, yil, deger):
+    """
+    Dışarıdan numarası hazır gelen belgeler (toplu aktarım) sonrası sayacı
+    en az 'deger' olacak şekilde ileri alır; sayaç hiçbir zaman geri gitmez.
+    """
+    _sayac_olustur(onek, yil)
+    db.session.execute(
+        update(BelgeSayac)
+        .where(BelgeSayac.onek == onek, BelgeSayac.yil == yil, BelgeSayac.son_deger < deger)
+        .values(son_deger=deger)
+    )
@@ -1,7 +1,7 @@
 # app/nakliyeler/forms.py
 from flask_wtf import FlaskForm
-from app.utils import validate_currency # Ortak doğrulayıcımız
-from app.firmalar.models import Firma   # Firma listesini çekeceğiz
+from app.utils import validate_currency, KumeSelectField # Ortak doğrulayıcı / küme ile doğrulanan seçim
+from app import referans                # Firma listesi (önbellekli)
 
 # Toplu import (Kopya kağıdımızdan)
 from wtforms import (
@@ -14,7 +14,7 @@ class NakliyeForm(FlaskForm):
     tarih = DateField('Tarih', format='%Y-%m-%d', validators=[DataRequired()])
     
     # Müşteri seçimi (Select box dinamik doldurulacak)
-    firma_id = SelectField('Müşteri / Firma', coerce=int, validators=[DataRequired()])
+    firma_id = KumeSelectField('Müşteri / Firma', coerce=int, validators=[DataRequired()])
     
     guzergah = StringField('Güzergah (Nereden - Nereye)', validators=[DataRequired()])
     plaka = StringField('Araç Plaka', validators=[Optional()])
@@ -28,13 +28,9 @@ class NakliyeForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(NakliyeForm, self).__init__(*args, **kwargs)
         
-        # SORGUYU DEĞİŞTİRİYORUZ:
         # Adının içinde "Kasa" veya "Dahili" geçmeyenleri getir.
-        # notilike -> Büyük/küçük harf duyarsız "içermez" demektir.
-        
-        firmalar = Firma.query.filter(
-            Firma.firma_adi.notilike('%Kasa%'),
-            Firma.firma_adi.notilike('%Dahili%')
-        ).order_by(Firma.firma_adi).all()
-        
-        self.firma_id.choices = [(f.id, f.firma_adi) for f in firmalar]
\ No newline at end of file
+        # Liste referans önbelleğinden gelir (sorgu yok); filtre büyük/küçük harf duyarsız.
+        self.firma_id.choices = [
+            (f_id, adi) for f_id, adi in referans.firmalar()
+            if 'kasa' not in adi.lower() and 'dahili' not in adi.lower()
+        ]
\ No newline at end of file
@@ -1,14 +1,17 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, jsonify
 from app import db
 from . import nakliye_bp
 from decimal import Decimal, InvalidOperation
 import traceback
+from datetime import date
 
 # Modeller ve Formlar
 from .models import Nakliye
 from app.firmalar.models import Firma
+from app import referans
 from app.cari.models import HizmetKaydi
 from .forms import NakliyeForm
+from .sevkiyat import sevkiyat_panosu, OLAYLAR
 
 # -------------------------------------------------------------------------
 # YARDIMCI FONKSİYON: Decimal Hata Çözücü
@@ -39,8 +42,7 @@ def index():
 @nakliye_bp.route('/ekle', methods=['GET', 'POST'])
 def ekle():
     form = NakliyeForm()
-    firmalar = Firma.query.filter_by(is_active=True).order_by(Firma.firma_adi).all()
-    form.firma_id.choices = [(f.id, f.firma_adi) for f in firmalar]
+    form.firma_id.choices = list(referans.firmalar())
 
     if form.validate_on_submit():
         try:
@@ -58,6 +60,7 @@ def ekle():
                 aciklama=f"Nakliye: {nakliye.plaka} | {nakliye.guzergah}",
                 fatura_no=f"NK-{nakliye.tarih.strftime('%y%m%d')}",
                 # İlişkiyi bağlıyoruz:
+                kaynak_tipi='nakliye',
                 ilgili_nakliye=nakliye 
             )
             
@@ -83,9 +86,7 @@ def ekle():
 def duzenle(id):
     nakliye = Nakliye.query.get_or_404(id)
     form = NakliyeForm(obj=nakliye)
-    
-    firmalar = Firma.query.filter_by(is_active=True).order_by(Firma.firma_adi).all()
-    form.firma_id.choices = [(f.id, f.firma_adi) for f in firmalar]
+    form.firma_id.choices = list(referans.firmalar())
 
     if form.validate_on_submit():
         try: # Eksik olan try eklendi
@@ -133,4 +134,32 @@ def sil(id):
 @nakliye_bp.route('/detay/<int:id>')
 def detay(id):
     nakliye = Nakliye.query.get_or_404(id)
-    return render_template('nakliyeler/detay.html', nakliye=nakliye)
\ No newline at end of file
+    return render_template('nakliyeler/detay.html', nakliye=nakliye)
+
+# ---------------------------------------------------
+# 6. SEVKİYAT PANOSU (araç x gün teslimat / iade)
+# ---------------------------------------------------
+def _pano_parametreleri():
+    tarih = request.args.get('tarih', '').strip()
+    tarih = date.fromisoformat(tarih) if tarih else date.today()
+    return tarih, request.args.get('gorunum', 'gun').strip()
+
+@nakliye_bp.route('/pano', methods=['GET'])
+def pano():
+    try:
+        tarih, gorunum = _pano_parametreleri()
+        pano = sevkiyat_panosu(tarih, gorunum)
+    except ValueError as e:
+        flash(f"Pano Hatası: {e}", "danger")
+        return redirect(url_for('nakliyeler.pano'))
+    return render_template('nakliyeler/pano.html', pano=pano, tarih=tarih, gorunum=gorunum,
+                           olay_adlari=OLAYLAR, today=date.today())
+
+@nakliye_bp.route('/pano/veri', methods=['GET'])
+def pano_veri():
+    try:
+        tarih, gorunum = _pano_parametreleri()
+        pano = sevkiyat_panosu(tarih, gorunum)
+    except ValueError as e:
+        return jsonify({'hata': str(e)}), 400
+    return jsonify(pano.sozluk())
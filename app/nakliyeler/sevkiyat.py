@@ -0,0 +1,216 @@
+"""
+Sevkiyat panosu: öz mal nakliye araçlarının teslimat ve iade alma günleri.
+
+Kiralama kalemi nakliye aracını (nakliye_araci_id) taşır ama hangi aracın
+hangi gün hangi teslimata/iadeye ayrıldığı hiçbir yerde görünmüyordu; dolu
+bir araç atandığı sahada fark ediliyordu. Burada her kalem aracı için iki
+sevkiyat olayı üretir:
+
+    teslim  kiralama_baslangici  makine müşteriye götürülür
+    iade    kiralama_bitis       makine müşteriden alınır
+
+Aynı araç aynı gün başka bir kiralamanın olayına atanmışsa bu bir çakışmadır
+(aynı kiralamanın aynı günkü olayları tek sefer sayılır). Çakışmalar kayıtta
+(arac_cakismalari) engellenir; pano (sevkiyat_panosu) gün ya da hafta
+penceresini tek aralık sorgusuyla çizer. Sorgular iki kısmi indeksten
+okunur: ix_kiralama_kalemi_sevk_teslim / ix_kiralama_kalemi_sevk_iade
+(tarih, nakliye_araci_id), yalnızca aracı olan kalemler.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.filo.models import Ekipman
+from app.filo.harici import makine_adi
+from app.firmalar.models import Firma
+from app.kiralama.models import Kiralama, KiralamaKalemi
+
+OLAYLAR = {'teslim': 'Teslimat', 'iade': 'İade Alma'}
+GORUNUMLER = {'gun': 1, 'hafta': 7}
+
+
+def _olay_sorgusu(kosul):
+    """Kosula uyan, aracı olan kalemlerin olay alanları (tek sorgu)."""
+    arac, makine, harici = aliased(Ekipman), aliased(Ekipman), aliased(Ekipman)
+    return db.session.query(
+        KiralamaKalemi.id, KiralamaKalemi.kiralama_id, KiralamaKalemi.nakliye_araci_id,
+        KiralamaKalemi.kiralama_baslangici, KiralamaKalemi.kiralama_bitis, KiralamaKalemi.sonlandirildi,
+        KiralamaKalemi.is_dis_tedarik_ekipman, harici.marka.label('harici_marka'),
+        harici.model.label('harici_model'), Kiralama.kiralama_form_no, Firma.firma_adi,
+        arac.kod.label('arac_kod'), makine.kod.label('makine_kod'),
+    ).join(Kiralama, Kiralama.id == KiralamaKalemi.kiralama_id) \
+     .outerjoin(Firma, Firma.id == Kiralama.firma_musteri_id) \
+     .outerjoin(arac, arac.id == KiralamaKalemi.nakliye_araci_id) \
+     .outerjoin(makine, makine.id == KiralamaKalemi.ekipman_id) \
+     .outerjoin(harici, harici.id == KiralamaKalemi.harici_ekipman_id) \
+     .filter(KiralamaKalemi.nakliye_araci_id.isnot(None), kosul)
+
+
+def _olaylar(satir, baslangic, bitis):
+    """Kalem satırının [baslangic, bitis] içine düşen olayları."""
+    if satir.is_dis_tedarik_ekipman:
+        makine = makine_adi(satir.harici_marka, satir.harici_model, 'Dış Tedarik')
+    else:
+        makine = satir.makine_kod or '-'
+    for tur, tarih in (('teslim', satir.kiralama_baslangici), ('iade', satir.kiralama_bitis)):
+        if baslangic <= tarih <= bitis:
+            yield {
+                'tarih': tarih, 'tur': tur, 'arac_id': satir.nakliye_araci_id, 'arac_kod': satir.arac_kod,
+                'kalem_id': satir.id, 'kiralama_id': satir.kiralama_id,
+                'kiralama_form_no': satir.kiralama_form_no, 'musteri': satir.firma_adi,
+                'makine': makine, 'sonlandirildi': bool(satir.sonlandirildi),
+            }
+
+
+# -------------------------------------------------------------------------
+# ÇAKIŞMA KONTROLÜ
+# -------------------------------------------------------------------------
+def kalem_olaylari(arac_id, baslangic, bitis, kiralama_id=None):
+    """Kaydedilecek bir kalemin araç olayları: [(arac_id, tarih, tur, kiralama_id)]."""
+    if not (arac_id and baslangic and bitis):
+        return []
+    return [(arac_id, baslangic, 'teslim', kiralama_id), (arac_id, bitis, 'iade', kiralama_id)]
+
+
+def arac_cakismalari(olaylar, haric_kalem_idler=()):
+    """
+    Kaydedilmek üzere olan araç olaylarının çakışmalarını bulur.
+
+    olaylar: [(arac_id, tarih, tur, kiralama_id)] — yeni kiralama için kiralama_id None.
+    haric_kalem_idler: düzenlenen ya da silinecek kalemler (eski olayları sayılmaz).
+
+    Veritabanındaki ve olayların kendi aralarındaki, başka kiralamaya ait aynı
+    gün/aynı araç olayları döner:
+    [{'arac_id', 'arac_kod', 'tarih', 'tur', 'kiralama_form_no', 'musteri'}]
+    Veritabanı tarafı tek sorgudur.
+    """
+    olaylar = [o for o in olaylar if o[0] and o[1]]
+    if not olaylar:
+        return []
+
+    araclar = {arac_id for arac_id, _, _, _ in olaylar}
+    tarihler = {tarih for _, tarih, _, _ in olaylar}
+    sorgu = _olay_sorgusu(and_(
+        KiralamaKalemi.nakliye_araci_id.in_(araclar),
+        or_(KiralamaKalemi.kiralama_baslangici.in_(tarihler), KiralamaKalemi.kiralama_bitis.in_(tarihler)),
+    ))
+    haric = [i for i in haric_kalem_idler if i]
+    if haric:
+        sorgu = sorgu.filter(KiralamaKalemi.id.notin_(haric))
+
+    mevcut = {}
+    for satir in sorgu:
+        for olay in _olaylar(satir, min(tarihler), max(tarihler)):
+            mevcut.setdefault((olay['arac_id'], olay['tarih']), []).append(olay)
+
+    cakismalar, gorulen = [], set()
+    for i, (arac_id, tarih, tur, kiralama_id) in enumerate(olaylar):
+        for olay in mevcut.get((arac_id, tarih), ()):
+            if olay['kiralama_id'] != kiralama_id and (olay['kalem_id'], olay['tur']) not in gorulen:
+                gorulen.add((olay['kalem_id'], olay['tur']))
+                cakismalar.append({k: olay[k] for k in ('arac_id', 'arac_kod', 'tarih', 'tur', 'kiralama_form_no', 'musteri')})
+        for arac2, tarih2, tur2, kiralama2 in olaylar[i + 1:]:
+            if (arac2, tarih2) == (arac_id, tarih) and kiralama2 != kiralama_id:
+                cakismalar.append({'arac_id': arac_id, 'arac_kod': None, 'tarih': tarih, 'tur': tur2,
+                                   'kiralama_form_no': None, 'musteri': None})
+
+    # Yalnızca talepler arasındaki çakışmalarda araç kodu ayrıca okunur
+    eksik = {c['arac_id'] for c in cakismalar if c['arac_kod'] is None}
+    if eksik:
+        kodlar = dict(db.session.query(Ekipman.id, Ekipman.kod).filter(Ekipman.id.in_(eksik)))
+        for c in cakismalar:
+            if c['arac_kod'] is None:
+                c['arac_kod'] = kodlar.get(c['arac_id'])
+    return cakismalar
+
+
+def arac_cakisma_mesaji(cakismalar):
+    """Araç çakışma listesini kullanıcıya gösterilecek tek satırlık mesaja çevirir."""
+    parcalar = []
+    for c in cakismalar:
+        yer = f"{c['kiralama_form_no']} {OLAYLAR[c['tur']]}" if c['kiralama_form_no'] else "seçilen kalemler"
+        parcalar.append(f"{c['arac_kod']} ({c['tarih'].strftime('%d.%m.%Y')}: {yer})")
+    return "Nakliye aracı bu günlerde başka sevkiyata ayrılmış: " + "; ".join(parcalar)
+
+
+# -------------------------------------------------------------------------
+# PANO
+# -------------------------------------------------------------------------
+class SevkiyatPanosu:
+    """Bir gün ya da hafta için araç x gün sevkiyat olayları."""
+
+    def __init__(self, baslangic, gun):
+        self.baslangic = baslangic
+        self.gun = gun
+        self.araclar = []     # [{'id', 'kod', 'olay_sayisi'}] (kod sırasıyla)
+        self.hucreler = {}    # (arac_id, tarih) -> [olay]
+        self.cakismalar = set()  # {(arac_id, tarih)}
+
+    @property
+    def bitis(self):
+        return self.baslangic + timedelta(days=self.gun - 1)
+
+    @property
+    def gunler(self):
+        return [self.baslangic + timedelta(days=i) for i in range(self.gun)]
+
+    @property
+    def onceki(self):
+        return self.baslangic - timedelta(days=self.gun)
+
+    @property
+    def sonraki(self):
+        return self.baslangic + timedelta(days=self.gun)
+
+    def olaylar(self, arac_id, tarih):
+        return self.hucreler.get((arac_id, tarih), [])
+
+    def sozluk(self):
+        """JSON çıktısı."""
+        return {
+            'baslangic': self.baslangic.isoformat(),
+            'bitis': self.bitis.isoformat(),
+            'araclar': [{
+                'id': a['id'], 'kod': a['kod'],
+                'gunler': [{
+                    'tarih': g.isoformat(),
+                    'cakisma': (a['id'], g) in self.cakismalar,
+                    'olaylar': [dict(o, tarih=o['tarih'].isoformat()) for o in self.olaylar(a['id'], g)],
+                } for g in self.gunler if (a['id'], g) in self.hucreler],
+            } for a in self.araclar],
+        }
+
+
+def pano_penceresi(tarih, gorunum):
+    """Görünüm için (ilk gün, gün sayısı); hafta pazartesiden başlar. Geçersiz görünümde ValueError."""
+    if gorunum not in GORUNUMLER:
+        raise ValueError("Görünüm 'gun' ya da 'hafta' olmalıdır.")
+    if gorunum == 'hafta':
+        tarih -= timedelta(days=tarih.weekday())
+    return tarih, GORUNUMLER[gorunum]
+
+
+def sevkiyat_panosu(tarih=None, gorunum='gun'):
+    """Günün ya da haftanın sevkiyat panosu (tek aralık sorgusu)."""
+    baslangic, gun = pano_penceresi(tarih or date.today(), gorunum)
+    pano = SevkiyatPanosu(baslangic, gun)
+    bitis = pano.bitis
+
+    araclar = {}
+    for satir in _olay_sorgusu(or_(
+        KiralamaKalemi.kiralama_baslangici.between(baslangic, bitis),
+        KiralamaKalemi.kiralama_bitis.between(baslangic, bitis),
+    )):
+        for olay in _olaylar(satir, baslangic, bitis):
+            pano.hucreler.setdefault((olay['arac_id'], olay['tarih']), []).append(olay)
+            arac = araclar.setdefault(olay['arac_id'], {'id': olay['arac_id'], 'kod': olay['arac_kod'], 'olay_sayisi': 0})
+            arac['olay_sayisi'] += 1
+
+    for anahtar, olaylar in pano.hucreler.items():
+        olaylar.sort(key=lambda o: (o['tur'] != 'iade', o['kiralama_form_no'] or ''))
+        if len({o['kiralama_id'] for o in olaylar}) > 1:
+            pano.cakismalar.add(anahtar)
+    pano.araclar = sorted(araclar.values(), key=lambda a: a['kod'] or '')
+    return pano
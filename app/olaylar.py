@@ -0,0 +1,93 @@
+"""
+Türetilmiş tabloların ORM flush senkronizasyonu için ortak yardımcılar.
+
+Kiralama özeti (app.kiralama.ozet), arama indeksi (app.kiralama.arama),
+gelir tahakkuku (app.kiralama.tahakkuk) ve firma riski (app.cari.risk)
+ana tablolardan türetilir ve after_flush dinleyicileriyle aynı transaction
+içinde, yalnızca etkilenen satırlar için yeniden yazılır. Dinleyiciler
+değişiklik yoksa bağlantı açmadan döner.
+
+Core ile toplu yazımlar (insert()/update() ifadeleri) oturum olaylarını
+tetiklemez; bu yazımları yapan kod ilgili *_guncelle(conn, ...)
+fonksiyonlarını aynı transaction içinde kendisi çağırır.
+"""
+from sqlalchemy import inspect, select
+
+from app.kiralama.models import Kiralama, KiralamaKalemi
+from app.firmalar.models import Firma
+from app.filo.models import Ekipman
+
+
+def degisti(obj, *alanlar):
+    """Nesnenin verilen alanlarından biri bu flush'ta değişti mi."""
+    durum = inspect(obj)
+    return any(durum.attrs[a].history.has_changes() for a in alanlar)
+
+
+def eski_degerler(obj, alan):
+    """Alanın bu flush'ta değiştirilen eski değerleri (ör. taşınan kalemin eski kiralama_id'si)."""
+    return inspect(obj).attrs[alan].history.deleted
+
+
+class KiralamaDegisiklikleri:
+    """Bir flush'ta kiralama türevlerini etkileyen değişiklikler."""
+
+    def __init__(self):
+        self.kiralama_idler = set()  # eklenen/değişen kiralamalar (kalemi değişenler dahil)
+        self.silinen_idler = set()   # silinen kiralamalar
+        self.firma_idler = set()     # adı değişen firmalar
+        self.ekipman_idler = set()   # izlenen alanı değişen makineler
+
+    def bos_mu(self):
+        return not (self.kiralama_idler or self.silinen_idler or self.firma_idler or self.ekipman_idler)
+
+
+def kiralama_degisiklikleri(session, ekipman_alanlari=(), kiralama_alanlari=('kiralama_form_no', 'firma_musteri_id'),
+                            firma_alanlari=('firma_adi',)):
+    """
+    Oturumun new/dirty/deleted kümelerinden etkilenen kiralama, firma ve
+    makineleri toplar. Kalem başka bir kiralamaya taşındıysa eski kiralama
+    da etkilenmiş sayılır.
+    """
+    d = KiralamaDegisiklikleri()
+
+    for obj in session.new:
+        if isinstance(obj, Kiralama):
+            d.kiralama_idler.add(obj.id)
+        elif isinstance(obj, KiralamaKalemi):
+            d.kiralama_idler.add(obj.kiralama_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, Kiralama):
+            if degisti(obj, *kiralama_alanlari):
+                d.kiralama_idler.add(obj.id)
+        elif isinstance(obj, KiralamaKalemi):
+            if session.is_modified(obj, include_collections=False):
+                d.kiralama_idler.add(obj.kiralama_id)
+                d.kiralama_idler.update(eski_degerler(obj, 'kiralama_id'))
+        elif isinstance(obj, Firma):
+            if degisti(obj, *firma_alanlari):
+                d.firma_idler.add(obj.id)
+        elif isinstance(obj, Ekipman):
+            if ekipman_alanlari and degisti(obj, *ekipman_alanlari):
+                d.ekipman_idler.add(obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Kiralama):
+            d.silinen_idler.add(obj.id)
+        elif isinstance(obj, KiralamaKalemi):
+            d.kiralama_idler.add(obj.kiralama_id)
+
+    d.kiralama_idler -= d.silinen_idler
+    d.kiralama_idler.discard(None)
+    return d
+
+
+def makine_kiralamalari(conn, ekipman_idler):
+    """Makineleri (öz mal ya da harici katalog makinesi olarak) kullanan kiralamaların id'leri."""
+    if not ekipman_idler:
+        return set()
+    return set(conn.execute(
+        select(KiralamaKalemi.kiralama_id).where(
+            KiralamaKalemi.ekipman_id.in_(ekipman_idler) | KiralamaKalemi.harici_ekipman_id.in_(ekipman_idler))
+    ).scalars())
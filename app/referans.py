@@ -0,0 +1,147 @@
+"""
+Form seçim listeleri için referans veri önbelleği.
+
+Kiralama, cari ve nakliye formları her GET/POST'ta aktif firmaları,
+tedarikçileri, kasaları ve filo makinelerini yeniden sorguluyordu. Bu listeler
+nadiren değişir; burada işlem (worker) içinde önbellekte tutulur ve ilgili
+modelde (Firma, Ekipman, Kasa) değişiklik içeren her commit'ten sonra
+(after_commit) yalnızca o modelin listeleri düşürülür. Isınmış bir worker'da
+form kurulumu sorgu çalıştırmaz.
+
+Değerler değiştirilemez tuple'lardır; çağıran taraf kendi choices listesini
+bunlardan üretir. Core ile toplu yazan kodlar (oturum olayı oluşmaz)
+referans_onbellegini_temizle('ekipman') gibi elle temizlemelidir.
+"""
+import hashlib
+import json
+import threading
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.firmalar.models import Firma
+from app.filo.models import Ekipman
+from app.cari.models import Kasa
+
+# Model -> önbellek grubu
+_GRUPLAR = {Firma: 'firma', Ekipman: 'ekipman', Kasa: 'kasa'}
+
+_onbellek = {}   # (grup, ...) -> tuple
+_nesil = {}      # grup -> geçersiz kılma sayacı
+_kilit = threading.Lock()
+_paket = (None, None, None)   # (tedarikciler, makineler, (surum, govde))
+
+
+def _getir(anahtar, yukle):
+    grup = anahtar[0]
+    with _kilit:
+        if anahtar in _onbellek:
+            return _onbellek[anahtar]
+        nesil = _nesil.get(grup, 0)
+    deger = yukle()
+    with _kilit:
+        # Yükleme sırasında commit olduysa eski veriyi önbelleğe yazma
+        if _nesil.get(grup, 0) == nesil:
+            _onbellek[anahtar] = deger
+    return deger
+
+
+def referans_onbellegini_temizle(*gruplar):
+    """Verilen grupları (ör. 'firma', 'ekipman', 'kasa'), grup verilmezse tümünü düşürür."""
+    with _kilit:
+        for grup in gruplar or set(_GRUPLAR.values()):
+            _nesil[grup] = _nesil.get(grup, 0) + 1
+            for anahtar in [a for a in _onbellek if a[0] == grup]:
+                del _onbellek[anahtar]
+
+
+# -------------------------------------------------------------------------
+# REFERANS LİSTELERİ
+# -------------------------------------------------------------------------
+def firmalar(rol=None):
+    """
+    Aktif firmalar, ada göre sıralı: ((id, firma_adi), ...).
+    rol: None (tümü), 'musteri' ya da 'tedarikci'.
+    """
+    def yukle():
+        sorgu = db.session.query(Firma.id, Firma.firma_adi).filter(Firma.is_active.is_(True))
+        if rol == 'musteri':
+            sorgu = sorgu.filter(Firma.is_musteri.is_(True))
+        elif rol == 'tedarikci':
+            sorgu = sorgu.filter(Firma.is_tedarikci.is_(True))
+        return tuple((f.id, f.firma_adi) for f in sorgu.order_by(Firma.firma_adi))
+    return _getir(('firma', rol), yukle)
+
+
+def filo_makineleri():
+    """Kendi filomuzdaki makineler, koda göre sıralı: ((id, kod, tipi, calisma_durumu), ...)."""
+    def yukle():
+        sorgu = db.session.query(Ekipman.id, Ekipman.kod, Ekipman.tipi, Ekipman.calisma_durumu) \
+            .filter(Ekipman.firma_tedarikci_id.is_(None)).order_by(Ekipman.kod)
+        return tuple(tuple(e) for e in sorgu)
+    return _getir(('ekipman',), yukle)
+
+
+def kasalar():
+    """Tüm kasalar: ((id, kasa_adi, bakiye, is_active), ...)."""
+    def yukle():
+        sorgu = db.session.query(Kasa.id, Kasa.kasa_adi, Kasa.bakiye, Kasa.is_active).order_by(Kasa.id)
+        return tuple(tuple(k) for k in sorgu)
+    return _getir(('kasa',), yukle)
+
+
+def kiralama_secenekleri():
+    """
+    Kiralama ekle/düzelt sayfalarının seçim listeleri, sayfa başına bir kez
+    gönderilen JSON paketi olarak: (surum, govde).
+
+    surum içeriğin özetidir (ETag ve ?v= için); içerik aynı kaldıkça bütün
+    worker'larda aynıdır. Paket, kaynak tuple'lar değişmedikçe yeniden
+    üretilmez. Müsaitlik süzmesi (boşta + formdaki makineler) istemcide yapılır.
+    """
+    global _paket
+    tedarikciler, makineler = firmalar('tedarikci'), filo_makineleri()
+    onceki_ted, onceki_mak, sonuc = _paket
+    if tedarikciler is onceki_ted and makineler is onceki_mak:
+        return sonuc
+
+    govde = json.dumps({
+        'tedarikciler': tedarikciler,
+        'makineler': [(e_id, f"{kod} ({tipi})", durum) for e_id, kod, tipi, durum in makineler],
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    sonuc = (hashlib.sha1(govde).hexdigest()[:16], govde)
+    _paket = (tedarikciler, makineler, sonuc)
+    return sonuc
+
+
+# -------------------------------------------------------------------------
+# ÖNBELLEK GEÇERSİZLEME (after_commit)
+# -------------------------------------------------------------------------
+@event.listens_for(db.session, 'after_flush')
+def _degisen_gruplari_isaretle(session, flush_context):
+    gruplar = session.info.setdefault('referans_degisen', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        grup = _GRUPLAR.get(type(obj))
+        if grup:
+            gruplar.add(grup)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _toplu_guncellemeyi_isaretle(orm_execute_state):
+    # ORM UPDATE/DELETE ifadeleri (ör. app.filo.durum) nesneleri dirty yapmaz
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        gruplar = {_GRUPLAR.get(m.class_) for m in orm_execute_state.all_mappers} - {None}
+        if gruplar:
+            orm_execute_state.session.info.setdefault('referans_degisen', set()).update(gruplar)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _degisen_gruplari_temizle(session):
+    gruplar = session.info.pop('referans_degisen', None)
+    if gruplar:
+        referans_onbellegini_temizle(*gruplar)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _isaretleri_kaldir(session, previous_transaction):
+    session.info.pop('referans_degisen', None)
@@ -0,0 +1,155 @@
+"""
+Keyset (seek) sayfalama.
+
+'.paginate()' her sayfada OFFSET n ve filtrelenmiş sorgunun tamamı üzerinde
+COUNT(*) çalıştırır; derin sayfalar doğrusal olarak yavaşlar. Burada sayfa,
+bir önceki sayfanın son satırının sıralama anahtarlarından devam eder
+(WHERE (kod, id) > (:kod, :id) ORDER BY kod, id LIMIT n+1), böylece maliyet
+sayfa derinliğinden bağımsızdır.
+
+İmleçler (sonraki/önceki) şeffaf base64 token'lardır. Toplam kayıt sayısı
+her istekte değil, kısa süreli önbellekten (SAYFALAMA_SAYIM_TTL) okunur.
+Önbellek anahtarı kullanıcının arama/filtre değerlerini içerdiğinden en çok
+SAYFALAMA_SAYIM_LIMIT kayıt tutulur; dolunca en uzun süredir kullanılmayan
+kayıt atılır.
+"""
+import json
+import time
+import base64
+import binascii
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+# sayim_anahtari -> (gecerlilik_sonu_monotonic, toplam); LRU sırasıyla
+_sayim_onbellegi = OrderedDict()
+_kilit = threading.Lock()
+
+
+class KeysetSayfa:
+    """Şablonlardaki sayfalama makrosunun kullandığı sayfa nesnesi."""
+
+    def __init__(self, items, per_page, next_cursor, prev_cursor, total):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+# -------------------------------------------------------------------------
+# İMLEÇ (TOKEN) KODLAMA
+# -------------------------------------------------------------------------
+def _imlec_olustur(yon, degerler):
+    ham = json.dumps([yon, degerler], separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(ham).decode('ascii').rstrip('=')
+
+
+def _imlec_coz(imlec):
+    """Geçersiz ya da bozuk token ilk sayfa olarak yorumlanır."""
+    if not imlec:
+        return None, None
+    try:
+        ham = base64.urlsafe_b64decode(imlec + '=' * (-len(imlec) % 4))
+        yon, degerler = json.loads(ham.decode('utf-8'))
+    except (binascii.Error, ValueError, TypeError):
+        return None, None
+    if yon not in ('s', 'o') or not isinstance(degerler, list):
+        return None, None
+    return yon, degerler
+
+
+# -------------------------------------------------------------------------
+# SEEK KOŞULU
+# -------------------------------------------------------------------------
+def _seek_kosulu(anahtarlar, degerler, buyuk):
+    """
+    (k1, k2, ...) > (v1, v2, ...) satır karşılaştırmasını taşınabilir
+    OR/AND zinciri olarak kurar: k1 > v1 OR (k1 = v1 AND k2 > v2) ...
+    """
+    kolon, deger = anahtarlar[0], degerler[0]
+    kiyas = kolon > deger if buyuk else kolon < deger
+    if len(anahtarlar) == 1:
+        return kiyas
+    return or_(kiyas, and_(kolon == deger, _seek_kosulu(anahtarlar[1:], degerler[1:], buyuk)))
+
+
+def _anahtar_degerleri(kayit, anahtarlar):
+    return [getattr(kayit, kolon.key) for kolon in anahtarlar]
+
+
+# -------------------------------------------------------------------------
+# TOPLAM SAYI (ÖNBELLEKLİ)
+# -------------------------------------------------------------------------
+def _toplam(query, sayim_anahtari):
+    if sayim_anahtari is None:
+        return None
+    simdi = time.monotonic()
+    with _kilit:
+        kayit = _sayim_onbellegi.get(sayim_anahtari)
+        if kayit is not None and kayit[0] > simdi:
+            _sayim_onbellegi.move_to_end(sayim_anahtari)
+            return kayit[1]
+    toplam = query.order_by(None).count()
+    ttl = current_app.config.get('SAYFALAMA_SAYIM_TTL', 60)
+    limit = current_app.config.get('SAYFALAMA_SAYIM_LIMIT', 256)
+    with _kilit:
+        _sayim_onbellegi[sayim_anahtari] = (simdi + ttl, toplam)
+        _sayim_onbellegi.move_to_end(sayim_anahtari)
+        while len(_sayim_onbellegi) > limit:
+            _sayim_onbellegi.popitem(last=False)
+    return toplam
+
+
+# -------------------------------------------------------------------------
+# ANA FONKSİYON
+# -------------------------------------------------------------------------
+def keyset_sayfala(query, anahtarlar, imlec=None, per_page=20, azalan=False, sayim_anahtari=None):
+    """
+    'query'yi 'anahtarlar' sırasıyla (ör. [Kiralama.id] veya [Ekipman.kod, Ekipman.id])
+    imleç tabanlı sayfalar. Anahtar kombinasyonu benzersiz olmalıdır (son anahtar id).
+
+    azalan=True ise tüm anahtarlar DESC sıralanır.
+    sayim_anahtari verilirse toplam kayıt sayısı bu anahtarla önbelleğe alınır;
+    verilmezse toplam hesaplanmaz (None).
+    """
+    yon, degerler = _imlec_coz(imlec)
+    if degerler is not None and len(degerler) != len(anahtarlar):
+        yon, degerler = None, None
+    geri = yon == 'o'
+
+    # Geri giderken sıralamayı ters çevirip sonucu tekrar çeviriyoruz
+    ters = azalan != geri
+    sorgu = query
+    if degerler:
+        sorgu = sorgu.filter(_seek_kosulu(anahtarlar, degerler, buyuk=not ters))
+    sorgu = sorgu.order_by(*[k.desc() if ters else k.asc() for k in anahtarlar])
+
+    kayitlar = sorgu.limit(per_page + 1).all()
+    fazla = len(kayitlar) > per_page
+    kayitlar = kayitlar[:per_page]
+
+    if geri:
+        if not fazla:
+            # Başa ulaşıldı: ilk sayfayı eksiksiz göster
+            return keyset_sayfala(query, anahtarlar, None, per_page, azalan, sayim_anahtari)
+        kayitlar.reverse()
+
+    sonraki = onceki = None
+    if kayitlar:
+        if fazla or geri:
+            sonraki = _imlec_olustur('s', _anahtar_degerleri(kayitlar[-1], anahtarlar))
+        if degerler and (fazla or not geri):
+            onceki = _imlec_olustur('o', _anahtar_degerleri(kayitlar[0], anahtarlar))
+
+    return KeysetSayfa(kayitlar, per_page, sonraki, onceki, _toplam(query, sayim_anahtari))
@@ -1,8 +1,47 @@
+from wtforms import SelectField
 from wtforms.validators import ValidationError
 import re
 # Ortak hata mesajı değişkeni
 secim_hata_mesaji = "Lütfen geçerli bir seçim yapınız."
 
+# Küme ile doğrulanan seçim alanı
+class KumeSelectField(SelectField):
+    """
+    SelectField, fakat gelen değer choices listesi taranarak değil küme
+    üyeliğiyle doğrulanır (WTForms her değer için tüm listeyi dolaşır).
+
+    gecerli_degerler: coerce edilmiş değerlerin kümesi (aynı küme birçok
+    alana/satıra verilebilir) ya da deger -> bool çağrılabilir (çok büyük
+    alanlarda doğrudan veritabanına sorulabilir). Verilmezse choices'tan bir
+    kez küme üretilir ve choices değişene kadar kullanılır.
+    """
+    def __init__(self, *args, gecerli_degerler=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gecerli_degerler = gecerli_degerler
+        self._kume = (None, frozenset())
+
+    def _secenek_kumesi(self):
+        kaynak, kume = self._kume
+        if kaynak is not self.choices:
+            secenekler = self.choices
+            if isinstance(secenekler, dict):
+                secenekler = [s for grup in secenekler.values() for s in grup]
+            kume = frozenset(self.coerce(s[0] if isinstance(s, (list, tuple)) else s) for s in secenekler)
+            self._kume = (self.choices, kume)
+        return kume
+
+    def pre_validate(self, form):
+        if not self.validate_choice:
+            return
+        gecerli = self.gecerli_degerler
+        if gecerli is None:
+            if self.choices is None:
+                raise TypeError(self.gettext("Choices cannot be None."))
+            gecerli = self._secenek_kumesi()
+        uygun = gecerli(self.data) if callable(gecerli) else self.data in gecerli
+        if not uygun:
+            raise ValidationError(self.gettext("Not a valid choice."))
+
 # Para Birimi Doğrulayıcı Fonksiyonu
 def validate_currency(form, field):
     if field.data:
@@ -25,4 +25,30 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'app.db')
         
     # Veritabanında değişiklik olduğunda sinyal göndermeyi kapat (performans)
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # --- Döviz Kuru Ayarları ---
+
+    # TCMB günlük kur XML adresi. Testlerde yerel bir XML dosyasının yolu
+    # (örn: tests/fixtures/today.xml, proje kökünden çalıştırılırken) verilerek
+    # TCMB'ye hiç gidilmeden çalışılabilir.
+    TCMB_KUR_URL = os.environ.get('TCMB_KUR_URL') or 'https://www.tcmb.gov.tr/kurlar/today.xml'
+
+    # İşlem içi kur önbelleğinin ömrü (saniye). Süresi dolan kayıt hemen
+    # döndürülür, yenileme arka planda yapılır (stale-while-revalidate).
+    DOVIZ_KURU_TTL = int(os.environ.get('DOVIZ_KURU_TTL') or 3600)
+
+    # Liste sayfalarındaki toplam kayıt sayısının önbellek ömrü (saniye).
+    # Keyset sayfalamada COUNT(*) her sayfada değil, bu süre içinde bir kez çalışır.
+    SAYFALAMA_SAYIM_TTL = int(os.environ.get('SAYFALAMA_SAYIM_TTL') or 60)
+    # Önbellekte tutulan en fazla sayım (farklı arama/filtre kombinasyonu) sayısı.
+    SAYFALAMA_SAYIM_LIMIT = int(os.environ.get('SAYFALAMA_SAYIM_LIMIT') or 256)
+
+    # Filo doluluk takviminin önbellek ömrü (saniye). Kalem/makine değiştiren
+    # her commit önbelleği zaten temizler; bu süre diğer worker'lardaki
+    # değişikliklerin en geç ne zaman görüneceğini belirler.
+    FILO_TAKVIM_TTL = int(os.environ.get('FILO_TAKVIM_TTL') or 300)
+
+    # Kredi limitini aşan yeni kiralamada davranış: 'engelle' (kayıt yapılmaz)
+    # ya da 'uyar' (kayıt yapılır, uyarı gösterilir). Limit firma kartından girilir.
+    KREDI_LIMITI_ASIMI = os.environ.get('KREDI_LIMITI_ASIMI') or 'engelle'
@@ -51,6 +51,14 @@ def get_metadata():
     return target_db.metadata
 
 
+# FTS5 sanal tabloları ve gölge tabloları (kiralama_arama, kiralama_arama_data, ...)
+# modellerde tanımlı değildir; autogenerate'in bunları silmeye çalışmasını engelliyoruz.
+def include_name(name, type_, parent_names):
+    if type_ == 'table':
+        return not name.startswith('kiralama_arama')
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +73,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -93,6 +102,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_name", include_name)
 
     connectable = get_engine()
 
@@ -0,0 +1,46 @@
+"""Kiralama listesi için FTS5 arama indeksi
+
+Revision ID: 3c1f7be0d2a5
+Revises: 94ffc4878c17
+Create Date: 2026-10-18 11:42:17.308114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f7be0d2a5'
+down_revision = '94ffc4878c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 yalnızca SQLite'ta var; diğer veritabanlarında arama ilike ile devam eder.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("CREATE VIRTUAL TABLE kiralama_arama USING fts5(metin, tokenize='trigram')")
+    op.execute("""
+        INSERT INTO kiralama_arama (rowid, metin)
+        SELECT k.id,
+               coalesce(k.kiralama_form_no, '') || ' | ' || coalesce(f.firma_adi, '') || ' | ' ||
+               coalesce(group_concat(
+                   coalesce(e.kod, '') || ' ' || coalesce(e.seri_no, '') || ' ' ||
+                   coalesce(kk.harici_ekipman_tipi, '') || ' ' || coalesce(kk.harici_ekipman_marka, '') || ' ' ||
+                   coalesce(kk.harici_ekipman_model, '') || ' ' || coalesce(kk.harici_ekipman_seri_no, ''),
+               ' | '), '')
+        FROM kiralama k
+        LEFT JOIN firma f ON f.id = k.firma_musteri_id
+        LEFT JOIN kiralama_kalemi kk ON kk.kiralama_id = k.id
+        LEFT JOIN ekipman e ON e.id = kk.ekipman_id
+        GROUP BY k.id
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TABLE IF EXISTS kiralama_arama")
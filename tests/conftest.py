@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testler proje kökünden bağımsız çalışsın ('app' ve 'config' içe aktarılabilsin)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,141 @@
+"""
+app.cari.doviz testleri: TCMB XML çözümü (tests/fixtures/today.xml), bülten
+kesim saati ve geçmiş tarih önbelleği. TCMB'ye gidilmez; kaynak fixture
+dosyasıdır.
+"""
+import os
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from config import Config
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'today.xml')
+BULTEN = date(2026, 10, 16)  # fixture bülteni (Cuma)
+
+
+class _Bugun(date):
+    """Testlerin saatten bağımsız olması için sabit 'bugün' (fixture bülteninden sonraki Pazar)."""
+
+    @classmethod
+    def today(cls):
+        return cls(2026, 10, 18)
+
+
+def _fixture():
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from app import create_app
+    from app.extensions import db
+    from app.cari import doviz
+    from app.cari.models import DovizKuru
+
+    ayar = type('TestAyar', (Config,), {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'doviz.db'}",
+        'TCMB_KUR_URL': FIXTURE,
+    })
+    app = create_app(ayar)
+    monkeypatch.setattr(doviz, 'date', _Bugun)
+    doviz._onbellek.clear()
+    with app.app_context():
+        DovizKuru.__table__.create(db.engine)
+        yield app
+        db.session.remove()
+    doviz._onbellek.clear()
+
+
+def _kur_yaz(tarih, usd, eur):
+    from app.extensions import db
+    from app.cari.models import DovizKuru
+
+    for pb, satis in (('USD', usd), ('EUR', eur)):
+        kayit = DovizKuru.query.filter_by(tarih=tarih, para_birimi=pb).first()
+        if not kayit:
+            kayit = DovizKuru(tarih=tarih, para_birimi=pb)
+            db.session.add(kayit)
+        kayit.alis = kayit.satis = Decimal(satis)
+    db.session.commit()
+
+
+def test_tcmb_xml_coz():
+    from app.cari.doviz import tcmb_xml_coz
+
+    bulten_tarihi, kurlar = tcmb_xml_coz(_fixture())
+    assert bulten_tarihi == BULTEN
+    assert kurlar == {
+        'USD': (Decimal('41.8123'), Decimal('41.8877')),
+        'EUR': (Decimal('48.7001'), Decimal('48.7878')),
+    }
+
+
+def test_tcmb_xml_coz_eksik_deger():
+    from app.cari.doviz import tcmb_xml_coz
+
+    icerik = _fixture().replace(b'<ForexSelling>41.8877</ForexSelling>', b'<ForexSelling></ForexSelling>')
+    _, kurlar = tcmb_xml_coz(icerik)
+    assert kurlar['USD'] == (Decimal('41.8123'), None)
+
+
+@pytest.mark.parametrize('simdi, beklenen', [
+    (datetime(2026, 10, 16, 15, 29), date(2026, 10, 15)),   # Cuma, bülten öncesi
+    (datetime(2026, 10, 16, 15, 30), date(2026, 10, 16)),   # Cuma, bülten saati
+    (datetime(2026, 10, 17, 10, 0), date(2026, 10, 16)),    # Cumartesi
+    (datetime(2026, 10, 19, 9, 0), date(2026, 10, 16)),     # Pazartesi sabahı -> Cuma
+    (datetime(2026, 10, 16, 12, 29, tzinfo=timezone.utc), date(2026, 10, 15)),  # 15:29 İstanbul
+    (datetime(2026, 10, 16, 12, 31, tzinfo=timezone.utc), date(2026, 10, 16)),  # 15:31 İstanbul
+])
+def test_beklenen_bulten_tarihi(simdi, beklenen):
+    from app.cari.doviz import beklenen_bulten_tarihi
+
+    assert beklenen_bulten_tarihi(simdi) == beklenen
+
+
+def test_kurlari_yenile_fixture_bultenini_yazar(app):
+    from app.cari.doviz import kurlari_yenile, kurlari_getir
+
+    assert kurlari_yenile() == 2
+    beklenen = {'USD': Decimal('41.8877'), 'EUR': Decimal('48.7878')}
+    assert kurlari_getir(BULTEN) == beklenen
+    # Hafta sonu Cuma bülteniyle cevaplanır
+    assert kurlari_getir(date(2026, 10, 17)) == beklenen
+
+
+def test_eski_bultenle_cevaplanan_gun_onbellege_alinmaz(app):
+    from app.cari.doviz import kurlari_yenile, kurlari_getir
+
+    _kur_yaz(date(2026, 10, 15), '40', '47')
+    # 16 Ekim bülteni henüz yazılmamış: Cuma ve Cumartesi bir önceki bültenle cevaplanır
+    gunler = (BULTEN, date(2026, 10, 17))
+    for gun in gunler:
+        assert kurlari_getir(gun)['USD'] == Decimal('40')
+    kurlari_yenile()
+    for gun in gunler:
+        assert kurlari_getir(gun)['USD'] == Decimal('41.8877')
+
+
+def test_bulten_yenilenince_onbellek_temizlenir(app, tmp_path):
+    from app.cari.doviz import kurlari_yenile, kurlari_getir
+
+    kurlari_yenile()
+    cumartesi = date(2026, 10, 17)
+    for gun in (BULTEN, cumartesi):
+        assert kurlari_getir(gun)['USD'] == Decimal('41.8877')
+
+    # Önbellekteki günler veritabanına gitmeden cevaplanır
+    _kur_yaz(BULTEN, '1', '1')
+    for gun in (BULTEN, cumartesi):
+        assert kurlari_getir(gun)['USD'] == Decimal('41.8877')
+
+    # Aynı bülten düzeltilerek yeniden yazılınca bülten günü ve hafta sonu tazelenir
+    duzeltme = tmp_path / 'duzeltme.xml'
+    duzeltme.write_bytes(_fixture().replace(b'41.8877', b'41.9000'))
+    app.config['TCMB_KUR_URL'] = str(duzeltme)
+    kurlari_yenile()
+    assert kurlari_getir(BULTEN)['USD'] == Decimal('41.9000')
+    assert kurlari_getir(cumartesi)['USD'] == Decimal('41.9000')
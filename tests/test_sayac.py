@@ -0,0 +1,75 @@
+"""
+app.main.sayac eşzamanlılık testi: birden çok süreç aynı SQLite dosyasında
+aynı (onek, yil) sayacından numara alır. Sayaç satırı başta yoktur, ilk
+satırı açma yarışı da test edilir. Geri alınan transaction'ın numarası
+yanmamalı, commit edilen numaralar benzersiz ve boşluksuz olmalıdır.
+"""
+import multiprocessing
+
+import pytest
+
+from config import Config
+
+SUREC_SAYISI = 8
+SUREC_BASINA_CAGRI = 40
+GERI_ALMA_ARALIGI = 7   # her 7. çağrı geri alınır
+
+
+def _ayar(db_yolu):
+    return type('TestAyar', (Config,), {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_yolu}',
+    })
+
+
+def _numara_al(db_yolu, engel, kuyruk):
+    from app import create_app
+    from app.extensions import db
+    from app.main.sayac import sayac_artir
+
+    app = create_app(_ayar(db_yolu))
+    alinan = []
+    with app.app_context():
+        engel.wait()
+        for i in range(1, SUREC_BASINA_CAGRI + 1):
+            no = sayac_artir('PF', 2026)
+            if i % GERI_ALMA_ARALIGI == 0:
+                db.session.rollback()
+            else:
+                db.session.commit()
+                alinan.append(no)
+    kuyruk.put(alinan)
+
+
+@pytest.fixture
+def sayac_db(tmp_path):
+    from app import create_app
+    from app.extensions import db
+    from app.main.models import BelgeSayac
+
+    db_yolu = tmp_path / 'sayac.db'
+    app = create_app(_ayar(db_yolu))
+    with app.app_context():
+        BelgeSayac.__table__.create(db.engine)
+        db.engine.dispose()
+    return db_yolu
+
+
+def test_eszamanli_numaralar_benzersiz_ve_bosluksuz(sayac_db):
+    ctx = multiprocessing.get_context('spawn')
+    engel, kuyruk = ctx.Barrier(SUREC_SAYISI), ctx.Queue()
+    surecler = [ctx.Process(target=_numara_al, args=(str(sayac_db), engel, kuyruk)) for _ in range(SUREC_SAYISI)]
+    for s in surecler:
+        s.start()
+    sonuclar = [kuyruk.get(timeout=120) for _ in surecler]
+    for s in surecler:
+        s.join(timeout=30)
+        assert s.exitcode == 0
+
+    numaralar = [no for alinan in sonuclar for no in alinan]
+    beklenen = SUREC_SAYISI * (SUREC_BASINA_CAGRI - SUREC_BASINA_CAGRI // GERI_ALMA_ARALIGI)
+    assert len(numaralar) == beklenen
+    assert len(set(numaralar)) == beklenen, "aynı numara birden çok sürece verildi"
+    assert sorted(numaralar) == list(range(1, beklenen + 1)), "numaralarda boşluk var"
+    # Her süreç kendi numaralarını artan sırayla almalı
+    assert all(alinan == sorted(alinan) for alinan in sonuclar)